@@ -0,0 +1,271 @@
+"""本地模拟 google.serper.dev 和 scrape.serper.dev，用于压测
+
+Google 接口挂载在 /<endpoint>（search、news、images ...），抓取接口挂载在 /scrape。
+启动后在标准输出打印一行 JSON，包含实际监听的地址，供压测脚本读取。
+
+    python benchmarks/mock_serper.py --latency-ms 300 --error-rate 0.01 --throttle-rate 0.01
+"""
+import sys
+import json
+import math
+import random
+import string
+import asyncio
+import argparse
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from aiohttp import web
+
+# 每种响应预先生成的样本数，请求时从中随机挑选，避免模拟服务自身成为瓶颈
+BODY_POOL_SIZE = 8
+
+# 各接口结果列表所在的字段
+RESULT_LISTS = {
+    "search": "organic",
+    "news": "news",
+    "images": "images",
+    "videos": "videos",
+    "places": "places",
+    "maps": "places",
+    "reviews": "reviews",
+    "shopping": "shopping",
+    "lens": "organic",
+    "scholar": "organic",
+    "patents": "organic",
+    "autocomplete": "suggestions",
+}
+
+
+@dataclass
+class MockConfig:
+    latency_ms: float = 300.0
+    # 对数正态分布的形状参数，越大长尾越明显
+    latency_sigma: float = 0.5
+    # 按地区追加的延迟中位数，例如 {"cn": 400}
+    region_latency_ms: Dict[str, float] = field(default_factory=dict)
+    error_rate: float = 0.0
+    throttle_rate: float = 0.0
+    retry_after: str = "0"
+    # 文本字段长度的放大倍数
+    payload_scale: float = 1.0
+    scrape_kb: float = 40.0
+    seed: int = 0
+
+
+def _parse_region_latency(value: str) -> Dict[str, float]:
+    regions = {}
+    for item in filter(None, value.split(",")):
+        gl, _, ms = item.partition("=")
+        regions[gl.strip()] = float(ms)
+    return regions
+
+
+class MockSerper:
+    def __init__(self, config: MockConfig):
+        self.config = config
+        self.random = random.Random(config.seed)
+        self.requests = 0
+        self.errors = 0
+        self.throttled = 0
+        self._pool: Dict[Any, List[Dict[str, Any]]] = {}
+
+    def _words(self, count: int) -> str:
+        return " ".join(
+            "".join(self.random.choices(string.ascii_lowercase, k=self.random.randint(3, 10))) for _ in range(count)
+        )
+
+    def _scaled(self, words: int) -> int:
+        return max(1, int(words * self.config.payload_scale))
+
+    def _item(self, endpoint: str, position: int) -> Dict[str, Any]:
+        slug = "".join(self.random.choices(string.ascii_lowercase, k=12))
+        item: Dict[str, Any] = {
+            "title": self._words(self._scaled(8)).title(),
+            "link": f"https://www.{slug}.com/{self._words(3).replace(' ', '-')}",
+            "snippet": self._words(self._scaled(28)),
+            "position": position,
+        }
+        if endpoint in ("search", "scholar", "patents", "lens") and position <= 3:
+            item["sitelinks"] = [
+                {"title": self._words(3).title(), "link": f"https://www.{slug}.com/{n}"} for n in range(4)
+            ]
+        if endpoint in ("news", "videos", "reviews"):
+            item["date"] = f"{self.random.randint(1, 23)} hours ago"
+            item["source"] = self._words(2).title()
+        if endpoint in ("images", "videos", "news", "shopping"):
+            item["imageUrl"] = f"https://images.{slug}.com/{position}.jpg"
+            item["thumbnailUrl"] = f"https://encrypted-tbn0.gstatic.com/images?q=tbn:{slug}{position}"
+        if endpoint in ("places", "maps"):
+            item.update(
+                address=self._words(5).title(),
+                rating=round(self.random.uniform(3, 5), 1),
+                ratingCount=self.random.randint(5, 5000),
+                latitude=self.random.uniform(-60, 60),
+                longitude=self.random.uniform(-180, 180),
+                cid=str(self.random.getrandbits(60)),
+            )
+        if endpoint == "shopping":
+            item["price"] = f"${self.random.randint(5, 900)}.99"
+        if endpoint == "autocomplete":
+            item = {"value": self._words(3)}
+        return item
+
+    def _pooled(self, key: Any, build) -> Dict[str, Any]:
+        pool = self._pool.get(key)
+        if pool is None:
+            pool = self._pool[key] = [build() for _ in range(BODY_POOL_SIZE)]
+        return self.random.choice(pool)
+
+    def search_body(self, endpoint: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        try:
+            num = int(payload.get("num", 10))
+        except (TypeError, ValueError):
+            num = 10
+        body = self._pooled((endpoint, num), lambda: self._build_search_body(endpoint, num))
+        return {"searchParameters": {**payload, "type": endpoint, "engine": "google"}, **body}
+
+    def _build_search_body(self, endpoint: str, num: int) -> Dict[str, Any]:
+        body: Dict[str, Any] = {
+            RESULT_LISTS.get(endpoint, "organic"): [self._item(endpoint, position) for position in range(1, num + 1)],
+        }
+        if endpoint == "search":
+            body["knowledgeGraph"] = {"title": self._words(2).title(), "description": self._words(self._scaled(40))}
+            body["peopleAlsoAsk"] = [
+                {"question": self._words(6) + "?", "snippet": self._words(self._scaled(30)), "link": f"https://faq.example/{n}"}
+                for n in range(4)
+            ]
+            body["relatedSearches"] = [{"query": self._words(3)} for _ in range(8)]
+        body["credits"] = 1
+        return body
+
+    def scrape_body(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        markdown = payload.get("includeMarkdown") in (True, "true")
+        body = self._pooled(("scrape", markdown), lambda: self._build_scrape_body(markdown))
+        return {**body, "metadata": {**body["metadata"], "url": payload.get("url")}}
+
+    def _build_scrape_body(self, markdown: bool) -> Dict[str, Any]:
+        target = int(self.config.scrape_kb * 1024 * self.config.payload_scale)
+        paragraphs: List[str] = []
+        size = 0
+        while size < target:
+            paragraph = self._words(60)
+            paragraphs.append(paragraph)
+            size += len(paragraph) + 2
+        text = "\n\n".join(paragraphs)
+        body: Dict[str, Any] = {"text": text, "metadata": {"title": self._words(6).title()}}
+        if markdown:
+            body["markdown"] = "# " + text
+        body["credits"] = 1
+        return body
+
+    def _latency(self, payload: Any) -> float:
+        median = self.config.latency_ms
+        if isinstance(payload, dict):
+            median += self.config.region_latency_ms.get(payload.get("gl", ""), 0.0)
+        return median * math.exp(self.random.gauss(0, self.config.latency_sigma)) / 1000
+
+    async def handle(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        endpoint = request.match_info.get("endpoint", "scrape")
+        payload = await request.json()
+        first = payload[0] if isinstance(payload, list) and payload else payload
+        await asyncio.sleep(self._latency(first))
+
+        roll = self.random.random()
+        if roll < self.config.throttle_rate:
+            self.throttled += 1
+            return web.json_response({"message": "Too many requests"}, status=429, headers={"Retry-After": self.config.retry_after})
+        if roll < self.config.throttle_rate + self.config.error_rate:
+            self.errors += 1
+            return web.json_response({"message": "Internal error"}, status=500)
+
+        if endpoint == "scrape":
+            return web.json_response(self.scrape_body(payload))
+        if endpoint not in RESULT_LISTS:
+            return web.json_response({"message": f"Unknown endpoint {endpoint}"}, status=404)
+        if isinstance(payload, list):
+            return web.json_response([self.search_body(endpoint, item) for item in payload])
+        return web.json_response(self.search_body(endpoint, payload))
+
+    async def handle_stats(self, request: web.Request) -> web.Response:
+        return web.json_response({"requests": self.requests, "errors": self.errors, "throttled": self.throttled})
+
+    def app(self) -> web.Application:
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.router.add_get("/_stats", self.handle_stats)
+        app.router.add_post("/scrape", self.handle)
+        app.router.add_post("/{endpoint}", self.handle)
+        return app
+
+
+async def serve(config: MockConfig, host: str = "127.0.0.1", port: int = 0) -> None:
+    runner = web.AppRunner(MockSerper(config).app(), access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    bound_port = runner.addresses[0][1]
+    base_url = f"http://{host}:{bound_port}"
+    print(json.dumps({"google_base_url": base_url, "scrape_base_url": f"{base_url}/scrape"}), flush=True)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+
+def add_mock_arguments(parser: argparse.ArgumentParser) -> None:
+    group = parser.add_argument_group("mock upstream")
+    group.add_argument("--latency-ms", type=float, default=MockConfig.latency_ms, help="Median upstream latency")
+    group.add_argument("--latency-sigma", type=float, default=MockConfig.latency_sigma, help="Log-normal sigma of upstream latency")
+    group.add_argument("--region-latency", default="", help="Extra median latency per region, e.g. cn=400,jp=150")
+    group.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with HTTP 500")
+    group.add_argument("--throttle-rate", type=float, default=0.0, help="Share of requests answered with HTTP 429")
+    group.add_argument("--retry-after", default="0", help="Retry-After header sent with 429 responses")
+    group.add_argument("--payload-scale", type=float, default=1.0, help="Multiplier for text lengths in responses")
+    group.add_argument("--scrape-kb", type=float, default=MockConfig.scrape_kb, help="Size of scraped page text in KiB")
+    group.add_argument("--seed", type=int, default=0, help="Random seed, for reproducible runs")
+
+
+def config_from_args(args: argparse.Namespace) -> MockConfig:
+    return MockConfig(
+        latency_ms=args.latency_ms,
+        latency_sigma=args.latency_sigma,
+        region_latency_ms=_parse_region_latency(args.region_latency),
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        retry_after=args.retry_after,
+        payload_scale=args.payload_scale,
+        scrape_kb=args.scrape_kb,
+        seed=args.seed,
+    )
+
+
+def mock_argv(args: argparse.Namespace) -> List[str]:
+    """把模拟服务参数还原为命令行，用于在独立进程中启动"""
+    return [
+        "--latency-ms", str(args.latency_ms),
+        "--latency-sigma", str(args.latency_sigma),
+        "--region-latency", args.region_latency,
+        "--error-rate", str(args.error_rate),
+        "--throttle-rate", str(args.throttle_rate),
+        "--retry-after", args.retry_after,
+        "--payload-scale", str(args.payload_scale),
+        "--scrape-kb", str(args.scrape_kb),
+        "--seed", str(args.seed),
+    ]
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Local stand-in for the Serper API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=0, help="0 picks a free port")
+    add_mock_arguments(parser)
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(config_from_args(args), args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    sys.exit(main())
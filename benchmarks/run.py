@@ -0,0 +1,354 @@
+"""Serper MCP 服务器压测
+
+启动本地模拟上游（mock_serper.py，独立进程），按场景以给定并发调用工具，
+统计吞吐、延迟分位数、每请求 CPU 时间、内存和分配次数，结果写入 JSON 便于在提交之间对比。
+
+    uv run python benchmarks/run.py --mode direct --requests 200 --concurrency 16
+    uv run python benchmarks/run.py --mode stdio --scenarios 'multi_region:*' --num 100
+    uv run python benchmarks/run.py --compare benchmarks/results/old.json benchmarks/results/new.json
+"""
+import os
+import gc
+import sys
+import json
+import time
+import math
+import fnmatch
+import asyncio
+import argparse
+import platform
+import subprocess
+import tracemalloc
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from mock_serper import add_mock_arguments, mock_argv
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+SRC_DIR = os.path.join(REPO_DIR, "src")
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+
+# 与 router.INTENT_TO_TOOL_MAP 一致的全部意图，覆盖自动路由的每个分支
+AUTO_INTENTS = (
+    "general",
+    "images",
+    "videos",
+    "news",
+    "maps",
+    "places",
+    "shopping",
+    "scholar",
+    "patents",
+    "reviews",
+    "lens",
+    "autocomplete",
+    "multi_region",
+)
+PRESETS = ("asia", "europe", "americas", "global", "us_cn_dual")
+
+CallTool = Callable[[str, Dict[str, Any]], Awaitable[str]]
+
+
+@dataclass
+class Scenario:
+    name: str
+    tool: str
+    arguments: Callable[[int], Dict[str, Any]]
+
+
+def build_scenarios(num: str, run_id: str) -> List[Scenario]:
+    """每个场景的每个请求使用不同的查询词，避免命中响应缓存"""
+    scenarios = [
+        Scenario("google", "google_search", lambda i: {"q": f"bench {run_id} google {i}", "num": num}),
+        Scenario("scrape", "webpage_scrape", lambda i: {"url": f"https://example.com/{run_id}/{i}"}),
+    ]
+    for preset in PRESETS:
+        scenarios.append(
+            Scenario(
+                f"multi_region:{preset}",
+                "google_search_multi_region",
+                lambda i, preset=preset: {"q": f"bench {run_id} {preset} {i}", "preset": preset, "num": num, "translations": {}},
+            )
+        )
+    for intent in AUTO_INTENTS:
+        scenarios.append(
+            Scenario(
+                f"auto:{intent}",
+                "google_search_auto",
+                lambda i, intent=intent: {"q": f"bench {run_id} auto {intent} {i}", "intent": intent, "num": num, "translations": {}},
+            )
+        )
+    return scenarios
+
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, math.ceil(q / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def proc_usage(pid: int) -> Tuple[Optional[float], Optional[int]]:
+    """读取进程的 CPU 秒数和常驻内存字节数，仅支持 Linux"""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        cpu = (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+        with open(f"/proc/{pid}/status") as f:
+            rss = next(int(line.split()[1]) * 1024 for line in f if line.startswith("VmRSS:"))
+        return cpu, rss
+    except (OSError, StopIteration, IndexError, ValueError):
+        return None, None
+
+
+def child_pids() -> List[int]:
+    pids: List[int] = []
+    try:
+        for tid in os.listdir(f"/proc/{os.getpid()}/task"):
+            with open(f"/proc/{os.getpid()}/task/{tid}/children") as f:
+                pids.extend(int(pid) for pid in f.read().split())
+    except OSError:
+        pass
+    return pids
+
+
+async def drive(call_tool: CallTool, scenario: Scenario, requests: int, concurrency: int, warmup: int) -> Dict[str, Any]:
+    """先预热若干次，再以固定并发发送 requests 个请求，返回延迟和错误统计"""
+    for i in range(warmup):
+        await call_tool(scenario.tool, scenario.arguments(-1 - i))
+
+    latencies: List[float] = []
+    errors = 0
+    response_bytes = 0
+    counter = iter(range(requests))
+
+    async def worker() -> None:
+        nonlocal errors, response_bytes
+        for i in counter:
+            start = time.perf_counter()
+            try:
+                text = await call_tool(scenario.tool, scenario.arguments(i))
+            except Exception:
+                errors += 1
+                continue
+            finally:
+                latencies.append(time.perf_counter() - start)
+            response_bytes += len(text.encode("utf-8"))
+            if text.startswith("Error:"):
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - start
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": errors,
+        "wall_seconds": round(wall, 4),
+        "throughput_rps": round(requests / wall, 2) if wall else None,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50) * 1000, 2),
+            "p95": round(percentile(latencies, 95) * 1000, 2),
+            "p99": round(percentile(latencies, 99) * 1000, 2),
+            "max": round(max(latencies, default=0.0) * 1000, 2),
+        },
+        "avg_response_bytes": response_bytes // max(requests - errors, 1),
+    }
+
+
+async def run_direct(scenarios: List[Scenario], args: argparse.Namespace) -> Dict[str, Any]:
+    """在当前进程内直接调用 server.call_tool，不经过 MCP 传输"""
+    from serper_mcp_server import _configure_logging, server
+
+    _configure_logging()
+
+    async def call_tool(name: str, arguments: Dict[str, Any]) -> str:
+        contents = await server.call_tool(name, arguments)
+        return contents[0].text
+
+    results = {}
+    await server.startup()
+    try:
+        for scenario in scenarios:
+            gc.collect()
+            if args.tracemalloc:
+                tracemalloc.start()
+            gc_before = sum(stat["collections"] for stat in gc.get_stats())
+            blocks_before = sys.getallocatedblocks()
+            cpu_before = time.process_time()
+            result = await drive(call_tool, scenario, args.requests, args.concurrency, args.warmup)
+            cpu = time.process_time() - cpu_before
+            result["cpu_ms_per_request"] = round(cpu / args.requests * 1000, 3)
+            result["rss_bytes"] = proc_usage(os.getpid())[1]
+            result["allocated_blocks_delta"] = sys.getallocatedblocks() - blocks_before
+            result["gc_collections"] = sum(stat["collections"] for stat in gc.get_stats()) - gc_before
+            if args.tracemalloc:
+                result["traced_peak_bytes"] = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+            results[scenario.name] = result
+            print(_summary(scenario.name, result), file=sys.stderr)
+    finally:
+        await server.shutdown()
+    return results
+
+
+async def run_stdio(scenarios: List[Scenario], args: argparse.Namespace, mock_pid: int) -> Dict[str, Any]:
+    """启动 serper-mcp-server 子进程，通过 stdio 上的 MCP 会话调用工具"""
+    from mcp import ClientSession, StdioServerParameters
+    from mcp.client.stdio import stdio_client
+
+    params = StdioServerParameters(
+        command=sys.executable,
+        args=["-c", "from serper_mcp_server import main; main()"],
+        env=dict(os.environ),
+    )
+    results = {}
+    async with stdio_client(params) as (read_stream, write_stream):
+        async with ClientSession(read_stream, write_stream) as session:
+            start = time.perf_counter()
+            await session.initialize()
+            initialize_ms = round((time.perf_counter() - start) * 1000, 2)
+            server_pids = [pid for pid in child_pids() if pid != mock_pid]
+            server_pid = server_pids[0] if len(server_pids) == 1 else None
+
+            async def call_tool(name: str, arguments: Dict[str, Any]) -> str:
+                result = await session.call_tool(name, arguments)
+                return result.content[0].text
+
+            for scenario in scenarios:
+                cpu_before = proc_usage(server_pid)[0] if server_pid else None
+                result = await drive(call_tool, scenario, args.requests, args.concurrency, args.warmup)
+                cpu_after, rss = proc_usage(server_pid) if server_pid else (None, None)
+                if cpu_before is not None and cpu_after is not None:
+                    result["cpu_ms_per_request"] = round((cpu_after - cpu_before) / args.requests * 1000, 3)
+                result["rss_bytes"] = rss
+                result["initialize_ms"] = initialize_ms
+                results[scenario.name] = result
+                print(_summary(scenario.name, result), file=sys.stderr)
+    return results
+
+
+def _summary(name: str, result: Dict[str, Any]) -> str:
+    latency = result["latency_ms"]
+    return (
+        f"{name:<26} {result['throughput_rps']:>9} req/s  p50 {latency['p50']:>8}ms  p95 {latency['p95']:>8}ms  "
+        f"p99 {latency['p99']:>8}ms  cpu {result.get('cpu_ms_per_request')}ms/req  errors {result['errors']}"
+    )
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def start_mock(args: argparse.Namespace) -> Tuple[asyncio.subprocess.Process, Dict[str, str]]:
+    process = await asyncio.create_subprocess_exec(
+        sys.executable, os.path.join(BENCH_DIR, "mock_serper.py"), *mock_argv(args), stdout=asyncio.subprocess.PIPE
+    )
+    line = await asyncio.wait_for(process.stdout.readline(), timeout=30)
+    return process, json.loads(line)
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    mock, urls = await start_mock(args)
+    # 配置需要在导入 serper_mcp_server 之前写入环境变量，子进程同样继承
+    os.environ["SERPER_GOOGLE_BASE_URL"] = urls["google_base_url"]
+    os.environ["SERPER_SCRAPE_BASE_URL"] = urls["scrape_base_url"]
+    os.environ.setdefault("SERPER_API_KEY", "benchmark")
+    os.environ.setdefault("SERPER_LOG_LEVEL", "CRITICAL")
+    # 压测衡量服务器自身开销，默认关闭本地限速
+    os.environ.setdefault("SERPER_QPS", "0")
+    os.environ["PYTHONPATH"] = os.pathsep.join(filter(None, [SRC_DIR, os.environ.get("PYTHONPATH")]))
+    if SRC_DIR not in sys.path:
+        sys.path.insert(0, SRC_DIR)
+
+    run_id = f"{int(time.time())}"
+    scenarios = [
+        scenario
+        for scenario in build_scenarios(args.num, run_id)
+        if any(fnmatch.fnmatch(scenario.name, pattern) for pattern in args.scenarios.split(","))
+    ]
+    try:
+        if args.mode == "direct":
+            results = await run_direct(scenarios, args)
+        else:
+            results = await run_stdio(scenarios, args, mock.pid)
+    finally:
+        mock.terminate()
+        await mock.wait()
+
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "mode": args.mode,
+            "num": args.num,
+            "mock": dict(zip(mock_argv(args)[::2], mock_argv(args)[1::2])),
+            "env": {key: value for key, value in os.environ.items() if key.startswith("SERPER_") and key not in ("SERPER_API_KEY", "SERPER_API_KEYS")},
+        },
+        "scenarios": results,
+    }
+
+
+def compare(old_path: str, new_path: str) -> None:
+    """打印两次压测结果中各场景吞吐和延迟的变化"""
+    with open(old_path) as f:
+        old = json.load(f)["scenarios"]
+    with open(new_path) as f:
+        new = json.load(f)["scenarios"]
+
+    def change(before: Optional[float], after: Optional[float]) -> str:
+        if not before or after is None:
+            return "n/a"
+        return f"{(after - before) / before * 100:+.1f}%"
+
+    print(f"{'scenario':<26} {'throughput':>11} {'p50':>8} {'p95':>8} {'p99':>8} {'cpu/req':>8}")
+    for name in new:
+        if name not in old:
+            continue
+        a, b = old[name], new[name]
+        print(
+            f"{name:<26} {change(a['throughput_rps'], b['throughput_rps']):>11} "
+            f"{change(a['latency_ms']['p50'], b['latency_ms']['p50']):>8} "
+            f"{change(a['latency_ms']['p95'], b['latency_ms']['p95']):>8} "
+            f"{change(a['latency_ms']['p99'], b['latency_ms']['p99']):>8} "
+            f"{change(a.get('cpu_ms_per_request'), b.get('cpu_ms_per_request')):>8}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark serper-mcp-server against a local mock Serper API")
+    parser.add_argument("--mode", choices=("direct", "stdio"), default="direct", help="Call server.call_tool in-process or over a stdio MCP session")
+    parser.add_argument("--scenarios", default="*", help="Comma-separated glob patterns, e.g. 'google,multi_region:*'")
+    parser.add_argument("--requests", type=int, default=100, help="Measured requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent callers")
+    parser.add_argument("--warmup", type=int, default=3, help="Unmeasured requests before each scenario")
+    parser.add_argument("--num", default="10", help="Results per search, e.g. 100 for large bodies")
+    parser.add_argument("--tracemalloc", action="store_true", help="Record peak traced memory (direct mode, slows the run)")
+    parser.add_argument("--output", help="Result file, defaults to benchmarks/results/<commit>-<mode>.json")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="Compare two result files and exit")
+    add_mock_arguments(parser)
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    report = asyncio.run(run(args))
+    output = args.output or os.path.join(RESULTS_DIR, f"{report['meta']['commit'] or 'unknown'}-{args.mode}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"results written to {output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
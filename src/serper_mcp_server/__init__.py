@@ -1,3 +1,9 @@
+import time
+
+# 供 --profile-startup 计算启动耗时
+_STARTED = time.perf_counter()
+
+import argparse
 import asyncio
 import logging
 import os
@@ -5,35 +11,54 @@ import sys
 
 from dotenv import load_dotenv
 
+# 各模块在导入时读取配置，.env 需要在任何子模块导入之前加载，且每个进程只加载一次
+load_dotenv()
+
 
 def _configure_logging() -> None:
-    load_dotenv()
+    from .logs import configure_logging
+
     level_name = os.getenv("SERPER_LOG_LEVEL", "INFO").upper()
     level = getattr(logging, level_name, logging.INFO)
-    log_file = os.getenv("SERPER_LOG_FILE", "").strip()
-
-    handlers: list[logging.Handler] = [logging.StreamHandler(sys.stderr)]
-    if log_file:
-        log_dir = os.path.dirname(log_file)
-        if log_dir:
-            os.makedirs(log_dir, exist_ok=True)
-        handlers.append(logging.FileHandler(log_file, encoding="utf-8"))
-
-    logging.basicConfig(
-        level=level,
-        format="%(asctime)s %(levelname)s %(name)s - %(message)s",
-        handlers=handlers,
-        force=True,
-    )
+    configure_logging(level, os.getenv("SERPER_LOG_FILE", "").strip())
 
     logging.getLogger(__name__).debug("日志系统已初始化，当前级别：%s", logging.getLevelName(level))
 
 
+def _parse_args() -> argparse.Namespace:
+    from .transport import TRANSPORTS, HTTP_TRANSPORT, HTTP_HOST, HTTP_PORT, HTTP_WORKERS
+
+    parser = argparse.ArgumentParser(prog="serper-mcp-server", description="A MCP server for Serper")
+    parser.add_argument(
+        "--transport",
+        choices=TRANSPORTS,
+        default=HTTP_TRANSPORT,
+        help="stdio for a single client, sse / streamable-http to serve many clients from one process",
+    )
+    parser.add_argument("--host", default=HTTP_HOST, help="Host to bind for HTTP transports")
+    parser.add_argument("--port", type=int, default=HTTP_PORT, help="Port to bind for HTTP transports")
+    parser.add_argument("--workers", type=int, default=HTTP_WORKERS, help="Number of worker processes for HTTP transports")
+    parser.add_argument(
+        "--profile-startup",
+        action="store_true",
+        help="Print an import-time breakdown up to the point the server can answer initialize, then exit",
+    )
+    return parser.parse_args()
+
+
 def main():
     _configure_logging()
-    # parser = argparse.ArgumentParser()
-    # parser.add_argument("--q", type=str, help="The query to search for")
-    # args = parser.parse_args()
+    args = _parse_args()
+    if args.profile_startup:
+        from .profiling import profile_startup
+
+        sys.exit(profile_startup(_STARTED))
+    if args.transport != "stdio":
+        from .transport import run_http
+
+        run_http(args.transport, args.host, args.port, args.workers)
+        return
+
     from . import server
 
     asyncio.run(server.main())
@@ -0,0 +1,245 @@
+import os
+import json
+import asyncio
+import logging
+import itertools
+from typing import Any, Dict, Optional, Set, Tuple
+
+from .cache import ResponseCache, CACHE_MAX_ENTRIES, CACHE_MAX_BYTES
+from .limiter import TokenBucket, QueueTimeout, key_scale, remaining_time, UPSTREAM_QPS, UPSTREAM_BURST, UPSTREAM_MIN_QPS
+
+# 多进程模式下由启动器设置，工作进程据此连接到协调进程
+BROKER_SOCKET = os.getenv("SERPER_BROKER_SOCKET", "").strip()
+
+logger = logging.getLogger(__name__)
+
+
+class Broker:
+    """多工作进程共享的协调服务：持有全局令牌桶和全局响应缓存
+
+    通过 Unix socket 提供按行分隔的 JSON 协议；带 id 的请求会收到同 id 的应答，
+    不带 id 的消息为单向通知。
+    """
+
+    def __init__(self):
+        self.buckets: Dict[str, TokenBucket] = {}
+        self.cache = ResponseCache(CACHE_MAX_ENTRIES, CACHE_MAX_BYTES)
+
+    def _bucket(self, host: str) -> TokenBucket:
+        bucket = self.buckets.get(host)
+        if bucket is None:
+            scale = key_scale()
+            bucket = self.buckets[host] = TokenBucket(UPSTREAM_QPS * scale, UPSTREAM_BURST * scale, UPSTREAM_MIN_QPS)
+        return bucket
+
+    def handle(self, message: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        op = message.get("op")
+        if op == "acquire":
+            bucket = self._bucket(message["host"])
+            return {"delay": bucket.reserve(), "rate": bucket.rate}
+        if op == "response":
+            bucket = self._bucket(message["host"])
+            if message["status"] == 429:
+                bucket.on_throttled(message.get("retry_after"))
+            elif message["status"] < 400:
+                bucket.on_success()
+            return None
+        if op == "cache_get":
+            cached = self.cache.get(message["key"])
+            if cached is None:
+                return {"body": None}
+            body, age = cached
+            return {"body": body, "age": age}
+        if op == "cache_set":
+            body = message["body"]
+            self.cache.set(message["key"], body, message["ttl"], len(body))
+            return None
+        if op == "stats":
+            return {
+                "cache": self.cache.stats(),
+                "rates": {host: bucket.rate for host, bucket in self.buckets.items()},
+            }
+        raise ValueError(f"Unknown broker op: {op}")
+
+    async def _serve_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                message = json.loads(line)
+                try:
+                    reply = self.handle(message)
+                except Exception as e:
+                    logger.exception("协调进程处理消息失败：%s", message.get("op"))
+                    reply = {"error": str(e)}
+                if "id" in message:
+                    writer.write(json.dumps({"id": message["id"], **(reply or {})}).encode("utf-8") + b"\n")
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, path: str) -> None:
+        if os.path.exists(path):
+            os.unlink(path)
+        server = await asyncio.start_unix_server(self._serve_client, path=path, limit=64 * 1024 * 1024)
+        logger.info("协调进程已启动：%s，进程：%d", path, os.getpid())
+        async with server:
+            await server.serve_forever()
+
+
+def run_broker(path: str) -> None:
+    """协调进程入口"""
+    from . import _configure_logging
+
+    _configure_logging()
+    try:
+        asyncio.run(Broker().serve(path))
+    except KeyboardInterrupt:
+        pass
+
+
+class BrokerClient:
+    """工作进程到协调进程的连接，支持并发请求和单向通知"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._connecting: Optional[asyncio.Future] = None
+        self._waiters: Dict[int, asyncio.Future] = {}
+        self._ids = itertools.count()
+        self._reader_task: Optional[asyncio.Task] = None
+        self._pending: Set[asyncio.Task] = set()
+
+    async def _connect(self) -> asyncio.StreamWriter:
+        loop = asyncio.get_running_loop()
+        if self._writer is not None and self._loop is loop and not self._writer.is_closing():
+            return self._writer
+        if self._connecting is not None and self._loop is loop:
+            return await asyncio.shield(self._connecting)
+        self._loop = loop
+        self._connecting = loop.create_future()
+        try:
+            self._reader, self._writer = await asyncio.open_unix_connection(self.path, limit=64 * 1024 * 1024)
+            self._reader_task = loop.create_task(self._read_loop(self._reader))
+            self._connecting.set_result(self._writer)
+            logger.debug("已连接协调进程：%s", self.path)
+            return self._writer
+        except BaseException as e:
+            self._connecting.set_exception(e)
+            self._connecting.exception()
+            raise
+        finally:
+            self._connecting = None
+
+    async def _read_loop(self, reader: asyncio.StreamReader) -> None:
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                reply = json.loads(line)
+                waiter = self._waiters.pop(reply.pop("id"), None)
+                if waiter is not None and not waiter.done():
+                    waiter.set_result(reply)
+        finally:
+            self._writer = None
+            for waiter in self._waiters.values():
+                if not waiter.done():
+                    waiter.set_exception(ConnectionError("broker connection closed"))
+            self._waiters.clear()
+
+    async def request(self, message: Dict[str, Any]) -> Dict[str, Any]:
+        writer = await self._connect()
+        request_id = next(self._ids)
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters[request_id] = waiter
+        writer.write(json.dumps({"id": request_id, **message}).encode("utf-8") + b"\n")
+        try:
+            reply = await waiter
+        finally:
+            self._waiters.pop(request_id, None)
+        if "error" in reply:
+            raise RuntimeError(reply["error"])
+        return reply
+
+    def notify(self, message: Dict[str, Any]) -> None:
+        """发送无需应答的消息，失败只记录日志"""
+        task = asyncio.get_running_loop().create_task(self._notify(message))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    async def _notify(self, message: Dict[str, Any]) -> None:
+        try:
+            writer = await self._connect()
+            writer.write(json.dumps(message).encode("utf-8") + b"\n")
+        except Exception as e:
+            logger.warning("通知协调进程失败：%s", e)
+
+    async def cache_get(self, key: str) -> Optional[Tuple[bytes, float]]:
+        """从全局缓存读取原始响应体，返回 (响应体, 已缓存秒数)"""
+        try:
+            reply = await self.request({"op": "cache_get", "key": key})
+        except Exception as e:
+            logger.warning("读取全局缓存失败：%s", e)
+            return None
+        if reply.get("body") is None:
+            return None
+        return reply["body"].encode("utf-8"), reply["age"]
+
+    def cache_put(self, key: str, body: bytes, ttl: float) -> None:
+        if ttl > 0:
+            self.notify({"op": "cache_set", "key": key, "body": body.decode("utf-8"), "ttl": ttl})
+
+    async def close(self) -> None:
+        if self._pending:
+            await asyncio.gather(*self._pending, return_exceptions=True)
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+            self._reader_task = None
+
+
+class RemoteTokenBucket:
+    """由协调进程统一发放令牌的令牌桶，接口与 TokenBucket 一致；协调进程不可用时退回本地限速"""
+
+    def __init__(self, host: str, client: BrokerClient, fallback: TokenBucket):
+        self.host = host
+        self.client = client
+        self.fallback = fallback
+        self.rate = fallback.rate
+
+    @property
+    def enabled(self) -> bool:
+        return self.fallback.enabled
+
+    async def acquire(self) -> None:
+        if not self.enabled:
+            return
+        try:
+            reply = await self.client.request({"op": "acquire", "host": self.host})
+        except Exception as e:
+            logger.warning("向协调进程申请令牌失败，改用本地限速：%s", e)
+            await self.fallback.acquire()
+            return
+        self.rate = reply["rate"]
+        if reply["delay"] > 0:
+            remaining = remaining_time()
+            if remaining is not None and reply["delay"] > remaining:
+                raise QueueTimeout()
+            await asyncio.sleep(reply["delay"])
+
+    def on_success(self) -> None:
+        self.client.notify({"op": "response", "host": self.host, "status": 200})
+
+    def on_throttled(self, retry_after: Optional[float]) -> None:
+        self.fallback.on_throttled(retry_after)
+        self.client.notify({"op": "response", "host": self.host, "status": 429, "retry_after": retry_after})
+
+
+broker_client: Optional[BrokerClient] = BrokerClient(BROKER_SOCKET) if BROKER_SOCKET else None
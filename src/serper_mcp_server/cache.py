@@ -0,0 +1,333 @@
+import os
+import json
+import time
+import zlib
+import sqlite3
+import asyncio
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Set, Tuple
+from urllib.parse import urlsplit, urlunsplit
+from .client import SCRAPE_BASE_URL
+
+CACHE_ENABLED = os.getenv("SERPER_CACHE_ENABLED", "true").strip().lower() == "true"
+CACHE_MAX_ENTRIES = int(os.getenv("SERPER_CACHE_MAX_ENTRIES", "1000"))
+CACHE_MAX_BYTES = int(os.getenv("SERPER_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+CACHE_TTL_DEFAULT = int(os.getenv("SERPER_CACHE_TTL", "600"))
+CACHE_TTL_RECENT = int(os.getenv("SERPER_CACHE_TTL_RECENT", "120"))
+# 过期后仍可直接返回并在后台刷新的秒数，以及上游失败时可返回的过期结果的最大过期秒数
+CACHE_STALE_WHILE_REVALIDATE = float(os.getenv("SERPER_CACHE_STALE_WHILE_REVALIDATE", "0"))
+CACHE_STALE_IF_ERROR = float(os.getenv("SERPER_CACHE_STALE_IF_ERROR", "0"))
+DISK_CACHE_PATH = os.getenv("SERPER_DISK_CACHE_PATH", "").strip()
+DISK_CACHE_MAX_BYTES = int(os.getenv("SERPER_DISK_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+DISK_CACHE_COMPACT_INTERVAL = float(os.getenv("SERPER_DISK_CACHE_COMPACT_INTERVAL", "300"))
+
+# 各接口的默认缓存时间（秒），可通过 SERPER_CACHE_TTL_<接口名> 覆盖
+_DEFAULT_TTLS = {
+    "search": CACHE_TTL_DEFAULT,
+    "images": 3600,
+    "videos": 3600,
+    "places": 3600,
+    "maps": 3600,
+    "reviews": 3600,
+    "news": 300,
+    "shopping": 1800,
+    "lens": 3600,
+    "scholar": 86400,
+    "patents": 86400,
+    "autocomplete": 3600,
+    "scrape": 3600,
+}
+
+CACHE_TTLS: Dict[str, int] = {
+    name: int(os.getenv(f"SERPER_CACHE_TTL_{name.upper()}", str(ttl)))
+    for name, ttl in _DEFAULT_TTLS.items()
+}
+
+logger = logging.getLogger(__name__)
+
+
+def endpoint_name(url: str) -> str:
+    """从上游 URL 中提取接口名，例如 search、news、scrape"""
+    if url.rstrip("/") == SCRAPE_BASE_URL:
+        return "scrape"
+    return url.rstrip("/").rsplit("/", 1)[-1]
+
+
+def _is_recent(tbs: Any) -> bool:
+    """判断时间过滤条件是否为最近一小时或一天"""
+    if not isinstance(tbs, str):
+        return False
+    value = tbs.strip().lower()
+    if value.startswith("qdr:"):
+        value = value[4:]
+    return value[:1] in ("h", "d")
+
+
+def ttl_for(url: str, payload: Dict[str, Any]) -> int:
+    """根据接口和参数计算缓存时间，返回 0 表示不缓存"""
+    if not CACHE_ENABLED:
+        return 0
+    ttl = CACHE_TTLS.get(endpoint_name(url), CACHE_TTL_DEFAULT)
+    if _is_recent(payload.get("tbs")):
+        ttl = min(ttl, CACHE_TTL_RECENT)
+    return max(ttl, 0)
+
+
+def cache_key(url: str, payload: Dict[str, Any]) -> str:
+    """以 URL 和规范化后的请求参数生成缓存键"""
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(f"{url}\n{canonical}".encode("utf-8")).hexdigest()
+
+
+_DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def normalize_url(url: str) -> str:
+    """规范化网页地址用于去重：协议和主机名小写，去掉默认端口和 # 片段，空路径补为 /"""
+    url = url.strip()
+    try:
+        parts = urlsplit(url)
+        port = parts.port
+    except ValueError:
+        return url
+    if not parts.scheme or not parts.hostname:
+        return url
+    scheme = parts.scheme.lower()
+    host = parts.hostname
+    netloc = f"[{host}]" if ":" in host else host
+    if "@" in parts.netloc:
+        netloc = parts.netloc.rsplit("@", 1)[0] + "@" + netloc
+    if port is not None and port != _DEFAULT_PORTS.get(scheme):
+        netloc = f"{netloc}:{port}"
+    return urlunsplit((scheme, netloc, parts.path or "/", parts.query, ""))
+
+
+class ResponseCache:
+    """按条目数和字节数限制容量的 TTL + LRU 内存缓存
+
+    stale_retention 大于 0 时，过期条目再保留这么多秒，可通过 get_stale 取得。
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int, stale_retention: float = 0.0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.stale_retention = stale_retention
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+        self.evictions = 0
+        # key -> (过期时间, 写入时间, 字节数, 响应数据)
+        self._entries: "OrderedDict[str, Tuple[float, float, int, Dict[str, Any]]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[Tuple[Dict[str, Any], float]]:
+        """返回 (数据, 已缓存秒数)，未命中或已过期时返回 None"""
+        entry = self._entries.get(key)
+        now = time.monotonic()
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, stored_at, _, value = entry
+        if expires_at <= now:
+            if now - expires_at > self.stale_retention:
+                self._remove(key)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value, now - stored_at
+
+    def __contains__(self, key: str) -> bool:
+        """是否有未过期的条目，不计入命中统计，也不调整 LRU 顺序"""
+        entry = self._entries.get(key)
+        return entry is not None and entry[0] > time.monotonic()
+
+    def get_stale(self, key: str, max_stale: float) -> Optional[Tuple[Dict[str, Any], float, float]]:
+        """返回过期不超过 max_stale 秒的条目 (数据, 已缓存秒数, 已过期秒数)，未过期的条目不在此返回"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        now = time.monotonic()
+        expires_at, stored_at, _, value = entry
+        if expires_at > now or now - expires_at > min(max_stale, self.stale_retention):
+            return None
+        self.stale_hits += 1
+        return value, now - stored_at, now - expires_at
+
+    def set(self, key: str, value: Dict[str, Any], ttl: float, size: int) -> None:
+        if ttl <= 0 or size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        now = time.monotonic()
+        self._entries[key] = (now + ttl, now, size, value)
+        self.total_bytes += size
+        while len(self._entries) > self.max_entries or self.total_bytes > self.max_bytes:
+            evicted_key, _ = next(iter(self._entries.items()))
+            self._remove(evicted_key)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.total_bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.total_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale_hits": self.stale_hits,
+            "evictions": self.evictions,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+    def _remove(self, key: str) -> None:
+        _, _, size, _ = self._entries.pop(key)
+        self.total_bytes -= size
+
+
+class DiskCache:
+    """基于 SQLite WAL 的持久化缓存，可被同一主机上的多个服务进程同时读写
+
+    响应体以 zlib 压缩后的 JSON 保存，过期时间使用墙上时钟以便跨进程共享；
+    后台任务定期清理过期条目，并在超出容量时按写入时间淘汰最旧的条目。
+    """
+
+    def __init__(self, path: str, max_bytes: int, compact_interval: float):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.compact_interval = compact_interval
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._compactor: Optional[asyncio.Task] = None
+        self._pending: Set[asyncio.Task] = set()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5.0, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA busy_timeout=5000")
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, body BLOB NOT NULL, size INTEGER NOT NULL, "
+                "raw_size INTEGER NOT NULL, stored_at REAL NOT NULL, expires_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS responses_expires_at ON responses (expires_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS responses_stored_at ON responses (stored_at)")
+            self._conn = conn
+            logger.debug("磁盘缓存已打开：%s", self.path)
+        return self._conn
+
+    def _get(self, key: str) -> Optional[Tuple[Dict[str, Any], float, float, int]]:
+        now = time.time()
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT body, raw_size, stored_at, expires_at FROM responses WHERE key = ? AND expires_at > ?",
+                (key, now),
+            ).fetchone()
+        if row is None:
+            return None
+        body, raw_size, stored_at, expires_at = row
+        return json.loads(zlib.decompress(body)), now - stored_at, expires_at - now, raw_size
+
+    def _set(self, key: str, body: bytes, ttl: float) -> None:
+        compressed = zlib.compress(body, 6)
+        now = time.time()
+        with self._lock:
+            self._connect().execute(
+                "INSERT OR REPLACE INTO responses (key, body, size, raw_size, stored_at, expires_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, compressed, len(compressed), len(body), now, now + ttl),
+            )
+
+    def _compact(self) -> Tuple[int, int]:
+        """删除过期条目并把总大小压回上限以内，返回 (删除过期数, 淘汰数)"""
+        with self._lock:
+            conn = self._connect()
+            expired = conn.execute("DELETE FROM responses WHERE expires_at <= ?", (time.time(),)).rowcount
+            evicted = 0
+            (total,) = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()
+            if total > self.max_bytes:
+                kept = 0
+                cutoff = None
+                for stored_at, size in conn.execute("SELECT stored_at, size FROM responses ORDER BY stored_at DESC"):
+                    kept += size
+                    if kept > self.max_bytes:
+                        cutoff = stored_at
+                        break
+                if cutoff is not None:
+                    evicted = conn.execute("DELETE FROM responses WHERE stored_at <= ?", (cutoff,)).rowcount
+            if expired or evicted:
+                conn.execute("PRAGMA incremental_vacuum")
+                conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
+        return expired, evicted
+
+    async def get(self, key: str) -> Optional[Tuple[Dict[str, Any], float, float, int]]:
+        """返回 (数据, 已缓存秒数, 剩余有效秒数, 原始字节数)，未命中时返回 None"""
+        self._ensure_compactor()
+        try:
+            return await asyncio.to_thread(self._get, key)
+        except Exception as e:
+            logger.warning("读取磁盘缓存失败：%s", e)
+            return None
+
+    def put(self, key: str, body: bytes, ttl: float) -> None:
+        """在后台线程写入磁盘缓存，不阻塞当前请求"""
+        if ttl <= 0:
+            return
+        task = asyncio.get_running_loop().create_task(self._write(key, body, ttl))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    async def _write(self, key: str, body: bytes, ttl: float) -> None:
+        try:
+            await asyncio.to_thread(self._set, key, body, ttl)
+        except Exception as e:
+            logger.warning("写入磁盘缓存失败：%s", e)
+
+    def _ensure_compactor(self) -> None:
+        if self._compactor is None or self._compactor.done():
+            self._compactor = asyncio.get_running_loop().create_task(self._compact_loop())
+
+    async def _compact_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.compact_interval)
+            try:
+                expired, evicted = await asyncio.to_thread(self._compact)
+                if expired or evicted:
+                    logger.debug("磁盘缓存整理完成，过期删除：%d，容量淘汰：%d", expired, evicted)
+            except Exception as e:
+                logger.warning("磁盘缓存整理失败：%s", e)
+
+    async def aclose(self) -> None:
+        """等待未完成的写入并关闭数据库连接"""
+        if self._compactor is not None:
+            self._compactor.cancel()
+            self._compactor = None
+        if self._pending:
+            await asyncio.gather(*self._pending, return_exceptions=True)
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+response_cache = ResponseCache(
+    CACHE_MAX_ENTRIES, CACHE_MAX_BYTES, max(CACHE_STALE_WHILE_REVALIDATE, CACHE_STALE_IF_ERROR)
+)
+disk_cache: Optional[DiskCache] = (
+    DiskCache(DISK_CACHE_PATH, DISK_CACHE_MAX_BYTES, DISK_CACHE_COMPACT_INTERVAL) if DISK_CACHE_PATH else None
+)
@@ -0,0 +1,60 @@
+import time
+from typing import Any, Dict
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, key: str):
+        super().__init__(f"Upstream {key} is failing, requests are paused until a probe succeeds (circuit open)")
+        self.key = key
+
+
+class CircuitBreaker:
+    """按分组统计连续失败次数，达到阈值后熔断
+
+    熔断期间 allow 返回 False；冷却时间结束后放行一个试探请求，试探成功即恢复，
+    失败则重新熔断。试探请求在下一个冷却时间内没有结果时，允许再次试探。
+    """
+
+    def __init__(self, threshold: int, cooldown: float):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._failures: Dict[str, int] = {}
+        self._open_until: Dict[str, float] = {}
+        self._probe_until: Dict[str, float] = {}
+        self.opened = 0
+
+    def is_open(self, key: str) -> bool:
+        """熔断中且冷却未结束"""
+        return time.monotonic() < self._open_until.get(key, 0.0)
+
+    def allow(self, key: str) -> bool:
+        """判断是否放行请求；冷却结束后的第一个调用方获得试探机会"""
+        if self.threshold <= 0 or key not in self._open_until:
+            return True
+        now = time.monotonic()
+        if now < self._open_until[key] or now < self._probe_until.get(key, 0.0):
+            return False
+        self._probe_until[key] = now + self.cooldown
+        return True
+
+    def record_success(self, key: str) -> None:
+        self._failures.pop(key, None)
+        self._open_until.pop(key, None)
+        self._probe_until.pop(key, None)
+
+    def record_failure(self, key: str) -> None:
+        failures = self._failures.get(key, 0) + 1
+        self._failures[key] = failures
+        if self.threshold > 0 and failures >= self.threshold:
+            if not self.is_open(key):
+                self.opened += 1
+            self._open_until[key] = time.monotonic() + self.cooldown
+            self._probe_until.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            "open": sorted(key for key, until in self._open_until.items() if until > now),
+            "failing": {key: count for key, count in self._failures.items() if count},
+            "opened": self.opened,
+        }
@@ -0,0 +1,104 @@
+import os
+import logging
+import asyncio
+from typing import TYPE_CHECKING, Optional
+
+# aiohttp、ssl 和 certifi 导入较慢，推迟到首次请求上游时再导入，缩短 stdio 会话的启动时间
+if TYPE_CHECKING:
+    import ssl
+    import aiohttp
+
+HTTP_POOL_LIMIT = int(os.getenv("SERPER_HTTP_POOL_LIMIT", "100"))
+HTTP_POOL_LIMIT_PER_HOST = int(os.getenv("SERPER_HTTP_POOL_LIMIT_PER_HOST", "20"))
+HTTP_KEEPALIVE_TIMEOUT = float(os.getenv("SERPER_HTTP_KEEPALIVE_TIMEOUT", "60"))
+HTTP_DNS_CACHE_TTL = int(os.getenv("SERPER_HTTP_DNS_CACHE_TTL", "300"))
+HTTP_WARMUP = os.getenv("SERPER_HTTP_WARMUP", "false").strip().lower() == "true"
+HTTP_WARMUP_TIMEOUT = float(os.getenv("SERPER_HTTP_WARMUP_TIMEOUT", "5"))
+
+# 上游地址，可指向本地模拟服务用于压测
+GOOGLE_BASE_URL = os.getenv("SERPER_GOOGLE_BASE_URL", "https://google.serper.dev").rstrip("/")
+SCRAPE_BASE_URL = os.getenv("SERPER_SCRAPE_BASE_URL", "https://scrape.serper.dev").rstrip("/")
+
+# 启动预热时需要建立连接的上游主机
+WARMUP_URLS = (
+    GOOGLE_BASE_URL,
+    SCRAPE_BASE_URL,
+)
+
+logger = logging.getLogger(__name__)
+
+_ssl_context: Optional["ssl.SSLContext"] = None
+_session: Optional["aiohttp.ClientSession"] = None
+_session_loop: Optional[asyncio.AbstractEventLoop] = None
+# close_session 之后置为 True，服务关闭期间残留的请求不能重新创建会话
+_closed = False
+
+
+def get_ssl_context() -> "ssl.SSLContext":
+    """返回进程内共享的 SSL 上下文，证书包只读取一次"""
+    global _ssl_context
+    if _ssl_context is None:
+        import ssl
+        import certifi
+
+        _ssl_context = ssl.create_default_context(cafile=certifi.where())
+    return _ssl_context
+
+
+def get_session() -> "aiohttp.ClientSession":
+    """返回与当前事件循环绑定的共享 ClientSession，按需创建；服务关闭后抛出 RuntimeError"""
+    global _session, _session_loop
+    if _closed:
+        raise RuntimeError("HTTP session is closed, the server is shutting down")
+    loop = asyncio.get_running_loop()
+    if _session is None or _session.closed or _session_loop is not loop:
+        import aiohttp
+
+        connector = aiohttp.TCPConnector(
+            ssl=get_ssl_context(),
+            limit=HTTP_POOL_LIMIT,
+            limit_per_host=HTTP_POOL_LIMIT_PER_HOST,
+            keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT,
+            ttl_dns_cache=HTTP_DNS_CACHE_TTL,
+        )
+        _session = aiohttp.ClientSession(connector=connector)
+        _session_loop = loop
+        logger.debug(
+            "已创建共享 HTTP 会话，连接上限：%d，单主机上限：%d，保活：%ss，DNS 缓存：%ss",
+            HTTP_POOL_LIMIT,
+            HTTP_POOL_LIMIT_PER_HOST,
+            HTTP_KEEPALIVE_TIMEOUT,
+            HTTP_DNS_CACHE_TTL,
+        )
+    return _session
+
+
+async def warm_up() -> None:
+    """预先与上游主机完成 TLS 握手，使首个工具调用复用已建立的连接"""
+    import aiohttp
+
+    session = get_session()
+    timeout = aiohttp.ClientTimeout(total=HTTP_WARMUP_TIMEOUT)
+
+    async def _touch(url: str) -> None:
+        try:
+            async with session.head(url, timeout=timeout) as response:
+                logger.debug("连接预热完成：%s，状态码：%s", url, response.status)
+        except Exception as e:
+            logger.warning("连接预热失败：%s，原因：%s", url, e)
+
+    await asyncio.gather(*(_touch(url) for url in WARMUP_URLS))
+
+
+async def close_session() -> None:
+    """关闭共享会话并释放连接池，之后 get_session 不再创建新会话"""
+    global _session, _session_loop, _closed
+    _closed = True
+    session = _session
+    _session = None
+    _session_loop = None
+    if session is not None and not session.closed:
+        await session.close()
+        # 给 SSL 传输留出一次调度机会完成关闭
+        await asyncio.sleep(0)
+        logger.debug("共享 HTTP 会话已关闭")
@@ -1,79 +1,588 @@
 import os
-import ssl
+import json
 import logging
 import time
 import asyncio
-from typing import Dict, Any, List
-import certifi
-import aiohttp
+from typing import Dict, Any, Awaitable, Callable, List, Optional, Set, Tuple
 from pydantic import BaseModel
+from .broker import broker_client
+from .cache import response_cache, disk_cache, cache_key, ttl_for, endpoint_name, normalize_url, CACHE_STALE_WHILE_REVALIDATE, CACHE_STALE_IF_ERROR
+from .circuit import CircuitBreaker, CircuitOpenError
+from .client import GOOGLE_BASE_URL, SCRAPE_BASE_URL, get_session
+from .hedge import hedged, WireTiming
+from .ingest import read_body, scrape_field_limits
+from .keys import key_pool
+from .latency import latency_key
+from .limiter import get_limiter, background, current_tool, remaining_time, QueueTimeout
+from .logs import debug_enabled, summarize_payload
+from .merge import merge_regions
+from .regions import region_circuit, resolve_regions, plan_regions
+from .metrics import span, cache_lookups, coalesced_requests, upstream_requests, upstream_duration, upstream_request_bytes, upstream_response_bytes
+from .retry import with_retries, is_retryable
+from .singleflight import SingleFlight
 from .enums import SerperTools
-from .schemas import WebpageRequest, MultiRegionSearchRequest, REGION_CONFIGS
+from .schemas import WebpageRequest, WebpageBatchRequest, MultiRegionSearchRequest, BatchSearchRequest
 
-SERPER_API_KEY = str.strip(os.getenv("SERPER_API_KEY", ""))
 AIOHTTP_TIMEOUT = int(os.getenv("AIOHTTP_TIMEOUT", "15"))
-LOG_PAYLOAD_LIMIT = int(os.getenv("SERPER_LOG_PAYLOAD_LIMIT", "200"))
+# 上游单次批量请求允许的最大查询数
+BATCH_MAX_SIZE = int(os.getenv("SERPER_BATCH_MAX_SIZE", "100"))
+# 批量抓取时同时进行的抓取数，以及单个 URL 的默认超时（秒）
+SCRAPE_BATCH_CONCURRENCY = int(os.getenv("SERPER_SCRAPE_BATCH_CONCURRENCY", "5"))
+SCRAPE_URL_TIMEOUT = float(os.getenv("SERPER_SCRAPE_URL_TIMEOUT", str(AIOHTTP_TIMEOUT)))
+
+# 每个上游接口连续失败多少次后熔断，以及熔断后多少秒放行试探请求
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("SERPER_CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_COOLDOWN = float(os.getenv("SERPER_CIRCUIT_COOLDOWN", "30"))
+
+# 多地区搜索中单个地区完成时的回调：(gl, 结果, 已完成数, 总数)
+RegionCallback = Callable[[str, Dict[str, Any], int, int], Awaitable[None]]
 
 logger = logging.getLogger(__name__)
 
+inflight = SingleFlight()
+upstream_circuit = CircuitBreaker(CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_COOLDOWN)
+# 进行中的后台刷新任务，保留引用避免被回收
+_refreshes: Set[asyncio.Task] = set()
+
 
 async def google(tool: SerperTools, request: BaseModel) -> Dict[str, Any]:
     uri_path = tool.value.split("_")[-1]
-    url = f"https://google.serper.dev/{uri_path}"
+    url = f"{GOOGLE_BASE_URL}/{uri_path}"
     logger.debug("准备调用 Google Serper 接口：%s", url)
     return await fetch_json(url, request)
 
 
 async def scape(request: WebpageRequest) -> Dict[str, Any]:
-    url = "https://scrape.serper.dev"
+    url = SCRAPE_BASE_URL
     logger.debug("准备调用网页抓取接口：%s", url)
     return await fetch_json(url, request)
 
 
-def _summarize_payload(payload: Dict[str, Any]) -> Dict[str, Any]:
-    summary: Dict[str, Any] = {}
-    for key, value in payload.items():
-        if isinstance(value, str) and len(value) > LOG_PAYLOAD_LIMIT:
-            summary[key] = f"{value[:LOG_PAYLOAD_LIMIT]}...(已截断)"
-        else:
-            summary[key] = value
-    return summary
+async def scrape_entry(url: str, include_markdown: Optional[str], timeout: float) -> Dict[str, Any]:
+    """抓取单个页面并限时，失败和超时转换为带 status 字段的结果而不抛出"""
+    import aiohttp
+
+    payload = WebpageRequest(url=url, includeMarkdown=include_markdown).model_dump(exclude_none=True)
+    try:
+        data = await asyncio.wait_for(_request_json(SCRAPE_BASE_URL, payload), timeout)
+    except asyncio.TimeoutError:
+        return {"status": "timeout", "error": f"No response within {timeout:g}s"}
+    except aiohttp.ClientResponseError as e:
+        return {"status": "error", "error": f"HTTP {e.status}"}
+    except CircuitOpenError as e:
+        return {"status": "error", "error": str(e)}
+    except Exception as e:
+        logger.exception("页面抓取异常：%s", url)
+        return {"status": "error", "error": str(e)}
+    return {"status": "ok", **data}
+
+
+async def scrape_batch(request: WebpageBatchRequest) -> Dict[str, Any]:
+    """批量抓取：URL 规范化去重后在并发上限内抓取，每个 URL 单独计时，结果按输入顺序返回"""
+    timeout = float(request.timeout) if request.timeout else SCRAPE_URL_TIMEOUT
+    results: List[Optional[Dict[str, Any]]] = [None] * len(request.urls)
+    # 规范化后的 URL -> 请求中使用该 URL 的下标，相同页面只抓取一次
+    pending: Dict[str, List[int]] = {}
+    for index, url in enumerate(request.urls):
+        pending.setdefault(normalize_url(url), []).append(index)
+    semaphore = asyncio.Semaphore(max(SCRAPE_BATCH_CONCURRENCY, 1))
+    logger.debug(
+        "开始批量抓取，URL 数：%d，去重后：%d，并发上限：%d，单个超时：%ss",
+        len(request.urls),
+        len(pending),
+        SCRAPE_BATCH_CONCURRENCY,
+        timeout,
+    )
+
+    async def run(target: str) -> None:
+        # 超时从拿到并发名额后开始计算，排队时间不计入
+        async with semaphore:
+            entry = await scrape_entry(target, request.includeMarkdown, timeout)
+        for index in pending[target]:
+            results[index] = {"index": index, "url": request.urls[index], **entry}
+
+    await asyncio.gather(*(run(target) for target in pending))
+
+    failed = [entry["index"] for entry in results if entry["status"] != "ok"]
+    return {
+        "results": results,
+        "metadata": {
+            "total_urls": len(request.urls),
+            "unique_urls": len(pending),
+            "successful_urls": len(request.urls) - len(failed),
+            "failed_urls": failed,
+            "timed_out_urls": [entry["index"] for entry in results if entry["status"] == "timeout"],
+        },
+    }
 
 
 async def fetch_json(url: str, request: BaseModel) -> Dict[str, Any]:
     payload = request.model_dump(exclude_none=True)
-    payload_summary = _summarize_payload(payload)
-    headers = {
-        'X-API-KEY': SERPER_API_KEY,
-        'Content-Type': 'application/json'
+    try:
+        return await _request_json(url, payload)
+    except CircuitOpenError as e:
+        # 熔断是预期内的拒绝，不记录调用栈
+        logger.warning("请求被熔断拒绝：%s，原因：%s", url, e)
+        raise
+    except QueueTimeout:
+        logger.warning("请求排队超时，未发往上游：%s", url)
+        raise
+    except Exception:
+        logger.exception("请求异常：%s", url)
+        raise
+
+
+async def _request_json(
+    url: str,
+    payload: Dict[str, Any],
+    trace: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """带响应缓存和请求合并的上游请求，结果中的 cache 字段标明是否命中缓存
+
+    trace 用于回传本次调用的上游细节，例如实际尝试次数 attempts。
+    过期不久的结果直接返回并在后台刷新；上游失败或熔断时，在允许范围内返回过期结果。
+    """
+    ttl = ttl_for(url, payload)
+    key = cache_key(url, payload)
+    endpoint = endpoint_name(url)
+    if ttl > 0:
+        cached = await _lookup_cache(url, key, ttl)
+        if cached is not None:
+            return cached
+        if CACHE_STALE_WHILE_REVALIDATE > 0:
+            stale = _stale_result(url, key, CACHE_STALE_WHILE_REVALIDATE)
+            if stale is not None:
+                stale["cache"]["revalidating"] = _revalidate(url, payload, key, ttl)
+                return stale
+
+    if not upstream_circuit.allow(endpoint):
+        stale = _stale_result(url, key, CACHE_STALE_IF_ERROR) if ttl > 0 else None
+        if stale is None:
+            _count_miss(url, ttl)
+            raise CircuitOpenError(endpoint)
+        logger.warning("上游 %s 处于熔断状态，返回过期缓存：%s", endpoint, url)
+        stale["cache"]["error"] = "circuit open"
+        return stale
+
+    # 相同 URL 和参数的并发请求只向上游发送一次
+    try:
+        data, coalesced = await inflight.do(flight_key(key), lambda: _fetch_and_store(url, payload, key, ttl, trace))
+    except Exception as e:
+        stale = _stale_result(url, key, CACHE_STALE_IF_ERROR) if ttl > 0 and is_retryable(e) else None
+        if stale is None:
+            _count_miss(url, ttl)
+            raise
+        error = _error_text(e)
+        logger.warning("上游请求失败，返回过期缓存：%s，原因：%s", url, error)
+        stale["cache"]["error"] = error
+        return stale
+    _count_miss(url, ttl)
+    cache_info: Dict[str, Any] = {"status": "miss" if ttl > 0 else "bypass"}
+    if coalesced:
+        cache_info["coalesced"] = True
+        coalesced_requests.inc(endpoint)
+    return {**data, "cache": cache_info}
+
+
+def flight_key(key: str, low_priority: Optional[bool] = None) -> str:
+    """请求合并使用的键；后台请求单独合并，前台请求不会加入只能在空闲时获得名额的后台请求"""
+    if low_priority is None:
+        low_priority = background.get()
+    return f"{key}:background" if low_priority else key
+
+
+def _error_text(exc: BaseException) -> str:
+    import aiohttp
+
+    if isinstance(exc, aiohttp.ClientResponseError):
+        return f"HTTP {exc.status}"
+    return str(exc) or type(exc).__name__
+
+
+def _count_miss(url: str, ttl: int) -> None:
+    """缓存未命中在确定不返回过期结果后才计数，每次查询只计入 miss 或 stale 之一"""
+    if ttl > 0:
+        cache_lookups.inc(endpoint_name(url), "miss")
+
+
+def _stale_result(url: str, key: str, max_stale: float) -> Optional[Dict[str, Any]]:
+    """从内存缓存取过期不超过 max_stale 秒的结果，cache 字段标记为 stale"""
+    if max_stale <= 0:
+        return None
+    stale = response_cache.get_stale(key, max_stale)
+    if stale is None:
+        return None
+    value, age, expired_for = stale
+    cache_lookups.inc(endpoint_name(url), "stale")
+    logger.debug("返回过期缓存：%s，已过期：%.1fs", url, expired_for)
+    return {
+        **value,
+        "cache": {"status": "stale", "tier": "memory", "ageSeconds": round(age, 3), "staleSeconds": round(expired_for, 3)},
+    }
+
+
+def _revalidate(url: str, payload: Dict[str, Any], key: str, ttl: int) -> bool:
+    """在后台刷新过期的缓存条目，同一键同时只有一个刷新；返回是否发起了刷新"""
+    flight = flight_key(key)
+    if flight in inflight:
+        return True
+    if not upstream_circuit.allow(endpoint_name(url)):
+        return False
+    task = asyncio.ensure_future(inflight.do(flight, lambda: _fetch_and_store(url, payload, key, ttl, None)))
+    _refreshes.add(task)
+    task.add_done_callback(_finish_refresh)
+    return True
+
+
+async def cancel_background() -> None:
+    """取消后台刷新和仍在进行的共享上游请求并等待它们结束
+
+    关闭会话前调用，避免这些任务在会话关闭后继续重试。
+    """
+    refreshes = list(_refreshes)
+    for task in refreshes:
+        task.cancel()
+    await asyncio.gather(*refreshes, return_exceptions=True)
+    await inflight.cancel_all()
+
+
+def _finish_refresh(task: asyncio.Task) -> None:
+    _refreshes.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.warning("后台刷新缓存失败：%s", _error_text(task.exception()))
+
+
+async def _lookup_cache(url: str, key: str, ttl: int) -> Optional[Dict[str, Any]]:
+    """依次查询内存缓存、多进程共享缓存和磁盘缓存，命中时返回带 cache 字段的结果
+
+    未命中时不计数，由调用方在决定是否返回过期结果后调用 _count_miss。
+    """
+    endpoint = endpoint_name(url)
+    cached = response_cache.get(key)
+    if cached is not None:
+        value, age = cached
+        cache_lookups.inc(endpoint, "memory")
+        logger.debug("缓存命中：%s，已缓存：%.1fs", url, age)
+        return {**value, "cache": {"status": "hit", "tier": "memory", "ageSeconds": round(age, 3)}}
+    if broker_client is not None:
+        shared = await broker_client.cache_get(key)
+        if shared is not None:
+            body, age = shared
+            value = json.loads(body)
+            response_cache.set(key, value, ttl - age, len(body))
+            cache_lookups.inc(endpoint, "shared")
+            logger.debug("共享缓存命中：%s，已缓存：%.1fs", url, age)
+            return {**value, "cache": {"status": "hit", "tier": "shared", "ageSeconds": round(age, 3)}}
+    if disk_cache is not None:
+        stored = await disk_cache.get(key)
+        if stored is not None:
+            value, age, remaining, size = stored
+            response_cache.set(key, value, remaining, size)
+            if broker_client is not None:
+                broker_client.cache_put(key, json.dumps(value).encode("utf-8"), remaining)
+            cache_lookups.inc(endpoint, "disk")
+            logger.debug("磁盘缓存命中：%s，已缓存：%.1fs", url, age)
+            return {**value, "cache": {"status": "hit", "tier": "disk", "ageSeconds": round(age, 3)}}
+    logger.debug("缓存未命中：%s", url)
+    return None
+
+
+async def _fetch_and_store(
+    url: str,
+    payload: Dict[str, Any],
+    key: str,
+    ttl: int,
+    trace: Optional[Dict[str, Any]],
+) -> Dict[str, Any]:
+    """请求上游并写入缓存，由合并后的唯一一次调用执行"""
+    import aiohttp
+
+    if debug_enabled(logger):
+        logger.debug("发起请求：%s，超时：%ss，参数：%s", url, AIOHTTP_TIMEOUT, summarize_payload(payload))
+    trace = trace if trace is not None else {}
+    start_time = time.monotonic()
+    endpoint = endpoint_name(url)
+    try:
+        stats_key = latency_key(endpoint, payload.get("gl"))
+        # 抓取接口按次计费且耗时差异大，后台预取不急于返回，都不参与对冲
+        data, body = await with_retries(
+            lambda timeout: hedged(
+                lambda timing: _post_json(url, payload, timeout, timing),
+                stats_key,
+                enabled=endpoint != "scrape" and not background.get(),
+                trace=trace,
+            ),
+            AIOHTTP_TIMEOUT,
+            url,
+            trace,
+        )
+    except aiohttp.ClientResponseError as e:
+        elapsed_ms = (time.monotonic() - start_time) * 1000
+        logger.warning(
+            "请求失败：%s，状态码：%s，尝试次数：%d，耗时：%.1fms", url, e.status, trace["attempts"], elapsed_ms
+        )
+        # 参数错误和限流不说明上游不可用，不计入熔断
+        if e.status >= 500:
+            upstream_circuit.record_failure(endpoint)
+        raise
+    except QueueTimeout:
+        # 请求没有发往上游，不说明上游不可用
+        raise
+    except (asyncio.TimeoutError, aiohttp.ClientError):
+        upstream_circuit.record_failure(endpoint)
+        raise
+    upstream_circuit.record_success(endpoint)
+    elapsed_ms = (time.monotonic() - start_time) * 1000
+    logger.debug("请求成功：%s，尝试次数：%d，耗时：%.1fms", url, trace["attempts"], elapsed_ms)
+
+    if ttl > 0:
+        _store(key, data, body, ttl)
+    return data
+
+
+def _store(key: str, value: Any, body: bytes, ttl: int) -> None:
+    """把上游响应写入各级缓存"""
+    response_cache.set(key, value, ttl, len(body))
+    if broker_client is not None:
+        broker_client.cache_put(key, body, ttl)
+    if disk_cache is not None:
+        disk_cache.put(key, body, ttl)
+
+
+async def _post_json(
+    url: str, payload: Any, timeout_seconds: float, timing: Optional[WireTiming] = None
+) -> Tuple[Any, bytes]:
+    """通过共享会话发送一次 POST 请求，返回 (解析后的数据, 原始响应体)
+
+    timing 只记录拿到名额之后、在网络上花费的时间，供对冲和地区调度使用。
+    """
+    import aiohttp
+
+    session = get_session()
+    limiter = get_limiter(url)
+    endpoint = endpoint_name(url)
+    region = payload.get("gl", "") if isinstance(payload, dict) else ""
+    data = json.dumps(payload).encode("utf-8")
+    async with limiter.slot(endpoint, current_tool.get()), key_pool.use() as api_key:
+        # 排队已经用掉了一部分总期限，本次尝试的超时不能超过剩余时间
+        remaining = remaining_time()
+        if remaining is not None:
+            if remaining <= 0:
+                raise QueueTimeout()
+            timeout_seconds = min(timeout_seconds, remaining)
+        timeout = aiohttp.ClientTimeout(total=timeout_seconds)
+        headers = {
+            'X-API-KEY': api_key.value,
+            'Content-Type': 'application/json'
+        }
+        with span("upstream", **{"serper.endpoint": endpoint, "serper.region": region}) as current:
+            # 计时从拿到名额之后开始，只包含上游本身的耗时
+            start_time = time.perf_counter()
+            if timing is not None:
+                timing.start()
+            status = ""
+            try:
+                async with session.post(url, headers=headers, data=data, timeout=timeout) as response:
+                    status = str(response.status)
+                    current.set_attribute("http.response.status_code", response.status)
+                    key_pool.on_response(api_key, response.status, response.headers)
+                    # 多个 key 时 429 只让对应的 key 冷却，不降低整个主机的速率
+                    if response.status != 429 or len(key_pool) <= 1:
+                        limiter.on_response(response.status, response.headers.get("Retry-After"))
+                    if response.status >= 400:
+                        response.raise_for_status()
+                    body, received = await read_body(
+                        response, field_limits=scrape_field_limits() if endpoint == "scrape" else None
+                    )
+                    upstream_response_bytes.inc(endpoint, amount=received)
+                    result = json.loads(body)
+                    key_pool.record_credits(api_key, result, response.headers)
+                    if timing is not None:
+                        timing.finish()
+                    return result, body
+            except BaseException as e:
+                status = status or type(e).__name__
+                raise
+            finally:
+                upstream_requests.inc(endpoint, status)
+                upstream_duration.observe(time.perf_counter() - start_time, endpoint, region)
+                upstream_request_bytes.inc(endpoint, amount=len(data))
+
+
+async def google_batch(request: BatchSearchRequest) -> Dict[str, Any]:
+    """批量搜索：已缓存的查询直接返回，其余去重后按上游批量上限打包，并发发送"""
+    import aiohttp
+
+    url = f"{GOOGLE_BASE_URL}/search"
+    endpoint = endpoint_name(url)
+    payloads = [item.model_dump(exclude_none=True) for item in request.queries]
+    results: List[Optional[Dict[str, Any]]] = [None] * len(payloads)
+    # 缓存键 -> 请求中使用该查询的下标，相同查询只请求一次
+    pending: Dict[str, List[int]] = {}
+    cached_keys: Dict[str, Dict[str, Any]] = {}
+
+    for index, payload in enumerate(payloads):
+        key = cache_key(url, payload)
+        ttl = ttl_for(url, payload)
+        if key not in pending and key not in cached_keys and ttl > 0:
+            cached = await _lookup_cache(url, key, ttl)
+            if cached is not None:
+                cached_keys[key] = cached
+        if key in cached_keys:
+            results[index] = {"index": index, "query": payload["q"], **cached_keys[key]}
+            continue
+        pending.setdefault(key, []).append(index)
+    cache_hits = sum(1 for entry in results if entry is not None)
+
+    keys = list(pending)
+    chunks = [keys[start:start + BATCH_MAX_SIZE] for start in range(0, len(keys), BATCH_MAX_SIZE)]
+    logger.debug(
+        "开始批量搜索，查询数：%d，缓存命中：%d，去重后待请求：%d，上游请求数：%d",
+        len(payloads),
+        cache_hits,
+        len(keys),
+        len(chunks),
+    )
+
+    def fail(chunk_keys: List[str], error: str) -> None:
+        for key in chunk_keys:
+            for index in pending[key]:
+                results[index] = {"index": index, "query": payloads[index]["q"], "error": error}
+
+    def fail_or_stale(chunk_keys: List[str], error: str) -> None:
+        # 上游失败或熔断时，有过期缓存的查询返回过期结果，其余记为失败
+        for key in chunk_keys:
+            payload = payloads[pending[key][0]]
+            ttl = ttl_for(url, payload)
+            stale = _stale_result(url, key, CACHE_STALE_IF_ERROR) if ttl > 0 else None
+            if stale is None:
+                _count_miss(url, ttl)
+                fail([key], error)
+                continue
+            stale["cache"]["error"] = error
+            for index in pending[key]:
+                results[index] = {"index": index, "query": payloads[index]["q"], **stale}
+
+    async def run_single(key: str) -> None:
+        payload = payloads[pending[key][0]]
+        try:
+            data = await _request_json(url, payload)
+        except aiohttp.ClientResponseError as e:
+            fail([key], f"HTTP {e.status}")
+            return
+        except CircuitOpenError as e:
+            fail([key], str(e))
+            return
+        except Exception as e:
+            logger.exception("批量搜索中的单条请求异常：%s", url)
+            fail([key], str(e))
+            return
+        for index in pending[key]:
+            results[index] = {"index": index, "query": payloads[index]["q"], **data}
+
+    async def run_chunk(chunk_keys: List[str]) -> None:
+        chunk_payloads = [payloads[pending[key][0]] for key in chunk_keys]
+        if not upstream_circuit.allow(endpoint):
+            logger.warning("上游 %s 处于熔断状态，批量请求的 %d 个查询改用过期缓存", endpoint, len(chunk_keys))
+            fail_or_stale(chunk_keys, "circuit open")
+            return
+        try:
+            items, coalesced = await inflight.do(
+                cache_key(url, chunk_payloads),
+                lambda: _fetch_batch_and_store(url, chunk_payloads, chunk_keys),
+            )
+        except aiohttp.ClientResponseError as e:
+            if len(chunk_keys) > 1 and 400 <= e.status < 500 and e.status != 429:
+                # 批量请求因个别查询被拒绝时，逐条重发以定位失败的查询
+                logger.warning("批量请求被拒绝（HTTP %s），改为逐条请求 %d 个查询", e.status, len(chunk_keys))
+                await asyncio.gather(*(run_single(key) for key in chunk_keys))
+            elif is_retryable(e):
+                fail_or_stale(chunk_keys, f"HTTP {e.status}")
+            else:
+                fail(chunk_keys, f"HTTP {e.status}")
+            return
+        except Exception as e:
+            if is_retryable(e):
+                logger.warning("批量搜索请求失败：%s，原因：%s", url, _error_text(e))
+                fail_or_stale(chunk_keys, _error_text(e))
+            else:
+                logger.exception("批量搜索请求异常：%s", url)
+                fail(chunk_keys, str(e))
+            return
+
+        cache_info: Dict[str, Any] = {"status": "miss"}
+        if coalesced:
+            cache_info["coalesced"] = True
+        for key, item in zip(chunk_keys, items):
+            _count_miss(url, ttl_for(url, payloads[pending[key][0]]))
+            for index in pending[key]:
+                entry: Dict[str, Any] = {"index": index, "query": payloads[index]["q"]}
+                if isinstance(item, dict):
+                    entry.update(item)
+                    entry["cache"] = cache_info
+                else:
+                    entry["error"] = "Invalid response item"
+                results[index] = entry
+
+    await asyncio.gather(*(run_chunk(chunk) for chunk in chunks))
+
+    failed = [entry["index"] for entry in results if "error" in entry]
+    return {
+        "results": results,
+        "metadata": {
+            "total_queries": len(payloads),
+            "successful_queries": len(payloads) - len(failed),
+            "failed_queries": failed,
+            "cache_hits": cache_hits,
+            "unique_queries": len(keys) + len(cached_keys),
+            "upstream_requests": len(chunks),
+        },
     }
 
-    ssl_context = ssl.create_default_context(cafile=certifi.where())
-    connector = aiohttp.TCPConnector(ssl=ssl_context)
 
-    timeout = aiohttp.ClientTimeout(total=AIOHTTP_TIMEOUT)
+async def _fetch_batch_and_store(url: str, payloads: List[Dict[str, Any]], keys: List[str]) -> List[Any]:
+    """以一次上游批量请求获取多个查询的结果，并逐条写入缓存"""
+    import aiohttp
+
+    trace: Dict[str, Any] = {}
     start_time = time.monotonic()
-    logger.debug("发起请求：%s，超时：%ss，参数：%s", url, AIOHTTP_TIMEOUT, payload_summary)
+    endpoint = endpoint_name(url)
     try:
-        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
-            async with session.post(url, headers=headers, json=payload) as response:
-                if response.status >= 400:
-                    elapsed_ms = (time.monotonic() - start_time) * 1000
-                    logger.warning("请求失败：%s，状态码：%s，耗时：%.1fms", url, response.status, elapsed_ms)
-                    response.raise_for_status()
-
-                data = await response.json()
-                elapsed_ms = (time.monotonic() - start_time) * 1000
-                logger.debug("请求成功：%s，状态码：%s，耗时：%.1fms", url, response.status, elapsed_ms)
-                return data
-    except Exception:
+        data, _ = await with_retries(
+            lambda timeout: _post_json(url, payloads, timeout),
+            AIOHTTP_TIMEOUT,
+            url,
+            trace,
+        )
+    except aiohttp.ClientResponseError as e:
         elapsed_ms = (time.monotonic() - start_time) * 1000
-        logger.exception("请求异常：%s，耗时：%.1fms", url, elapsed_ms)
+        logger.warning(
+            "批量请求失败：%s，状态码：%s，查询数：%d，耗时：%.1fms", url, e.status, len(payloads), elapsed_ms
+        )
+        if e.status >= 500:
+            upstream_circuit.record_failure(endpoint)
+        raise
+    except QueueTimeout:
+        # 请求没有发往上游，不说明上游不可用
+        raise
+    except (asyncio.TimeoutError, aiohttp.ClientError):
+        upstream_circuit.record_failure(endpoint)
         raise
+    upstream_circuit.record_success(endpoint)
+    if not isinstance(data, list) or len(data) != len(payloads):
+        raise ValueError(f"Unexpected batch response for {len(payloads)} queries")
+    elapsed_ms = (time.monotonic() - start_time) * 1000
+    logger.debug("批量请求成功：%s，查询数：%d，尝试次数：%d，耗时：%.1fms", url, len(payloads), trace["attempts"], elapsed_ms)
+
+    for payload, key, item in zip(payloads, keys, data):
+        ttl = ttl_for(url, payload)
+        if ttl <= 0 or not isinstance(item, dict):
+            continue
+        _store(key, item, json.dumps(item).encode("utf-8"), ttl)
+    return data
 
 
 async def _search_single_region(
-    session: aiohttp.ClientSession,
     gl: str,
     hl: str,
     query: str,
@@ -81,78 +590,153 @@ async def _search_single_region(
     tbs: str | None,
 ) -> Dict[str, Any]:
     """执行单个地区的搜索请求"""
-    url = "https://google.serper.dev/search"
+    import aiohttp
+
+    url = f"{GOOGLE_BASE_URL}/search"
     payload: Dict[str, Any] = {"q": query, "gl": gl, "hl": hl, "num": num}
     if tbs:
         payload["tbs"] = tbs
 
-    headers = {
-        'X-API-KEY': SERPER_API_KEY,
-        'Content-Type': 'application/json'
-    }
-
-    # 打印搜索请求信息
-    payload_summary = _summarize_payload(payload)
-    logger.debug("地区 %s 搜索请求：%s，参数：%s", gl, url, payload_summary)
+    # 打印搜索请求信息，调试日志未启用时不构建参数摘要
+    if debug_enabled(logger):
+        logger.debug("地区 %s 搜索请求：%s，参数：%s", gl, url, summarize_payload(payload))
 
+    trace: Dict[str, Any] = {}
     start_time = time.monotonic()
     try:
-        async with session.post(url, headers=headers, json=payload) as response:
-            if response.status >= 400:
-                elapsed_ms = (time.monotonic() - start_time) * 1000
-                logger.warning("地区 %s 搜索失败，状态码：%s，耗时：%.1fms", gl, response.status, elapsed_ms)
-                return {"error": f"HTTP {response.status}", "gl": gl, "hl": hl}
-
-            data = await response.json()
-            elapsed_ms = (time.monotonic() - start_time) * 1000
-            logger.debug("地区 %s 搜索成功，耗时：%.1fms", gl, elapsed_ms)
-            return {"gl": gl, "hl": hl, "query": query, **data}
+        data = await _request_json(url, payload, trace)
+        elapsed_ms = (time.monotonic() - start_time) * 1000
+        logger.debug("地区 %s 搜索成功，耗时：%.1fms", gl, elapsed_ms)
+        region_circuit.record_success(gl)
+        return {
+            "gl": gl,
+            "hl": hl,
+            "query": query,
+            "attempts": trace.get("attempts", 0),
+            "hedged": trace.get("hedged", False),
+            **data,
+        }
+    except aiohttp.ClientResponseError as e:
+        # 只有服务端错误说明该地区本身有问题，参数错误和限流不计入熔断
+        if e.status >= 500:
+            region_circuit.record_failure(gl)
+        return {"error": f"HTTP {e.status}", "gl": gl, "hl": hl, "attempts": trace.get("attempts", 0)}
+    except CircuitOpenError as e:
+        return {"error": str(e), "gl": gl, "hl": hl, "attempts": 0}
     except Exception as e:
         elapsed_ms = (time.monotonic() - start_time) * 1000
         logger.exception("地区 %s 搜索异常，耗时：%.1fms", gl, elapsed_ms)
-        return {"error": str(e), "gl": gl, "hl": hl}
+        region_circuit.record_failure(gl)
+        return {"error": str(e), "gl": gl, "hl": hl, "attempts": trace.get("attempts", 0)}
 
 
-async def google_multi_region(request: MultiRegionSearchRequest) -> Dict[str, Any]:
-    """并行执行多地区搜索"""
-    regions = REGION_CONFIGS.get(request.preset, [])
-    if not regions:
-        return {"error": f"Unknown preset: {request.preset}"}
+async def google_multi_region(
+    request: MultiRegionSearchRequest,
+    on_region_result: Optional[RegionCallback] = None,
+) -> Dict[str, Any]:
+    """并行执行多地区搜索
 
-    logger.debug("开始多地区搜索，预设：%s，地区数：%d", request.preset, len(regions))
+    每个地区完成后立即调用 on_region_result(gl, 结果, 已完成数, 总数)；
+    设置了 deadline 时，到期仍未完成的地区会被取消并标记为 timed_out。
+    """
+    requested, error = resolve_regions(request.preset, request.regions)
+    if error:
+        return {"error": error}
+    plan = plan_regions(requested, request.fallback == "true")
+    regions = plan.regions
+    preset = request.preset if not request.regions else "custom"
 
-    ssl_context = ssl.create_default_context(cafile=certifi.where())
-    connector = aiohttp.TCPConnector(ssl=ssl_context)
-    timeout = aiohttp.ClientTimeout(total=AIOHTTP_TIMEOUT)
+    logger.debug(
+        "开始多地区搜索，预设：%s，地区数：%d，发起顺序：%s",
+        preset,
+        len(regions),
+        ",".join(region["gl"] for region in plan.launch_order),
+    )
 
     translations = request.translations
+    deadline = float(request.deadline) if request.deadline else None
     results: Dict[str, Any] = {}
     failed_regions: List[str] = []
+    timed_out_regions: List[str] = []
 
-    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
-        tasks = []
-        for region in regions:
-            gl = region["gl"]
-            hl = region["hl"]
-            # 优先使用翻译，否则使用原始查询
-            query = translations.get(hl, request.q)
-            tasks.append(_search_single_region(session, gl, hl, query, request.num, request.tbs))
+    tasks = []
+    for region in plan.launch_order:
+        gl = region["gl"]
+        hl = region["hl"]
+        # 优先使用翻译，否则使用原始查询
+        query = translations.get(hl, request.q)
+        tasks.append(asyncio.ensure_future(_search_single_region(gl, hl, query, request.num, request.tbs)))
 
-        responses = await asyncio.gather(*tasks)
+    completed: Dict[str, Dict[str, Any]] = {}
+    try:
+        for next_result in asyncio.as_completed(tasks, timeout=deadline):
+            try:
+                response = await next_result
+            except asyncio.TimeoutError:
+                break
+            completed[response["gl"]] = response
+            if on_region_result is not None:
+                try:
+                    await on_region_result(response["gl"], response, len(completed), len(regions))
+                except Exception:
+                    logger.exception("地区 %s 结果推送失败", response["gl"])
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
 
-        for region, response in zip(regions, responses):
-            gl = region["gl"]
-            if "error" in response:
-                failed_regions.append(gl)
-            results[gl] = response
+    cache_hits: List[str] = []
+    retried_regions: Dict[str, int] = {}
+    hedged_regions: List[str] = []
+    for region in regions:
+        gl = region["gl"]
+        response = completed.get(gl)
+        if response is None:
+            logger.warning("地区 %s 搜索超过总期限 %ss，已取消", gl, deadline)
+            timed_out_regions.append(gl)
+            results[gl] = {"error": "timed out", "gl": gl, "hl": region["hl"], "timed_out": True}
+            continue
+        if response.get("hedged"):
+            hedged_regions.append(gl)
+        if response.get("attempts", 0) > 1:
+            retried_regions[gl] = response["attempts"] - 1
+        if "error" in response:
+            failed_regions.append(gl)
+        elif response.get("cache", {}).get("status") == "hit":
+            cache_hits.append(gl)
+        results[gl] = response
+    for region in plan.skipped:
+        results[region["gl"]] = {"error": "circuit open", "gl": region["gl"], "hl": region["hl"], "skipped": True}
 
-    return {
+    merged: Optional[List[Dict[str, Any]]] = None
+    duplicates = 0
+    if request.merge == "true":
+        merged, duplicates = merge_regions(
+            [(gl, response) for gl, response in results.items() if "error" not in response],
+            request.region_weights,
+        )
+        # 合并后的列表已包含各地区的自然结果，不再逐地区重复返回
+        results = {gl: {key: value for key, value in response.items() if key != "organic"} for gl, response in results.items()}
+
+    result: Dict[str, Any] = {
         "query": request.q,
-        "preset": request.preset,
+        "preset": preset,
         "results": results,
         "metadata": {
-            "total_regions": len(regions),
-            "successful_regions": len(regions) - len(failed_regions),
+            "total_regions": len(regions) + len(plan.skipped),
+            "successful_regions": len(regions) - len(failed_regions) - len(timed_out_regions),
             "failed_regions": failed_regions,
+            "timed_out_regions": timed_out_regions,
+            "skipped_regions": [region["gl"] for region in plan.skipped],
+            "fallback_regions": plan.fallbacks,
+            "cache_hits": cache_hits,
+            "retried_regions": retried_regions,
+            "total_retries": sum(retried_regions.values()),
+            "hedged_regions": hedged_regions,
         },
     }
+    if merged is not None:
+        result["merged"] = merged
+        result["metadata"]["merged_results"] = len(merged)
+        result["metadata"]["duplicates_removed"] = duplicates
+    return result
@@ -16,7 +16,10 @@ class SerperTools(StrEnum):
     GOOGLE_SEARCH_PATENTS = "google_search_patents"
     GOOGLE_SEARCH_AUTOCOMPLETE = "google_search_autocomplete"
     GOOGLE_SEARCH_MULTI_REGION = "google_search_multi_region"
+    GOOGLE_SEARCH_BATCH = "google_search_batch"
+    GOOGLE_SEARCH_AND_SCRAPE = "google_search_and_scrape"
     WEBPAGE_SCRAPE = "webpage_scrape"
+    WEBPAGE_SCRAPE_BATCH = "webpage_scrape_batch"
 
     @classmethod
     def has_value(cls, value: str) -> bool:
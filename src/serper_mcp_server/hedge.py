@@ -0,0 +1,141 @@
+import os
+import time
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional, TypeVar
+from .latency import latency_tracker
+
+HEDGE_ENABLED = os.getenv("SERPER_HEDGE_ENABLED", "false").strip().lower() == "true"
+HEDGE_PERCENTILE = float(os.getenv("SERPER_HEDGE_PERCENTILE", "95"))
+HEDGE_MIN_DELAY = float(os.getenv("SERPER_HEDGE_MIN_DELAY", "0.05"))
+# 对冲请求占总请求数的比例上限，以及可累积的对冲额度
+HEDGE_MAX_RATIO = float(os.getenv("SERPER_HEDGE_MAX_RATIO", "0.05"))
+HEDGE_MAX_BURST = float(os.getenv("SERPER_HEDGE_MAX_BURST", "5"))
+
+T = TypeVar("T")
+
+logger = logging.getLogger(__name__)
+
+
+class HedgeBudget:
+    """每个请求累积 ratio 个额度，每次对冲消耗 1 个，限制对冲占总流量的比例"""
+
+    def __init__(self, ratio: float, burst: float):
+        self.ratio = ratio
+        self.burst = burst
+        self.tokens = 0.0
+        self.requests = 0
+        self.hedges = 0
+        self.wins = 0
+
+    def on_request(self) -> None:
+        self.requests += 1
+        self.tokens = min(self.burst, self.tokens + self.ratio)
+
+    def try_acquire(self) -> bool:
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        self.hedges += 1
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "hedges": self.hedges,
+            "hedge_wins": self.wins,
+            "hedge_ratio": self.hedges / self.requests if self.requests else 0.0,
+        }
+
+
+hedge_budget = HedgeBudget(HEDGE_MAX_RATIO, HEDGE_MAX_BURST)
+
+
+class WireTiming:
+    """一次尝试的上游耗时；本地排队（并发名额、令牌、API key）不计入
+
+    请求拿到名额后调用 start，收到完整响应后调用 finish。
+    """
+
+    def __init__(self):
+        self.started = asyncio.Event()
+        self.seconds: Optional[float] = None
+        self._start_time = 0.0
+
+    def start(self) -> None:
+        self._start_time = time.monotonic()
+        self.started.set()
+
+    def finish(self) -> None:
+        self.seconds = time.monotonic() - self._start_time
+
+
+async def _timed(call: Callable[[WireTiming], Awaitable[T]], key: str, timing: WireTiming) -> T:
+    result = await call(timing)
+    if timing.seconds is not None:
+        latency_tracker.record(key, timing.seconds)
+    return result
+
+
+async def _wait_started(task: "asyncio.Future[T]", timing: WireTiming) -> None:
+    """等到请求拿到名额开始发送，或请求已经结束"""
+    started = asyncio.ensure_future(timing.started.wait())
+    try:
+        await asyncio.wait({task, started}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        started.cancel()
+
+
+async def hedged(
+    call: Callable[[WireTiming], Awaitable[T]],
+    key: str,
+    enabled: bool = True,
+    trace: Optional[Dict[str, Any]] = None,
+) -> T:
+    """执行请求并记录耗时；超过该分组历史分位耗时仍未返回时发出一个相同的对冲请求
+
+    两个请求中先成功的结果被采用，另一个随即取消；若其中一个失败则继续等待另一个。
+    call 接收一个 WireTiming：耗时统计和对冲计时都从请求拿到上游名额后开始，
+    本地拥塞时只是排队的请求不会触发对冲，也不会抬高分位耗时。
+    """
+    hedging = HEDGE_ENABLED and enabled
+    if hedging:
+        hedge_budget.on_request()
+    threshold = latency_tracker.percentile(key, HEDGE_PERCENTILE) if hedging else None
+    if threshold is None:
+        return await _timed(call, key, WireTiming())
+
+    timing = WireTiming()
+    primary = asyncio.ensure_future(_timed(call, key, timing))
+    tasks = {primary}
+    try:
+        await _wait_started(primary, timing)
+        done, _ = await asyncio.wait(tasks, timeout=max(threshold, HEDGE_MIN_DELAY))
+        if done or not hedge_budget.try_acquire():
+            return await primary
+
+        logger.debug("请求 %s 超过 P%.0f 耗时 %.1fms，发出对冲请求", key, HEDGE_PERCENTILE, threshold * 1000)
+        backup = asyncio.ensure_future(_timed(call, key, WireTiming()))
+        tasks.add(backup)
+        if trace is not None:
+            trace["hedged"] = True
+
+        pending = set(tasks)
+        first_error: Optional[BaseException] = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                error = task.exception()
+                if error is None:
+                    if task is backup:
+                        hedge_budget.wins += 1
+                        if trace is not None:
+                            trace["hedge_won"] = True
+                    return task.result()
+                if first_error is None:
+                    first_error = error
+        raise first_error
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
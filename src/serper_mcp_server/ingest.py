@@ -0,0 +1,235 @@
+import os
+import re
+import logging
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    import aiohttp
+
+# 单个上游响应体的字节上限，超出时放弃读取
+MAX_RESPONSE_BYTES = int(os.getenv("SERPER_MAX_RESPONSE_BYTES", str(32 * 1024 * 1024)))
+# 抓取结果中 text / markdown 字段保留的最大字节数，0 表示不截断
+SCRAPE_MAX_FIELD_BYTES = int(os.getenv("SERPER_SCRAPE_MAX_FIELD_BYTES", "0"))
+# 抓取结果中读取时直接丢弃（置为 null）的字段
+SCRAPE_DROP_FIELDS = frozenset(
+    field.strip() for field in os.getenv("SERPER_SCRAPE_DROP_FIELDS", "").split(",") if field.strip()
+)
+READ_CHUNK_SIZE = 64 * 1024
+
+TRUNCATABLE_FIELDS = ("text", "markdown")
+TRUNCATION_MARKER = b" [truncated]"
+
+_QUOTE = re.compile(rb'"')
+_STRING_SPECIAL = re.compile(rb'["\\]')
+# 超过这个长度的字符串不会是需要识别的字段名
+_MAX_KEY_BYTES = 32
+
+logger = logging.getLogger(__name__)
+
+
+def _incomplete_tail(data: bytes) -> int:
+    """返回末尾未完整的 UTF-8 多字节字符已到达的字节数，完整时返回 0"""
+    for back in range(1, min(len(data), 4) + 1):
+        byte = data[-back]
+        if byte & 0xC0 != 0x80:
+            # 找到首字节：按首字节计算字符总长度
+            size = 2 if byte >= 0xC0 else 1
+            if byte >= 0xE0:
+                size = 3
+            if byte >= 0xF0:
+                size = 4
+            return back if size > back else 0
+    return 0
+
+
+def _surrogate(digits: bytes) -> int:
+    """\\uXXXX 转义的四位十六进制：高代理返回 1，低代理返回 2，其他返回 0"""
+    try:
+        value = int(digits, 16)
+    except ValueError:
+        return 0
+    if 0xD800 <= value < 0xDC00:
+        return 1
+    return 2 if 0xDC00 <= value < 0xE000 else 0
+
+
+def _escape_size(data: bytes, start: int) -> Optional[int]:
+    """data[start] 处转义序列的字节数，数据不足以判断时返回 None
+
+    \\uXXXX 占 6 字节；高代理后紧跟低代理时两个转义合为 12 字节，截断时一起保留或一起丢弃。
+    """
+    if start + 2 > len(data):
+        return None
+    if data[start + 1] != 0x75:  # u
+        return 2
+    if start + 6 > len(data):
+        return None
+    if _surrogate(data[start + 2:start + 6]) != 1:
+        return 6
+    tail = data[start + 6:start + 12]
+    if not b"\\u".startswith(tail[:2]):
+        return 6
+    if len(tail) < 6:
+        return None
+    return 12 if _surrogate(tail[2:]) == 2 else 6
+
+
+class ResponseTooLarge(Exception):
+    def __init__(self, limit: int):
+        super().__init__(f"Upstream response exceeds {limit} bytes")
+        self.limit = limit
+
+
+class FieldFilter:
+    """逐块过滤 JSON 字节流，在读取时截断或丢弃指定名称的字符串字段
+
+    只跟踪字符串边界和紧邻的冒号，不构建对象树；被截断的字段只保留前 max_bytes 字节
+    并追加 TRUNCATION_MARKER，被丢弃的字段输出为 null。截断位置不会落在转义序列或
+    多字节 UTF-8 字符中间，输出始终是合法 JSON。
+    """
+
+    def __init__(self, limits: Dict[str, int]):
+        # 字段名 -> 保留的字节数，0 表示丢弃
+        self.limits = {name.encode("utf-8"): limit for name, limit in limits.items()}
+        self.truncated: List[str] = []
+        self._in_string = False
+        self._pending = b""
+        self._key = b""
+        self._key_overflow = False
+        self._last_string: Optional[bytes] = None
+        # 上一个字符串结束后遇到的非空白字符：空、仅一个冒号、或其他
+        self._gap = b""
+        self._budget: Optional[int] = None
+        self._dropping = False
+        self._cut = False
+
+    def feed(self, chunk: bytes) -> bytes:
+        data = self._pending + chunk
+        self._pending = b""
+        out = bytearray()
+        position = 0
+        length = len(data)
+        while position < length:
+            if not self._in_string:
+                match = _QUOTE.search(data, position)
+                end = match.start() if match else length
+                gap = data[position:end].strip()
+                if gap:
+                    self._gap = (self._gap + gap)[:2]
+                out += data[position:end]
+                if match is None:
+                    break
+                self._open_string(out)
+                position = end + 1
+                continue
+
+            match = _STRING_SPECIAL.search(data, position)
+            if match is None:
+                # 块末尾不完整的多字节字符留到下一块，截断时才能整体保留或整体丢弃
+                end = max(length - _incomplete_tail(data), position)
+                self._emit(out, data[position:end])
+                self._pending = data[end:]
+                break
+            special = match.start()
+            self._emit(out, data[position:special])
+            if data[special] == 0x22:  # 引号，字符串结束
+                self._close_string(out)
+                position = special + 1
+                continue
+            # 反斜杠转义作为整体输出，跨块时留到下一块
+            size = _escape_size(data, special)
+            if size is None:
+                self._pending = data[special:]
+                break
+            self._emit(out, data[special:special + size], atomic=True)
+            position = special + size
+        return bytes(out)
+
+    def _open_string(self, out: bytearray) -> None:
+        self._in_string = True
+        self._key = b""
+        self._key_overflow = False
+        self._cut = False
+        limit = self.limits.get(self._last_string) if self._last_string is not None and self._gap == b":" else None
+        self._budget = limit
+        self._dropping = limit == 0
+        if self._dropping:
+            out += b"null"
+        else:
+            out += b'"'
+
+    def _emit(self, out: bytearray, piece: bytes, atomic: bool = False) -> None:
+        if not piece:
+            return
+        if not self._key_overflow:
+            if len(self._key) + len(piece) <= _MAX_KEY_BYTES:
+                self._key += piece
+            else:
+                self._key_overflow = True
+        if self._dropping or self._cut:
+            return
+        if self._budget is None:
+            out += piece
+            return
+        if len(piece) <= self._budget:
+            out += piece
+            self._budget -= len(piece)
+            return
+        if not atomic:
+            cut = self._budget
+            # 不在多字节 UTF-8 字符中间截断
+            while cut > 0 and piece[cut] & 0xC0 == 0x80:
+                cut -= 1
+            out += piece[:cut]
+        self._cut = True
+
+    def _close_string(self, out: bytearray) -> None:
+        self._in_string = False
+        if self._cut or self._dropping:
+            name = self._last_string.decode("utf-8", "replace") if self._last_string else ""
+            if name not in self.truncated:
+                self.truncated.append(name)
+        if self._cut:
+            out += TRUNCATION_MARKER
+        if not self._dropping:
+            out += b'"'
+        self._last_string = None if self._key_overflow else self._key
+        self._gap = b""
+        self._budget = None
+        self._dropping = False
+
+
+def scrape_field_limits() -> Dict[str, int]:
+    limits = {}
+    if SCRAPE_MAX_FIELD_BYTES > 0:
+        limits.update({name: SCRAPE_MAX_FIELD_BYTES for name in TRUNCATABLE_FIELDS})
+    limits.update({name: 0 for name in SCRAPE_DROP_FIELDS})
+    return limits
+
+
+async def read_body(
+    response: "aiohttp.ClientResponse",
+    max_bytes: int = MAX_RESPONSE_BYTES,
+    field_limits: Optional[Dict[str, int]] = None,
+) -> Tuple[bytes, int]:
+    """分块读取响应体，返回 (过滤后的响应体, 实际收到的字节数)
+
+    超过 max_bytes 时中止；给定 field_limits 时边读边截断大字段，原始响应体不会完整驻留内存，
+    单个请求的内存峰值由 max_bytes 和字段上限决定。
+    """
+    if max_bytes > 0 and response.content_length is not None and response.content_length > max_bytes:
+        raise ResponseTooLarge(max_bytes)
+    field_filter = FieldFilter(field_limits) if field_limits else None
+    parts: List[bytes] = []
+    received = 0
+    async for chunk in response.content.iter_chunked(READ_CHUNK_SIZE):
+        received += len(chunk)
+        if max_bytes > 0 and received > max_bytes:
+            raise ResponseTooLarge(max_bytes)
+        parts.append(field_filter.feed(chunk) if field_filter is not None else chunk)
+    body = b"".join(parts)
+    if field_filter is not None and field_filter.truncated:
+        logger.debug(
+            "响应字段已在读取时截断：%s，原始 %d 字节，保留 %d 字节", ", ".join(field_filter.truncated), received, len(body)
+        )
+    return body, received
@@ -0,0 +1,244 @@
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict, List, Mapping, Optional, Tuple
+
+from .limiter import TokenBucket, QueueTimeout, parse_retry_after, wait_queued, UPSTREAM_QPS, UPSTREAM_MIN_QPS
+
+SERPER_API_KEY = os.getenv("SERPER_API_KEY", "").strip()
+# 多个 API key，逗号分隔，可用 key:权重 指定权重；或者每行一个 key（可跟权重）的文件
+SERPER_API_KEYS = os.getenv("SERPER_API_KEYS", "").strip()
+SERPER_API_KEYS_FILE = os.getenv("SERPER_API_KEYS_FILE", "").strip()
+# least_loaded 选择按权重折算后在途请求最少的 key，round_robin 为平滑加权轮询
+KEY_STRATEGY = os.getenv("SERPER_KEY_STRATEGY", "least_loaded").strip().lower()
+# 每个 key 的速率和在途请求上限，0 表示不限制
+KEY_QPS = float(os.getenv("SERPER_KEY_QPS", str(UPSTREAM_QPS)))
+KEY_MAX_IN_FLIGHT = int(os.getenv("SERPER_KEY_MAX_IN_FLIGHT", "0"))
+# 收到 429 且没有 Retry-After 时，以及收到 403 或额度耗尽时 key 的冷却秒数
+KEY_THROTTLE_COOLDOWN = float(os.getenv("SERPER_KEY_THROTTLE_COOLDOWN", "10"))
+KEY_FORBIDDEN_COOLDOWN = float(os.getenv("SERPER_KEY_FORBIDDEN_COOLDOWN", "3600"))
+# 上游报告剩余额度的响应头
+KEY_CREDITS_HEADER = os.getenv("SERPER_KEY_CREDITS_HEADER", "X-Credits-Remaining").strip()
+
+logger = logging.getLogger(__name__)
+
+
+class ApiKey:
+    """池中的一个 key：自己的令牌桶、在途请求数、冷却截止时间和额度统计"""
+
+    def __init__(self, value: str, weight: float):
+        self.value = value
+        self.weight = weight
+        # 指标和日志中只显示末尾四位
+        self.label = f"...{value[-4:]}"
+        self.bucket = TokenBucket(KEY_QPS, KEY_QPS, UPSTREAM_MIN_QPS)
+        self.in_flight = 0
+        self.requests = 0
+        self.throttled = 0
+        self.forbidden = 0
+        self.cooldown_until = 0.0
+        self.credits_used = 0.0
+        self.credits_remaining: Optional[float] = None
+        # 平滑加权轮询的当前权重
+        self.current = 0.0
+
+    def cooling(self, now: float) -> bool:
+        return now < self.cooldown_until
+
+    def full(self) -> bool:
+        return KEY_MAX_IN_FLIGHT > 0 and self.in_flight >= KEY_MAX_IN_FLIGHT
+
+    def cool_down(self, seconds: float) -> None:
+        self.cooldown_until = max(self.cooldown_until, time.monotonic() + seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "key": self.label,
+            "weight": self.weight,
+            "in_flight": self.in_flight,
+            "requests": self.requests,
+            "qps": self.bucket.rate if self.bucket.enabled else None,
+            "throttled": self.throttled,
+            "forbidden": self.forbidden,
+            "cooldown_seconds": max(self.cooldown_until - time.monotonic(), 0.0),
+            "credits_used": self.credits_used,
+            "credits_remaining": self.credits_remaining,
+        }
+
+
+def parse_keys(text: str, separator: Optional[str]) -> List[Tuple[str, float]]:
+    """解析 key 列表，每项为 key 或 key:权重（文件中也可以用空格分隔），# 之后为注释"""
+    keys: List[Tuple[str, float]] = []
+    for item in text.split(separator) if separator else text.splitlines():
+        parts = item.split("#", 1)[0].replace(":", " ").split()
+        if not parts:
+            continue
+        value = parts[0]
+        try:
+            weight = max(float(parts[1]), 0.01) if len(parts) > 1 else 1.0
+        except ValueError:
+            logger.error("API key ...%s 的权重无效，按 1 处理", value[-4:])
+            weight = 1.0
+        keys.append((value, weight))
+    return keys
+
+
+def _load_keys() -> List[Tuple[str, float]]:
+    keys: List[Tuple[str, float]] = []
+    if SERPER_API_KEYS_FILE:
+        try:
+            with open(SERPER_API_KEYS_FILE, encoding="utf-8") as f:
+                keys.extend(parse_keys(f.read(), None))
+        except OSError as e:
+            logger.error("读取 API key 文件失败：%s，原因：%s", SERPER_API_KEYS_FILE, e)
+    if SERPER_API_KEYS:
+        keys.extend(parse_keys(SERPER_API_KEYS, ","))
+    if not keys and SERPER_API_KEY:
+        keys.append((SERPER_API_KEY, 1.0))
+    unique: Dict[str, float] = {}
+    for value, weight in keys:
+        unique.setdefault(value, weight)
+    return list(unique.items())
+
+
+def _credits_exhausted(headers: Optional[Mapping[str, str]]) -> bool:
+    if not KEY_CREDITS_HEADER or not headers:
+        return False
+    try:
+        return float(headers.get(KEY_CREDITS_HEADER, "")) <= 0
+    except ValueError:
+        return False
+
+
+def is_key_rejection(exc: BaseException) -> bool:
+    """上游因 key 本身拒绝了请求：403（key 失效或无额度），或错误响应报告剩余额度为 0"""
+    import aiohttp
+
+    if not isinstance(exc, aiohttp.ClientResponseError):
+        return False
+    return exc.status == 403 or _credits_exhausted(exc.headers)
+
+
+class KeyPool:
+    """API key 池：每个请求选择一个 key，限流或拒绝的 key 自动冷却
+
+    各 key 独立限速和统计在途请求数，总吞吐随 key 的数量近似线性增长。
+    所有 key 都在冷却时使用最早恢复的 key，由上游决定是否接受。
+    """
+
+    def __init__(self, keys: List[Tuple[str, float]], strategy: str):
+        self.keys = [ApiKey(value, weight) for value, weight in keys]
+        self.strategy = strategy if strategy in ("least_loaded", "round_robin") else "least_loaded"
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    @property
+    def total_weight(self) -> float:
+        return sum(key.weight for key in self.keys)
+
+    def has_available(self) -> bool:
+        """是否还有未冷却的 key，用于决定重试时是否需要遵守 Retry-After"""
+        now = time.monotonic()
+        return any(not key.cooling(now) for key in self.keys)
+
+    def can_switch(self) -> bool:
+        """有多个 key 且还有未冷却的 key 时，失败的请求可以换用其他 key 重试"""
+        return len(self.keys) > 1 and self.has_available()
+
+    def _select(self) -> Optional[ApiKey]:
+        now = time.monotonic()
+        candidates = [key for key in self.keys if not key.cooling(now) and not key.full()]
+        if not candidates:
+            if any(not key.full() for key in self.keys):
+                return min((key for key in self.keys if not key.full()), key=lambda key: key.cooldown_until)
+            return None
+        if self.strategy == "round_robin":
+            total = sum(key.weight for key in candidates)
+            for key in candidates:
+                key.current += key.weight
+            chosen = max(candidates, key=lambda key: key.current)
+            chosen.current -= total
+            return chosen
+        # 在途请求数相同时优先令牌更多的 key
+        return min(candidates, key=lambda key: ((key.in_flight + 1) / key.weight, -key.bucket.tokens))
+
+    @asynccontextmanager
+    async def use(self) -> AsyncIterator[ApiKey]:
+        """选择一个 key 并占用它的一个令牌，退出时释放在途名额"""
+        if not self.keys:
+            raise ValueError("SERPER_API_KEY is empty")
+        key = self._select()
+        while key is None:
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await wait_queued(waiter)
+            except (asyncio.CancelledError, QueueTimeout):
+                # 已被唤醒但随即取消时，把机会让给下一个等待者
+                if waiter.done() and not waiter.cancelled():
+                    self._wake()
+                raise
+            key = self._select()
+        key.in_flight += 1
+        key.requests += 1
+        try:
+            await key.bucket.acquire()
+            yield key
+        finally:
+            key.in_flight -= 1
+            self._wake()
+
+    def _wake(self) -> None:
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+
+    def on_response(self, key: ApiKey, status: int, headers: Mapping[str, str]) -> None:
+        """按响应状态调整 key 的速率和冷却，并记录上游报告的剩余额度"""
+        if KEY_CREDITS_HEADER:
+            remaining = headers.get(KEY_CREDITS_HEADER)
+            if remaining is not None:
+                try:
+                    key.credits_remaining = float(remaining)
+                except ValueError:
+                    pass
+                else:
+                    if _credits_exhausted(headers):
+                        logger.warning("API key %s 额度已用完，冷却 %.0fs", key.label, KEY_FORBIDDEN_COOLDOWN)
+                        key.cool_down(KEY_FORBIDDEN_COOLDOWN)
+        if status == 429:
+            key.throttled += 1
+            retry_after = parse_retry_after(headers.get("Retry-After"))
+            key.bucket.on_throttled(retry_after)
+            key.cool_down(retry_after if retry_after is not None else KEY_THROTTLE_COOLDOWN)
+            logger.warning("API key %s 触发限流，冷却 %.0fs", key.label, key.cooldown_until - time.monotonic())
+        elif status == 403:
+            key.forbidden += 1
+            key.cool_down(KEY_FORBIDDEN_COOLDOWN)
+            logger.warning("API key %s 被拒绝（403），冷却 %.0fs", key.label, KEY_FORBIDDEN_COOLDOWN)
+        elif status < 400:
+            key.bucket.on_success()
+
+    def record_credits(self, key: ApiKey, data: Any, headers: Mapping[str, str]) -> None:
+        """累计响应中的 credits 字段（本次请求消耗的额度），批量请求按各项求和
+
+        响应头没有报告剩余额度时，从上一次报告的剩余额度中扣除。
+        """
+        items = data if isinstance(data, list) else [data]
+        used = sum(item["credits"] for item in items if isinstance(item, dict) and isinstance(item.get("credits"), (int, float)))
+        key.credits_used += used
+        if used and key.credits_remaining is not None and KEY_CREDITS_HEADER not in headers:
+            key.credits_remaining = max(key.credits_remaining - used, 0.0)
+
+    def stats(self) -> List[Dict[str, Any]]:
+        return [key.stats() for key in self.keys]
+
+
+key_pool = KeyPool(_load_keys(), KEY_STRATEGY)
@@ -0,0 +1,50 @@
+import os
+import math
+from collections import deque
+from typing import Deque, Dict, Optional
+
+LATENCY_WINDOW = int(os.getenv("SERPER_LATENCY_WINDOW", "200"))
+LATENCY_MIN_SAMPLES = int(os.getenv("SERPER_LATENCY_MIN_SAMPLES", "20"))
+
+
+def latency_key(endpoint: str, gl: Optional[str] = None) -> str:
+    """延迟统计的分组键：接口名加地区，例如 search:jp"""
+    return f"{endpoint}:{gl}" if gl else endpoint
+
+
+class LatencyTracker:
+    """按分组保存最近若干次成功请求的耗时，用于计算分位数"""
+
+    def __init__(self, window: int, min_samples: int):
+        self.window = window
+        self.min_samples = min_samples
+        self._samples: Dict[str, Deque[float]] = {}
+
+    def record(self, key: str, seconds: float) -> None:
+        samples = self._samples.get(key)
+        if samples is None:
+            samples = self._samples[key] = deque(maxlen=self.window)
+        samples.append(seconds)
+
+    def count(self, key: str) -> int:
+        samples = self._samples.get(key)
+        return len(samples) if samples else 0
+
+    def mean(self, key: str) -> Optional[float]:
+        """返回最近样本的平均耗时（秒），不要求最少样本数，没有样本时返回 None"""
+        samples = self._samples.get(key)
+        if not samples:
+            return None
+        return sum(samples) / len(samples)
+
+    def percentile(self, key: str, q: float) -> Optional[float]:
+        """返回第 q 百分位耗时（秒），样本不足时返回 None"""
+        samples = self._samples.get(key)
+        if not samples or len(samples) < self.min_samples:
+            return None
+        ordered = sorted(samples)
+        index = min(len(ordered) - 1, max(0, math.ceil(q / 100 * len(ordered)) - 1))
+        return ordered[index]
+
+
+latency_tracker = LatencyTracker(LATENCY_WINDOW, LATENCY_MIN_SAMPLES)
@@ -0,0 +1,293 @@
+import os
+import time
+import asyncio
+import logging
+import contextvars
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from email.utils import parsedate_to_datetime
+from typing import Deque, Dict, Any, Optional
+from urllib.parse import urlsplit
+from .metrics import queue_wait
+
+UPSTREAM_MAX_IN_FLIGHT = int(os.getenv("SERPER_MAX_IN_FLIGHT", "16"))
+UPSTREAM_QPS = float(os.getenv("SERPER_QPS", "50"))
+UPSTREAM_BURST = float(os.getenv("SERPER_BURST", str(UPSTREAM_QPS)))
+UPSTREAM_MIN_QPS = float(os.getenv("SERPER_MIN_QPS", "1"))
+# 收到 429 时的降速系数，以及每次成功后恢复的速率比例
+UPSTREAM_QPS_DECREASE = float(os.getenv("SERPER_QPS_DECREASE", "0.5"))
+UPSTREAM_QPS_RECOVERY = float(os.getenv("SERPER_QPS_RECOVERY", "0.05"))
+
+logger = logging.getLogger(__name__)
+
+# 后台预取等低优先级请求在任务内设置为 True：只在没有前台请求排队时占用名额，且最多占用四分之一
+background = contextvars.ContextVar("serper_background", default=False)
+# 发起请求的工具名，由 call_tool 设置；排队时按工具轮转，一个工具的大量请求不会挤占其他工具
+current_tool = contextvars.ContextVar("serper_tool", default="unknown")
+# 当前上游请求（含所有重试）的截止时间（time.monotonic），由 with_retries 设置；排队等待名额和令牌也不能超过它
+request_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("serper_deadline", default=None)
+
+
+class QueueTimeout(asyncio.TimeoutError):
+    """在本地排队（并发名额、令牌或 API key）时已超过请求的截止时间，请求没有发往上游"""
+
+    def __init__(self):
+        super().__init__("Request deadline exceeded while waiting for an upstream slot")
+
+
+def remaining_time() -> Optional[float]:
+    """距当前请求截止时间的秒数，没有截止时间时返回 None"""
+    deadline = request_deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+async def wait_queued(waiter: asyncio.Future) -> None:
+    """等待排队的 future，超过当前请求的截止时间时取消它并抛出 QueueTimeout"""
+    remaining = remaining_time()
+    if remaining is None:
+        await waiter
+        return
+    try:
+        await asyncio.wait_for(waiter, max(remaining, 0.0))
+    except asyncio.TimeoutError:
+        raise QueueTimeout() from None
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """解析 Retry-After 头，支持秒数和 HTTP 日期两种格式"""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """令牌桶限速器，收到 429 时按比例降速（AIMD），成功后逐步恢复到配置速率"""
+
+    def __init__(self, rate: float, burst: float, min_rate: float):
+        self.max_rate = rate
+        self.rate = rate
+        self.min_rate = min(min_rate, rate) if rate > 0 else 0.0
+        self.capacity = max(burst, 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.last_decrease = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_rate > 0
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self) -> float:
+        """预订一个令牌，返回调用方需要等待的秒数；令牌可以透支以保证先到先得"""
+        if not self.enabled:
+            return 0.0
+        now = time.monotonic()
+        self._refill(now)
+        self.tokens -= 1
+        return -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+    async def acquire(self) -> None:
+        delay = self.reserve()
+        if delay <= 0:
+            return
+        remaining = remaining_time()
+        if remaining is not None and delay > remaining:
+            # 预订的等待已超过剩余时间，归还令牌并立即失败，不空等到截止时间
+            self.tokens += 1
+            raise QueueTimeout()
+        await asyncio.sleep(delay)
+
+    def on_success(self) -> None:
+        if self.enabled and self.rate < self.max_rate:
+            self.rate = min(self.max_rate, self.rate + self.max_rate * UPSTREAM_QPS_RECOVERY)
+
+    def on_throttled(self, retry_after: Optional[float]) -> None:
+        if not self.enabled:
+            return
+        now = time.monotonic()
+        self._refill(now)
+        # 同一批并发请求同时收到 429 时只降速一次
+        if now - self.last_decrease >= 1.0:
+            self.rate = max(self.min_rate, self.rate * UPSTREAM_QPS_DECREASE)
+            self.last_decrease = now
+        # Retry-After 折算为令牌欠账，之后的预订按速率依次排在其后
+        self.tokens = min(self.tokens, -(retry_after or 0.0) * self.rate)
+
+
+class UpstreamLimiter:
+    """单个上游主机的调度器：限制并发请求数，并按调用的工具轮转排队以保证公平"""
+
+    def __init__(self, host: str, max_in_flight: int, bucket: TokenBucket):
+        self.host = host
+        self.max_in_flight = max(max_in_flight, 1)
+        self.bucket = bucket
+        self.in_flight = 0
+        self.total_requests = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.throttled = 0
+        self.max_background = max(self.max_in_flight // 4, 1)
+        self.background_in_flight = 0
+        self._background: Deque[asyncio.Future] = deque()
+        # 工具名 -> 等待中的 future，按插入顺序轮转唤醒
+        self._queues: "OrderedDict[str, Deque[asyncio.Future]]" = OrderedDict()
+        # 仍在等待的前台请求数，入队时加一，被唤醒或取消时减一
+        self.queue_depth = 0
+
+    @asynccontextmanager
+    async def slot(self, endpoint: str, tool: str):
+        """占用一个并发名额和一个令牌后执行请求；tool 决定排队顺序，endpoint 用于指标"""
+        start_time = time.monotonic()
+        low_priority = background.get()
+        await (self._acquire_background() if low_priority else self._acquire(tool))
+        try:
+            await self.bucket.acquire()
+            waited = time.monotonic() - start_time
+            self.total_requests += 1
+            self.total_wait += waited
+            self.max_wait = max(self.max_wait, waited)
+            queue_wait.observe(waited, self.host, endpoint)
+            if waited >= 0.001:
+                logger.debug(
+                    "上游 %s 排队等待：%.1fms，接口：%s，工具：%s，队列深度：%d",
+                    self.host,
+                    waited * 1000,
+                    endpoint,
+                    tool,
+                    self.queue_depth,
+                )
+            yield waited
+        finally:
+            if low_priority:
+                self.background_in_flight -= 1
+            self._release()
+
+    async def _acquire(self, tool: str) -> None:
+        if self.in_flight < self.max_in_flight and not self.queue_depth:
+            self.in_flight += 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(tool, deque()).append(waiter)
+        self.queue_depth += 1
+        try:
+            await wait_queued(waiter)
+        except (asyncio.CancelledError, QueueTimeout):
+            # 名额已分配但调用方被取消时需要归还；仍在排队时只从计数中去掉，留在队列中的 future 由 _release 跳过
+            if waiter.done() and not waiter.cancelled():
+                self._release()
+            else:
+                self.queue_depth -= 1
+            raise
+
+    async def _acquire_background(self) -> None:
+        if self._background_ready() and not self._background:
+            self.in_flight += 1
+            self.background_in_flight += 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self._background.append(waiter)
+        try:
+            await wait_queued(waiter)
+        except (asyncio.CancelledError, QueueTimeout):
+            if waiter.done() and not waiter.cancelled():
+                self.background_in_flight -= 1
+                self._release()
+            raise
+
+    def _background_ready(self) -> bool:
+        return (
+            self.in_flight < self.max_in_flight
+            and self.background_in_flight < self.max_background
+            and not self.queue_depth
+        )
+
+    def _release(self) -> None:
+        self.in_flight -= 1
+        while self.in_flight < self.max_in_flight and self._queues:
+            tool, queue = self._queues.popitem(last=False)
+            waiter = queue.popleft()
+            if queue:
+                self._queues[tool] = queue
+            if waiter.done():
+                continue
+            self.in_flight += 1
+            self.queue_depth -= 1
+            waiter.set_result(None)
+        # 前台请求都已放行后，再放行后台请求
+        while self._background and self._background_ready():
+            waiter = self._background.popleft()
+            if waiter.done():
+                continue
+            self.in_flight += 1
+            self.background_in_flight += 1
+            waiter.set_result(None)
+
+    def on_response(self, status: int, retry_after: Optional[str] = None) -> None:
+        """根据响应状态调整速率，429 时降速并遵守 Retry-After"""
+        if status == 429:
+            self.throttled += 1
+            delay = parse_retry_after(retry_after)
+            self.bucket.on_throttled(delay)
+            logger.warning(
+                "上游 %s 触发限流，速率降至 %.1f QPS，Retry-After：%s",
+                self.host,
+                self.bucket.rate,
+                delay,
+            )
+        elif status < 400:
+            self.bucket.on_success()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "host": self.host,
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth,
+            "background_in_flight": self.background_in_flight,
+            "requests": self.total_requests,
+            "avg_wait_ms": self.total_wait / self.total_requests * 1000 if self.total_requests else 0.0,
+            "max_wait_ms": self.max_wait * 1000,
+            "qps": self.bucket.rate if self.bucket.enabled else None,
+            "throttled": self.throttled,
+        }
+
+
+def key_scale() -> int:
+    """每个 API key 单独限速，主机的速率和并发上限按 key 的数量放大"""
+    from .keys import key_pool
+
+    return max(len(key_pool), 1)
+
+
+_limiters: Dict[str, UpstreamLimiter] = {}
+
+
+def get_limiter(url: str) -> UpstreamLimiter:
+    """返回 URL 所属主机的调度器，每个主机一个"""
+    host = urlsplit(url).netloc
+    limiter = _limiters.get(host)
+    if limiter is None:
+        from .broker import broker_client, RemoteTokenBucket
+
+        scale = key_scale()
+        bucket = TokenBucket(UPSTREAM_QPS * scale, UPSTREAM_BURST * scale, UPSTREAM_MIN_QPS)
+        # 多进程模式下由协调进程统一发放令牌，所有工作进程共享一份速率预算
+        if broker_client is not None:
+            bucket = RemoteTokenBucket(host, broker_client, bucket)
+        limiter = UpstreamLimiter(host, UPSTREAM_MAX_IN_FLIGHT * scale, bucket)
+        _limiters[host] = limiter
+    return limiter
+
+
+def limiter_stats() -> Dict[str, Dict[str, Any]]:
+    return {host: limiter.stats() for host, limiter in _limiters.items()}
@@ -0,0 +1,135 @@
+import os
+import sys
+import json
+import queue
+import atexit
+import random
+import logging
+import itertools
+import contextvars
+import logging.handlers
+from typing import Any, Dict, Optional, Tuple
+
+# text 为原有的单行文本格式，json 为每行一个 JSON 对象
+LOG_FORMAT = os.getenv("SERPER_LOG_FORMAT", "text").strip().lower()
+# 成功路径调试日志的采样比例，按请求整体保留或丢弃；INFO 及以上级别和异常日志不采样
+LOG_SAMPLE_RATE = float(os.getenv("SERPER_LOG_SAMPLE_RATE", "1"))
+# 等待后台线程写出的日志条数上限，队列满时丢弃新日志，不阻塞事件循环
+LOG_QUEUE_SIZE = int(os.getenv("SERPER_LOG_QUEUE_SIZE", "10000"))
+# 调试日志中单个字符串参数的最大长度
+LOG_PAYLOAD_LIMIT = int(os.getenv("SERPER_LOG_PAYLOAD_LIMIT", "200"))
+
+TEXT_FORMAT = "%(asctime)s %(levelname)s %(name)s [%(request_id)s] - %(message)s"
+
+# 当前请求的 (请求 ID, 是否采样)，由 call_tool 设置，请求内创建的任务会继承
+_request: contextvars.ContextVar[Tuple[str, bool]] = contextvars.ContextVar("serper_request", default=("-", True))
+_ids = itertools.count(1)
+_prefix = f"{os.getpid():x}"
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def start_request() -> str:
+    """为当前请求分配 ID 并决定是否记录其调试日志，返回请求 ID"""
+    request_id = f"{_prefix}-{next(_ids)}"
+    _request.set((request_id, LOG_SAMPLE_RATE >= 1 or random.random() < LOG_SAMPLE_RATE))
+    return request_id
+
+
+def debug_enabled(logger: logging.Logger) -> bool:
+    """当前请求的调试日志会被记录时返回 True，用于跳过只为日志构建的参数"""
+    return logger.isEnabledFor(logging.DEBUG) and _request.get()[1]
+
+
+def summarize_payload(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """截断过长的字符串参数；只在 debug_enabled 为 True 时调用"""
+    summary: Dict[str, Any] = {}
+    for key, value in payload.items():
+        if isinstance(value, str) and len(value) > LOG_PAYLOAD_LIMIT:
+            summary[key] = f"{value[:LOG_PAYLOAD_LIMIT]}...(已截断)"
+        else:
+            summary[key] = value
+    return summary
+
+
+class _RequestFilter(logging.Filter):
+    """附加请求 ID，并按请求丢弃未被采样的调试日志"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        request_id, sampled = _request.get()
+        record.request_id = request_id
+        return sampled or record.levelno > logging.DEBUG or record.exc_info is not None
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """在调用线程只合并消息参数和格式化异常栈，格式化和写出交给后台线程"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            # 异常对象不能跨线程保留，这里先展开为完整的调用栈文本
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            pass
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, "request_id", "-"),
+            "message": record.getMessage(),
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        if record.stack_info:
+            entry["stack"] = record.stack_info
+        return json.dumps(entry, ensure_ascii=False)
+
+
+def configure_logging(level: int, log_file: str) -> None:
+    """日志先进入队列，由后台线程写到标准错误和日志文件，事件循环线程不做文件 I/O"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+    formatter = JsonFormatter() if LOG_FORMAT == "json" else logging.Formatter(TEXT_FORMAT)
+    handlers: list[logging.Handler] = [logging.StreamHandler(sys.stderr)]
+    if log_file:
+        log_dir = os.path.dirname(log_file)
+        if log_dir:
+            os.makedirs(log_dir, exist_ok=True)
+        handlers.append(logging.FileHandler(log_file, encoding="utf-8"))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    queue_handler = _QueueHandler(queue.Queue(LOG_QUEUE_SIZE if LOG_QUEUE_SIZE > 0 else 0))
+    queue_handler.addFilter(_RequestFilter())
+    logging.basicConfig(level=level, handlers=[queue_handler], force=True)
+
+    _listener = logging.handlers.QueueListener(queue_handler.queue, *handlers, respect_handler_level=True)
+    _listener.start()
+
+
+def stop_logging() -> None:
+    """写出队列中剩余的日志并停止后台线程"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(stop_logging)
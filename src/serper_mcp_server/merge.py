@@ -0,0 +1,82 @@
+import os
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from .cache import normalize_url
+
+# 倒数排名融合的平滑常数，越大排名靠后的结果与靠前结果的分差越小
+MERGE_RRF_K = float(os.getenv("SERPER_MERGE_RRF_K", "60"))
+
+# 不影响页面内容的跟踪参数，去重前从查询串中删除
+_TRACKING_PARAMS = frozenset({"gclid", "fbclid", "msclkid", "yclid", "ref", "ref_src", "spm"})
+
+logger = logging.getLogger(__name__)
+
+
+def canonical_url(url: str) -> str:
+    """在 normalize_url 的基础上去掉 www.、跟踪参数、末尾斜杠和协议差异，作为跨地区去重的键"""
+    normalized = normalize_url(url)
+    parts = urlsplit(normalized)
+    if not parts.netloc:
+        return normalized
+    netloc = parts.netloc[4:] if parts.netloc.startswith("www.") else parts.netloc
+    query = parts.query
+    if query:
+        params = [
+            (key, value)
+            for key, value in parse_qsl(query, keep_blank_values=True)
+            if key.lower() not in _TRACKING_PARAMS and not key.lower().startswith("utm_")
+        ]
+        query = urlencode(params)
+    path = parts.path.rstrip("/") or "/"
+    return urlunsplit(("", netloc, path, query, ""))
+
+
+def merge_regions(
+    responses: List[Tuple[str, Dict[str, Any]]],
+    weights: Optional[Dict[str, float]] = None,
+    k: float = MERGE_RRF_K,
+) -> Tuple[List[Dict[str, Any]], int]:
+    """按倒数排名融合（RRF）合并各地区的自然结果，返回 (排序后的结果, 删除的重复条数)
+
+    每个结果的得分为其出现过的地区的 weight / (k + 排名) 之和。去重通过哈希索引一次遍历
+    完成，排序只作用于去重后的结果。条目保留首次出现时的字段，并记录出现的地区和各地区排名。
+    """
+    weights = weights or {}
+    index: Dict[str, Dict[str, Any]] = {}
+    scores: Dict[str, float] = {}
+    duplicates = 0
+    for gl, response in responses:
+        weight = weights.get(gl, 1.0)
+        for rank, item in enumerate(response.get("organic") or [], 1):
+            link = item.get("link") if isinstance(item, dict) else None
+            if not isinstance(link, str) or not link:
+                continue
+            key = canonical_url(link)
+            entry = index.get(key)
+            if entry is None:
+                entry = {name: value for name, value in item.items() if name != "position"}
+                entry["regions"] = []
+                entry["ranks"] = {}
+                index[key] = entry
+                scores[key] = 0.0
+            elif gl in entry["ranks"]:
+                # 同一地区内重复出现的链接只按最高排名计分
+                duplicates += 1
+                continue
+            else:
+                duplicates += 1
+            entry["regions"].append(gl)
+            entry["ranks"][gl] = rank
+            scores[key] += weight / (k + rank)
+
+    ordered = sorted(index, key=scores.__getitem__, reverse=True)
+    merged = []
+    for position, key in enumerate(ordered, 1):
+        entry = index[key]
+        entry["position"] = position
+        entry["score"] = round(scores[key], 6)
+        merged.append(entry)
+    logger.debug("跨地区合并完成，合并后：%d 条，去除重复：%d 条", len(merged), duplicates)
+    return merged, duplicates
@@ -0,0 +1,283 @@
+import os
+import time
+import bisect
+import asyncio
+import logging
+import contextlib
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Sequence, Tuple
+
+METRICS_FILE = os.getenv("SERPER_METRICS_FILE", "").strip()
+METRICS_FILE_INTERVAL = float(os.getenv("SERPER_METRICS_FILE_INTERVAL", "15"))
+TRACING_ENABLED = os.getenv("SERPER_OTEL_ENABLED", "false").strip().lower() == "true"
+
+# 延迟直方图的分桶上界（秒）
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+Labels = Tuple[str, ...]
+
+_INF_LABEL = 'le="+Inf"'
+
+logger = logging.getLogger(__name__)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Labels, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Counter:
+    """只增不减的计数器，按标签值分组"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(label_names)
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        key = tuple(str(label) for label in labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self) -> Iterator[str]:
+        for labels, value in sorted(self._values.items()):
+            yield f"{self.name}{_format_labels(self.label_names, labels)} {_format_value(value)}"
+
+
+class Histogram:
+    """累积分桶直方图，按标签值分组"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets))
+        # 标签值 -> (各分桶计数, 总和, 样本数)
+        self._values: Dict[Labels, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        key = tuple(str(label) for label in labels)
+        entry = self._values.get(key)
+        if entry is None:
+            entry = self._values[key] = ([0] * len(self.buckets), [0.0, 0.0])
+        counts, totals = entry
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(counts):
+            counts[index] += 1
+        totals[0] += value
+        totals[1] += 1
+
+    def samples(self) -> Iterator[str]:
+        for labels, (counts, (total, count)) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                yield f"{self.name}_bucket{_format_labels(self.label_names, labels, le)} {cumulative}"
+            yield f"{self.name}_bucket{_format_labels(self.label_names, labels, _INF_LABEL)} {int(count)}"
+            yield f"{self.name}_sum{_format_labels(self.label_names, labels)} {_format_value(total)}"
+            yield f"{self.name}_count{_format_labels(self.label_names, labels)} {int(count)}"
+
+
+class CallbackGauge:
+    """输出时才读取当前值的仪表，用于队列深度、并发数等已在别处维护的状态"""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str], read: Callable[[], Iterable[Tuple[Labels, float]]]):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(label_names)
+        self.read = read
+
+    def samples(self) -> Iterator[str]:
+        for labels, value in self.read():
+            if value is not None:
+                yield f"{self.name}{_format_labels(self.label_names, labels)} {_format_value(value)}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[Any] = []
+
+    def register(self, metric: Any) -> Any:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """按 Prometheus 文本格式输出所有指标"""
+        lines: List[str] = []
+        for metric in self._metrics:
+            try:
+                samples = list(metric.samples())
+            except Exception:
+                logger.exception("读取指标失败：%s", metric.name)
+                continue
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+
+def _limiter_gauge(field: str) -> Callable[[], Iterable[Tuple[Labels, float]]]:
+    def read() -> Iterable[Tuple[Labels, float]]:
+        from .limiter import limiter_stats
+
+        return [((host,), stats[field]) for host, stats in limiter_stats().items()]
+
+    return read
+
+
+def _cache_gauge(field: str) -> Callable[[], Iterable[Tuple[Labels, float]]]:
+    def read() -> Iterable[Tuple[Labels, float]]:
+        from .cache import response_cache
+
+        return [((), response_cache.stats()[field])]
+
+    return read
+
+
+def _key_gauge(field: str) -> Callable[[], Iterable[Tuple[Labels, float]]]:
+    def read() -> Iterable[Tuple[Labels, float]]:
+        from .keys import key_pool
+
+        return [((stats["key"],), stats[field]) for stats in key_pool.stats()]
+
+    return read
+
+
+def _prefetch_gauge(field: str) -> Callable[[], Iterable[Tuple[Labels, float]]]:
+    def read() -> Iterable[Tuple[Labels, float]]:
+        from .prefetch import prefetcher
+
+        return [((), prefetcher.stats()[field])] if prefetcher.enabled else []
+
+    return read
+
+
+registry = Registry()
+
+tool_calls = registry.register(Counter("serper_tool_calls_total", "MCP tool calls by outcome", ("tool", "outcome")))
+tool_duration = registry.register(Histogram("serper_tool_duration_seconds", "End-to-end MCP tool call latency", ("tool",)))
+tool_response_bytes = registry.register(Counter("serper_tool_response_bytes_total", "Bytes returned to MCP clients", ("tool",)))
+phase_duration = registry.register(Histogram("serper_phase_duration_seconds", "Time spent in each tool call phase", ("phase",)))
+upstream_requests = registry.register(
+    Counter("serper_upstream_requests_total", "Upstream HTTP attempts by status code or error type", ("endpoint", "status"))
+)
+upstream_duration = registry.register(
+    Histogram("serper_upstream_duration_seconds", "Upstream HTTP attempt latency, excluding local queueing", ("endpoint", "region"))
+)
+upstream_request_bytes = registry.register(Counter("serper_upstream_request_bytes_total", "Bytes sent upstream", ("endpoint",)))
+upstream_response_bytes = registry.register(Counter("serper_upstream_response_bytes_total", "Bytes received from upstream", ("endpoint",)))
+queue_wait = registry.register(
+    Histogram("serper_upstream_queue_wait_seconds", "Time waiting for a concurrency slot and rate limit token", ("host", "endpoint"))
+)
+cache_lookups = registry.register(Counter("serper_cache_lookups_total", "Cache lookups by result: memory, shared, disk, stale or miss", ("endpoint", "result")))
+coalesced_requests = registry.register(Counter("serper_coalesced_requests_total", "Requests served by an identical in-flight request", ("endpoint",)))
+prefetches = registry.register(
+    Counter("serper_prefetch_total", "Next-page prefetches by outcome: issued, hit, wasted, failed, over_budget or busy", ("tool", "outcome"))
+)
+registry.register(CallbackGauge("serper_upstream_in_flight", "Upstream requests currently in flight", ("host",), _limiter_gauge("in_flight")))
+registry.register(CallbackGauge("serper_upstream_queue_depth", "Requests waiting for an upstream slot", ("host",), _limiter_gauge("queue_depth")))
+registry.register(CallbackGauge("serper_upstream_qps_limit", "Current adaptive upstream rate limit", ("host",), _limiter_gauge("qps")))
+registry.register(CallbackGauge("serper_cache_entries", "Entries in the in-memory response cache", (), _cache_gauge("entries")))
+registry.register(CallbackGauge("serper_cache_bytes", "Bytes held by the in-memory response cache", (), _cache_gauge("bytes")))
+registry.register(CallbackGauge("serper_api_key_in_flight", "Upstream requests in flight per API key", ("key",), _key_gauge("in_flight")))
+registry.register(CallbackGauge("serper_api_key_cooldown_seconds", "Seconds until a throttled or rejected API key is used again", ("key",), _key_gauge("cooldown_seconds")))
+registry.register(CallbackGauge("serper_api_key_credits_used", "Credits consumed per API key since start", ("key",), _key_gauge("credits_used")))
+registry.register(CallbackGauge("serper_api_key_credits_remaining", "Remaining credits last reported by the upstream per API key", ("key",), _key_gauge("credits_remaining")))
+registry.register(CallbackGauge("serper_prefetch_hit_ratio", "Share of settled prefetches that were later requested", (), _prefetch_gauge("hit_ratio")))
+registry.register(CallbackGauge("serper_prefetch_waste_ratio", "Share of settled prefetches that expired unused", (), _prefetch_gauge("waste_ratio")))
+
+
+class _NoopSpan:
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+_tracer: Any = None
+_tracer_provider: Any = None
+
+
+@contextlib.contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Any]:
+    """记录一个处理阶段：耗时计入 serper_phase_duration_seconds，启用 OpenTelemetry 时同时生成子 span"""
+    start_time = time.perf_counter()
+    try:
+        if _tracer is None:
+            yield _NOOP_SPAN
+        else:
+            with _tracer.start_as_current_span(f"serper.{name}", attributes=attributes) as current:
+                yield current
+    finally:
+        phase_duration.observe(time.perf_counter() - start_time, name)
+
+
+def setup_tracing() -> None:
+    """按配置初始化 OpenTelemetry；已有全局 TracerProvider 时直接复用"""
+    global _tracer, _tracer_provider
+    if not TRACING_ENABLED or _tracer is not None:
+        return
+    try:
+        from opentelemetry import trace as otel_trace
+    except ImportError:  # OpenTelemetry 为可选依赖，未安装时只输出 Prometheus 指标
+        logger.warning("已设置 SERPER_OTEL_ENABLED，但未安装 opentelemetry-api，跳过链路追踪")
+        return
+    try:
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+    except ImportError:
+        logger.info("未安装 OpenTelemetry SDK 或 OTLP 导出器，使用已注册的全局 TracerProvider")
+    else:
+        if not isinstance(otel_trace.get_tracer_provider(), TracerProvider):
+            _tracer_provider = TracerProvider(
+                resource=Resource.create({"service.name": os.getenv("OTEL_SERVICE_NAME", "serper-mcp-server")})
+            )
+            _tracer_provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+            otel_trace.set_tracer_provider(_tracer_provider)
+            logger.info("已启用 OpenTelemetry 链路追踪，导出方式：OTLP/HTTP")
+    _tracer = otel_trace.get_tracer("serper_mcp_server")
+
+
+def shutdown_tracing() -> None:
+    """导出尚未发送的 span"""
+    if _tracer_provider is not None:
+        _tracer_provider.shutdown()
+
+
+def write_metrics_file(path: str) -> None:
+    """原子地写入指标文件，格式兼容 node_exporter 的 textfile 收集器"""
+    path = path.replace("{pid}", str(os.getpid()))
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        f.write(registry.render())
+    os.replace(temp_path, path)
+
+
+async def metrics_file_loop(path: str) -> None:
+    """定期把指标写入文件，用于没有 HTTP 端口的 stdio 模式"""
+    while True:
+        await asyncio.sleep(METRICS_FILE_INTERVAL)
+        try:
+            write_metrics_file(path)
+        except OSError as e:
+            logger.warning("写入指标文件失败：%s，原因：%s", path, e)
@@ -0,0 +1,133 @@
+import os
+import asyncio
+import logging
+from typing import Any, Dict, List, Set
+from urllib.parse import urlsplit
+
+from .cache import normalize_url
+from .core import google, scrape_entry, SCRAPE_BATCH_CONCURRENCY, SCRAPE_URL_TIMEOUT
+from .enums import SerperTools
+from .schemas import SearchRequest, SearchScrapeRequest
+
+# 搜索并抓取时，所有页面正文合计的默认字节预算
+SEARCH_SCRAPE_MAX_BYTES = int(os.getenv("SERPER_SEARCH_SCRAPE_MAX_BYTES", "100000"))
+
+logger = logging.getLogger(__name__)
+
+
+def _domain(url: str) -> str:
+    host = urlsplit(url).hostname or ""
+    return host[4:] if host.startswith("www.") else host
+
+
+def _fit_documents(documents: List[Dict[str, Any]], field: str, budget: int) -> int:
+    """在总预算内分配各页面正文的长度，短页面用不完的份额留给长页面，返回最终总字节数"""
+    sized = [
+        (len(document[field].encode("utf-8")), document)
+        for document in documents
+        if isinstance(document.get(field), str)
+    ]
+    sized.sort(key=lambda item: item[0])
+    remaining = budget
+    total = 0
+    for position, (size, document) in enumerate(sized):
+        share = remaining // (len(sized) - position)
+        if size > share:
+            document[field] = document[field].encode("utf-8")[:share].decode("utf-8", "ignore")
+            document["truncated"] = True
+            size = share
+        remaining -= size
+        total += size
+    return total
+
+
+async def search_and_scrape(request: SearchScrapeRequest) -> Dict[str, Any]:
+    """搜索后抓取排名靠前的自然结果
+
+    结果页逐页请求，已选链接不足时才请求下一页；每选中一个链接立即开始抓取，不等待后续结果页。
+    链接按规范化 URL 去重，并限制同一域名的页面数，最后按字节预算截断正文。
+    """
+    top = int(request.top)
+    per_domain = int(request.per_domain)
+    timeout = float(request.timeout) if request.timeout else SCRAPE_URL_TIMEOUT
+    budget = int(request.max_bytes) if request.max_bytes else SEARCH_SCRAPE_MAX_BYTES
+    field = "markdown" if request.includeMarkdown == "true" else "text"
+    first_page = int(request.page or "1")
+    search_args = request.model_dump(include={"q", "gl", "hl", "location", "num", "tbs"}, exclude_none=True)
+    semaphore = asyncio.Semaphore(max(SCRAPE_BATCH_CONCURRENCY, 1))
+
+    async def scrape(url: str) -> Dict[str, Any]:
+        async with semaphore:
+            return await scrape_entry(url, request.includeMarkdown, timeout)
+
+    documents: List[Dict[str, Any]] = []
+    scrapes: List[asyncio.Task] = []
+    seen: Set[str] = set()
+    domains: Dict[str, int] = {}
+    skipped = 0
+    pages_used = 0
+    search_errors: List[Dict[str, Any]] = []
+    try:
+        for offset in range(int(request.pages)):
+            if len(documents) >= top:
+                break
+            try:
+                data = await google(SerperTools.GOOGLE_SEARCH, SearchRequest(**search_args, page=str(first_page + offset)))
+            except Exception as e:
+                if offset == 0:
+                    raise
+                search_errors.append({"page": first_page + offset, "error": str(e)})
+                continue
+            pages_used += 1
+            for item in data.get("organic", []):
+                link = item.get("link")
+                if not isinstance(link, str) or not link:
+                    continue
+                canonical = normalize_url(link)
+                domain = _domain(canonical)
+                if canonical in seen or (per_domain > 0 and domains.get(domain, 0) >= per_domain):
+                    skipped += 1
+                    continue
+                seen.add(canonical)
+                domains[domain] = domains.get(domain, 0) + 1
+                documents.append({
+                    "rank": len(documents) + 1,
+                    "title": item.get("title"),
+                    "link": link,
+                    "snippet": item.get("snippet"),
+                })
+                scrapes.append(asyncio.create_task(scrape(link)))
+                logger.debug("第 %d 页结果已选中链接并开始抓取：%s", first_page + offset, link)
+                if len(documents) >= top:
+                    break
+        entries = await asyncio.gather(*scrapes)
+    finally:
+        # 搜索出错或调用被取消时，不留下仍在运行的抓取任务
+        for task in scrapes:
+            task.cancel()
+        await asyncio.gather(*scrapes, return_exceptions=True)
+
+    failed = []
+    for document, entry in zip(documents, entries):
+        document["status"] = entry["status"]
+        if entry["status"] != "ok":
+            document["error"] = entry["error"]
+            failed.append(document["rank"])
+            continue
+        document[field] = entry.get(field) or ""
+    content_bytes = _fit_documents(documents, field, budget)
+    logger.debug("搜索并抓取完成，文档数：%d，失败：%d，正文：%d 字节", len(documents), len(failed), content_bytes)
+
+    return {
+        "documents": documents,
+        "metadata": {
+            "query": request.q,
+            "search_pages": pages_used,
+            "search_errors": search_errors,
+            "skipped_links": skipped,
+            "scraped_documents": len(documents) - len(failed),
+            "failed_documents": failed,
+            "content_bytes": content_bytes,
+            "max_bytes": budget,
+        },
+    }
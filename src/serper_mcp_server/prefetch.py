@@ -0,0 +1,192 @@
+import os
+import time
+import asyncio
+import logging
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, Optional, Set, Tuple
+
+from pydantic import BaseModel
+
+from .cache import response_cache, cache_key, ttl_for
+from .client import GOOGLE_BASE_URL
+from .core import google, inflight, flight_key
+from .limiter import get_limiter, background
+from .metrics import prefetches
+from .router import Route
+from .schemas import SearchRequest, ShoppingRequest, PatentsRequest
+
+# 默认关闭；开启后在返回第 N 页后于后台预取第 N+1 页并写入缓存
+PREFETCH_ENABLED = os.getenv("SERPER_PREFETCH_ENABLED", "false").strip().lower() == "true"
+# 观察到的翻页比例达到该值的工具和查询类型才预取
+PREFETCH_MIN_FOLLOW_RATE = float(os.getenv("SERPER_PREFETCH_MIN_FOLLOW_RATE", "0.3"))
+# 每个工具和查询类型至少观察到这么多次请求后才开始预取
+PREFETCH_MIN_SAMPLES = int(os.getenv("SERPER_PREFETCH_MIN_SAMPLES", "20"))
+# 每小时最多发起的预取请求数，控制额外消耗的额度
+PREFETCH_HOURLY_BUDGET = int(os.getenv("SERPER_PREFETCH_HOURLY_BUDGET", "100"))
+# 返回第 N 页后多少秒内请求第 N+1 页视为翻页
+PREFETCH_FOLLOW_WINDOW = float(os.getenv("SERPER_PREFETCH_FOLLOW_WINDOW", "300"))
+# 只有最多这么多页的请求会预取下一页
+PREFETCH_MAX_PAGE = int(os.getenv("SERPER_PREFETCH_MAX_PAGE", "3"))
+
+# 支持翻页且适合预取的请求模型
+_PAGED_MODELS = (SearchRequest, ShoppingRequest, PatentsRequest)
+# 每个分组的计数超过该值后减半，使翻页比例跟随近期的使用方式变化
+_DECAY_AFTER = 200
+_MAX_PENDING = 1000
+
+logger = logging.getLogger(__name__)
+
+
+def query_pattern(q: str) -> str:
+    """把查询归为粗粒度的类型：带搜索运算符的、短查询、中等长度查询和长查询"""
+    if ":" in q or '"' in q:
+        return "operator"
+    words = len(q.split())
+    if words <= 2:
+        return "short"
+    return "medium" if words <= 5 else "long"
+
+
+class Prefetcher:
+    """按观察到的翻页比例自适应地预取下一页结果
+
+    每次返回第 N 页时记录下一页的缓存键；窗口期内请求了该键即计为一次翻页。
+    预取的页面在窗口期内被请求计为命中，否则计为浪费。
+    """
+
+    def __init__(self, enabled: bool, budget: int):
+        self.enabled = enabled
+        self.budget = budget
+        # (工具, 查询类型) -> [返回的页数, 随后被翻页的次数]
+        self._follow: Dict[Tuple[str, str], list] = {}
+        # 下一页的缓存键 -> (工具, 查询类型, 截止时间, 是否已预取)
+        self._pending: "OrderedDict[str, Tuple[str, str, float, bool]]" = OrderedDict()
+        self._issued: Deque[float] = deque()
+        self._tasks: Set[asyncio.Task] = set()
+        self.issued = 0
+        self.hits = 0
+        self.wasted = 0
+        self.failed = 0
+
+    def follow_rate(self, tool: str, pattern: str) -> Optional[float]:
+        """返回观察到的翻页比例，样本不足时返回 None"""
+        served, followed = self._follow.get((tool, pattern), (0, 0))
+        if served < PREFETCH_MIN_SAMPLES:
+            return None
+        return followed / served
+
+    def observe(self, route: Route, request: BaseModel) -> None:
+        """在返回一页结果后调用：记录翻页情况，需要时在后台预取下一页"""
+        if not self.enabled or type(request) not in _PAGED_MODELS:
+            return
+        now = time.monotonic()
+        self._expire(now)
+        url = f"{GOOGLE_BASE_URL}/{route.endpoint}"
+        payload = request.model_dump(exclude_none=True)
+        pending = self._pending.pop(cache_key(url, payload), None)
+        if pending is not None:
+            tool, pattern, _, prefetched = pending
+            self._follow[(tool, pattern)][1] += 1
+            if prefetched:
+                self.hits += 1
+                prefetches.inc(tool, "hit")
+
+        page = int(payload.get("page", "1"))
+        if page > PREFETCH_MAX_PAGE:
+            return
+        tool = route.tool.value
+        pattern = query_pattern(payload.get("q", ""))
+        counts = self._follow.setdefault((tool, pattern), [0, 0])
+        counts[0] += 1
+        if counts[0] > _DECAY_AFTER:
+            counts[0] //= 2
+            counts[1] //= 2
+
+        next_payload = {**payload, "page": str(page + 1)}
+        key = cache_key(url, next_payload)
+        prefetch = self._should_prefetch(tool, pattern, url, next_payload, key, now)
+        # 同一页被重复请求时，保留之前已预取的标记
+        previous = self._pending.get(key)
+        self._pending[key] = (tool, pattern, now + PREFETCH_FOLLOW_WINDOW, prefetch or (previous is not None and previous[3]))
+        self._pending.move_to_end(key)
+        while len(self._pending) > _MAX_PENDING:
+            self._discard(self._pending.popitem(last=False)[1])
+        if prefetch:
+            self._issued.append(now)
+            self.issued += 1
+            prefetches.inc(tool, "issued")
+            task = asyncio.create_task(self._fetch(route, request.model_copy(update={"page": str(page + 1)}), key))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    def _should_prefetch(self, tool: str, pattern: str, url: str, payload: Dict[str, Any], key: str, now: float) -> bool:
+        rate = self.follow_rate(tool, pattern)
+        if rate is None or rate < PREFETCH_MIN_FOLLOW_RATE:
+            return False
+        if ttl_for(url, payload) <= 0 or key in response_cache or key in inflight or flight_key(key, True) in inflight:
+            return False
+        while self._issued and now - self._issued[0] >= 3600:
+            self._issued.popleft()
+        if len(self._issued) >= self.budget:
+            prefetches.inc(tool, "over_budget")
+            return False
+        # 上游已有前台请求排队时不再增加负载
+        if get_limiter(url).queue_depth:
+            prefetches.inc(tool, "busy")
+            return False
+        return True
+
+    async def _fetch(self, route: Route, request: BaseModel, key: str) -> None:
+        background.set(True)
+        try:
+            await google(route.tool, request)
+            logger.debug("已预取下一页：%s，页码：%s", route.tool.value, getattr(request, "page", None))
+        except Exception as e:
+            self.failed += 1
+            prefetches.inc(route.tool.value, "failed")
+            # 失败的预取之后被请求不计为命中，过期也不计为浪费
+            entry = self._pending.get(key)
+            if entry is not None:
+                self._pending[key] = (*entry[:3], False)
+            logger.debug("预取下一页失败：%s，原因：%s", route.tool.value, e)
+
+    async def aclose(self) -> None:
+        """取消仍在进行的预取并等待它们结束"""
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _expire(self, now: float) -> None:
+        while self._pending:
+            key, entry = next(iter(self._pending.items()))
+            if entry[2] > now:
+                break
+            del self._pending[key]
+            self._discard(entry)
+
+    def _discard(self, entry: Tuple[str, str, float, bool]) -> None:
+        tool, _, _, prefetched = entry
+        if prefetched:
+            self.wasted += 1
+            prefetches.inc(tool, "wasted")
+
+    def stats(self) -> Dict[str, Any]:
+        settled = self.hits + self.wasted
+        return {
+            "enabled": self.enabled,
+            "issued": self.issued,
+            "hits": self.hits,
+            "wasted": self.wasted,
+            "failed": self.failed,
+            "hit_ratio": self.hits / settled if settled else None,
+            "waste_ratio": self.wasted / settled if settled else None,
+            "follow_rates": {
+                f"{tool}:{pattern}": round(followed / served, 3)
+                for (tool, pattern), (served, followed) in self._follow.items()
+                if served
+            },
+        }
+
+
+prefetcher = Prefetcher(PREFETCH_ENABLED, PREFETCH_HOURLY_BUDGET)
@@ -0,0 +1,63 @@
+import os
+import sys
+import time
+import importlib
+from typing import List, Tuple
+
+# 启动耗时预算（毫秒），大于 0 时超出预算的 --profile-startup 以非零状态退出，便于在 CI 中检查
+STARTUP_BUDGET_MS = float(os.getenv("SERPER_STARTUP_BUDGET_MS", "0"))
+
+# 按依赖顺序逐个导入，每一阶段的耗时只包含此前尚未导入的模块
+STARTUP_STAGES = (
+    ("pydantic", "pydantic"),
+    ("mcp", "mcp.server"),
+    ("schemas", "serper_mcp_server.schemas"),
+    ("core", "serper_mcp_server.core"),
+    ("server", "serper_mcp_server.server"),
+)
+
+# 推迟到首次请求上游时才导入的模块（certifi 和 ssl 已经被 mcp 依赖的 httpx 导入）
+DEFERRED_MODULES = ("aiohttp",)
+
+
+def _elapsed_ms(start: float) -> float:
+    return (time.perf_counter() - start) * 1000
+
+
+def profile_startup(started: float) -> int:
+    """输出从包导入到可以响应 initialize 的各阶段耗时，返回进程退出码
+
+    started 为包开始导入时的 perf_counter，解释器自身的启动时间不计入；
+    cli 阶段包括 dotenv、日志初始化和命令行参数解析。
+    """
+    stages: List[Tuple[str, float]] = [("cli", _elapsed_ms(started))]
+    for label, module in STARTUP_STAGES:
+        start = time.perf_counter()
+        importlib.import_module(module)
+        stages.append((label, _elapsed_ms(start)))
+
+    from .server import server, build_tools
+
+    start = time.perf_counter()
+    build_tools()
+    server.create_initialization_options()
+    stages.append(("tool schemas", _elapsed_ms(start)))
+    total = _elapsed_ms(started)
+    eager = [module for module in DEFERRED_MODULES if module in sys.modules]
+
+    start = time.perf_counter()
+    for module in DEFERRED_MODULES:
+        importlib.import_module(module)
+    deferred = _elapsed_ms(start)
+
+    lines = ["Startup profile (ms):"]
+    lines.extend(f"  {label:<14}{elapsed:>9.1f}" for label, elapsed in stages)
+    lines.append(f"  {'total':<14}{total:>9.1f}  (ready for initialize)")
+    lines.append(f"  {'deferred':<14}{deferred:>9.1f}  ({', '.join(DEFERRED_MODULES)}, paid on the first upstream call)")
+    if eager:
+        lines.append(f"  warning: imported during startup: {', '.join(eager)}")
+    exceeded = STARTUP_BUDGET_MS > 0 and total > STARTUP_BUDGET_MS
+    if STARTUP_BUDGET_MS > 0:
+        lines.append(f"  budget {STARTUP_BUDGET_MS:.0f}ms: {'exceeded' if exceeded else 'ok'}")
+    print("\n".join(lines), file=sys.stderr)
+    return 1 if exceeded else 0
@@ -0,0 +1,155 @@
+import os
+import json
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from .circuit import CircuitBreaker
+from .latency import latency_tracker, latency_key
+from .schemas import REGION_CONFIGS
+
+# 自定义预设和备用地区：JSON 文件路径，或直接写在环境变量中的 JSON
+REGION_CONFIG_FILE = os.getenv("SERPER_REGION_CONFIG", "").strip()
+REGION_PRESETS_JSON = os.getenv("SERPER_REGION_PRESETS", "").strip()
+REGION_FALLBACKS_JSON = os.getenv("SERPER_REGION_FALLBACKS", "").strip()
+# 地区连续失败多少次后熔断，以及熔断持续的秒数
+REGION_FAILURE_THRESHOLD = int(os.getenv("SERPER_REGION_FAILURE_THRESHOLD", "3"))
+REGION_COOLDOWN = float(os.getenv("SERPER_REGION_COOLDOWN", "60"))
+
+logger = logging.getLogger(__name__)
+
+region_circuit = CircuitBreaker(REGION_FAILURE_THRESHOLD, REGION_COOLDOWN)
+
+
+@dataclass
+class RegionPlan:
+    """一次多地区搜索的调度结果"""
+
+    # 实际要搜索的地区，保持请求中的顺序，熔断的地区已替换为备用地区
+    regions: List[Dict[str, str]]
+    # 按历史延迟从慢到快排列的发起顺序
+    launch_order: List[Dict[str, str]]
+    # 熔断且没有可用备用地区而跳过的地区
+    skipped: List[Dict[str, str]] = field(default_factory=list)
+    # 原地区 -> 替换它的备用地区
+    fallbacks: Dict[str, str] = field(default_factory=dict)
+
+
+def _parse_regions(value: Any) -> List[Dict[str, str]]:
+    if not isinstance(value, list):
+        raise ValueError("a preset must be a list of {gl, hl} objects")
+    regions = []
+    for item in value:
+        if not isinstance(item, dict) or not item.get("gl") or not item.get("hl"):
+            raise ValueError(f"invalid region {item!r}, expected {{\"gl\": ..., \"hl\": ...}}")
+        regions.append({"gl": str(item["gl"]), "hl": str(item["hl"])})
+    return regions
+
+
+class RegionConfig:
+    """内置预设加上配置文件和环境变量中的自定义预设；配置文件修改后下次使用时重新加载"""
+
+    def __init__(self, path: str, presets_json: str, fallbacks_json: str):
+        self.path = path
+        self._mtime: Optional[float] = None
+        self._env_presets: Dict[str, List[Dict[str, str]]] = {}
+        self._env_fallbacks: Dict[str, Dict[str, str]] = {}
+        self._file_presets: Dict[str, List[Dict[str, str]]] = {}
+        self._file_fallbacks: Dict[str, Dict[str, str]] = {}
+        try:
+            if presets_json:
+                self._env_presets = {name: _parse_regions(value) for name, value in json.loads(presets_json).items()}
+            if fallbacks_json:
+                self._env_fallbacks = self._parse_fallbacks(json.loads(fallbacks_json))
+        except (ValueError, AttributeError) as e:
+            logger.error("地区配置环境变量无效，已忽略：%s", e)
+
+    @staticmethod
+    def _parse_fallbacks(value: Any) -> Dict[str, Dict[str, str]]:
+        if not isinstance(value, dict):
+            raise ValueError("fallbacks must map a region code to a {gl, hl} object")
+        return {gl: _parse_regions([fallback])[0] for gl, fallback in value.items()}
+
+    def _reload(self) -> None:
+        if not self.path:
+            return
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError as e:
+            # 文件不存在时只在第一次提示，之前加载的配置继续有效
+            if self._mtime != -1:
+                logger.warning("读取地区配置文件失败：%s，原因：%s", self.path, e)
+            self._mtime = -1
+            return
+        if mtime == self._mtime:
+            return
+        self._mtime = mtime
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+            presets = {name: _parse_regions(value) for name, value in data.get("presets", {}).items()}
+            fallbacks = self._parse_fallbacks(data.get("fallbacks", {}))
+        except (OSError, ValueError, AttributeError) as e:
+            # 保留上一次成功加载的配置
+            logger.error("地区配置文件无效：%s，原因：%s", self.path, e)
+            return
+        self._file_presets = presets
+        self._file_fallbacks = fallbacks
+        logger.info("已加载地区配置文件：%s，自定义预设：%d，备用地区：%d", self.path, len(presets), len(fallbacks))
+
+    def presets(self) -> Dict[str, List[Dict[str, str]]]:
+        self._reload()
+        return {**REGION_CONFIGS, **self._env_presets, **self._file_presets}
+
+    def fallbacks(self) -> Dict[str, Dict[str, str]]:
+        self._reload()
+        return {**self._env_fallbacks, **self._file_fallbacks}
+
+
+region_config = RegionConfig(REGION_CONFIG_FILE, REGION_PRESETS_JSON, REGION_FALLBACKS_JSON)
+
+
+def resolve_regions(preset: Optional[str], regions: Optional[List[Any]]) -> Tuple[List[Dict[str, str]], Optional[str]]:
+    """返回 (地区列表, 错误信息)；请求中直接给出的地区优先于预设"""
+    if regions:
+        resolved: List[Dict[str, str]] = []
+        for region in regions:
+            item = region if isinstance(region, dict) else region.model_dump()
+            if all(item["gl"] != existing["gl"] for existing in resolved):
+                resolved.append({"gl": item["gl"], "hl": item["hl"]})
+        return resolved, None
+    if not preset:
+        return [], "Either preset or regions is required"
+    presets = region_config.presets()
+    if preset not in presets:
+        return [], f"Unknown preset: {preset}"
+    return list(presets[preset]), None
+
+
+def plan_regions(regions: List[Dict[str, str]], allow_fallback: bool) -> RegionPlan:
+    """跳过熔断中的地区或换成备用地区，并让历史上最慢的地区最先发起"""
+    fallbacks = region_config.fallbacks() if allow_fallback else {}
+    used = {region["gl"] for region in regions}
+    plan = RegionPlan(regions=[], launch_order=[])
+    for region in regions:
+        gl = region["gl"]
+        if region_circuit.allow(gl):
+            plan.regions.append(region)
+            continue
+        fallback = fallbacks.get(gl)
+        if fallback is not None and fallback["gl"] not in used and region_circuit.allow(fallback["gl"]):
+            logger.warning("地区 %s 处于熔断状态，改用备用地区 %s", gl, fallback["gl"])
+            used.add(fallback["gl"])
+            plan.regions.append(fallback)
+            plan.fallbacks[gl] = fallback["gl"]
+            continue
+        logger.warning("地区 %s 处于熔断状态，本次跳过", gl)
+        plan.skipped.append(region)
+
+    def expected_latency(region: Dict[str, str]) -> float:
+        # 没有历史数据的地区视为最慢，最先发起
+        mean = latency_tracker.mean(latency_key("search", region["gl"]))
+        return float("inf") if mean is None else mean
+
+    plan.launch_order = sorted(plan.regions, key=expected_latency, reverse=True)
+    return plan
@@ -0,0 +1,109 @@
+import os
+import time
+import random
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional, TypeVar
+from .keys import key_pool, is_key_rejection
+from .limiter import QueueTimeout, parse_retry_after, request_deadline
+
+RETRY_MAX_ATTEMPTS = int(os.getenv("SERPER_RETRY_MAX_ATTEMPTS", "3"))
+RETRY_BASE_DELAY = float(os.getenv("SERPER_RETRY_BASE_DELAY", "0.2"))
+RETRY_MAX_DELAY = float(os.getenv("SERPER_RETRY_MAX_DELAY", "3"))
+ATTEMPT_TIMEOUT = float(os.getenv("SERPER_ATTEMPT_TIMEOUT", "10"))
+RETRY_STATUSES = frozenset(
+    int(status) for status in os.getenv("SERPER_RETRY_STATUSES", "408,425,429,500,502,503,504").split(",") if status.strip()
+)
+# 剩余时间不足以完成一次有意义的尝试时不再重试
+MIN_ATTEMPT_TIME = 0.5
+
+T = TypeVar("T")
+
+logger = logging.getLogger(__name__)
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """按状态码和异常类型判断是否值得重试"""
+    import aiohttp
+
+    if isinstance(exc, aiohttp.ClientResponseError):
+        return exc.status in RETRY_STATUSES
+    return isinstance(exc, (asyncio.TimeoutError, aiohttp.ClientConnectionError, aiohttp.ClientPayloadError))
+
+
+def _describe(exc: BaseException) -> str:
+    import aiohttp
+
+    if isinstance(exc, aiohttp.ClientResponseError):
+        return f"HTTP {exc.status}"
+    return type(exc).__name__
+
+
+async def with_retries(
+    attempt: Callable[[float], Awaitable[T]],
+    total_timeout: float,
+    label: str,
+    trace: Optional[Dict[str, Any]] = None,
+) -> T:
+    """在总期限内按退避策略重试幂等请求
+
+    attempt 接收本次尝试的超时时间；每次尝试的超时不超过 ATTEMPT_TIMEOUT，
+    且所有尝试加上等待时间不超过 total_timeout。截止时间通过 request_deadline 传给限流器，
+    排队等待并发名额和令牌的时间也计入总期限。退避使用 decorrelated jitter。
+    trace 中的 attempts 字段记录实际尝试次数。
+    """
+    deadline = time.monotonic() + total_timeout
+    token = request_deadline.set(deadline)
+    try:
+        return await _attempts(attempt, deadline, label, trace)
+    finally:
+        request_deadline.reset(token)
+
+
+async def _attempts(
+    attempt: Callable[[float], Awaitable[T]],
+    deadline: float,
+    label: str,
+    trace: Optional[Dict[str, Any]],
+) -> T:
+    import aiohttp
+
+    delay = RETRY_BASE_DELAY
+    number = 0
+    switched_key = False
+    while True:
+        number += 1
+        if trace is not None:
+            trace["attempts"] = number
+        remaining = deadline - time.monotonic()
+        try:
+            return await attempt(max(min(ATTEMPT_TIMEOUT, remaining), MIN_ATTEMPT_TIME))
+        except QueueTimeout:
+            # 在本地排队时已用完总期限，没有时间再重试
+            logger.warning("请求 %s 排队等待上游名额时已达总超时", label)
+            raise
+        except Exception as e:
+            # key 被拒绝（403 或额度用完）时，该 key 已进入冷却，立即换用其他 key 重试一次
+            if not switched_key and is_key_rejection(e) and key_pool.can_switch() and deadline - time.monotonic() > MIN_ATTEMPT_TIME:
+                switched_key = True
+                logger.warning("请求 %s 的 API key 被拒绝：%s，换用其他 key 重试", label, _describe(e))
+                continue
+            if number >= RETRY_MAX_ATTEMPTS or not is_retryable(e):
+                raise
+            delay = min(RETRY_MAX_DELAY, random.uniform(RETRY_BASE_DELAY, delay * 3))
+            # 还有未冷却的 API key 时换用其他 key 重试，无需等待 Retry-After
+            if isinstance(e, aiohttp.ClientResponseError) and e.headers and not key_pool.can_switch():
+                retry_after = parse_retry_after(e.headers.get("Retry-After"))
+                if retry_after is not None:
+                    delay = max(delay, retry_after)
+            if time.monotonic() + delay + MIN_ATTEMPT_TIME > deadline:
+                logger.warning("请求 %s 已达总超时，放弃重试，原因：%s", label, _describe(e))
+                raise
+            logger.warning(
+                "请求 %s 第 %d 次尝试失败：%s，%.0fms 后重试",
+                label,
+                number,
+                _describe(e),
+                delay * 1000,
+            )
+            await asyncio.sleep(delay)
@@ -0,0 +1,120 @@
+from dataclasses import dataclass, field
+from typing import Any, Dict, FrozenSet, Tuple, Type
+
+from pydantic import BaseModel
+
+from .enums import SerperTools
+from .schemas import (
+    SearchRequest,
+    MapsRequest,
+    ReviewsRequest,
+    ShoppingRequest,
+    LensRequest,
+    AutocorrectRequest,
+    PatentsRequest,
+    MultiRegionSearchRequest,
+    AutoSearchRequest,
+)
+
+
+@dataclass(frozen=True)
+class Route:
+    """一个工具或意图的路由：目标工具、上游接口名、请求模型，以及自动路由时的参数投影"""
+
+    tool: SerperTools
+    endpoint: str
+    model: Type[BaseModel]
+    # (目标字段, AutoSearchRequest 字段)，自动路由时按此从已校验的请求中取值
+    projection: Tuple[Tuple[str, str], ...] = ()
+    # 自动路由时固定传入的参数
+    defaults: Dict[str, Any] = field(default_factory=dict)
+
+
+google_request_map: Dict[SerperTools, Type[BaseModel]] = {
+    SerperTools.GOOGLE_SEARCH: SearchRequest,
+    SerperTools.GOOGLE_SEARCH_IMAGES: SearchRequest,
+    SerperTools.GOOGLE_SEARCH_VIDEOS: SearchRequest,
+    SerperTools.GOOGLE_SEARCH_PLACES: AutocorrectRequest,
+    SerperTools.GOOGLE_SEARCH_MAPS: MapsRequest,
+    SerperTools.GOOGLE_SEARCH_REVIEWS: ReviewsRequest,
+    SerperTools.GOOGLE_SEARCH_NEWS: SearchRequest,
+    SerperTools.GOOGLE_SEARCH_SHOPPING: ShoppingRequest,
+    SerperTools.GOOGLE_SEARCH_LENS: LensRequest,
+    SerperTools.GOOGLE_SEARCH_SCHOLAR: AutocorrectRequest,
+    SerperTools.GOOGLE_SEARCH_PATENTS: PatentsRequest,
+    SerperTools.GOOGLE_SEARCH_AUTOCOMPLETE: AutocorrectRequest,
+}
+
+# 意图 -> (目标工具, 固定参数)；general 和 news 强制使用中美双地区搜索
+INTENT_TO_TOOL_MAP: Dict[str, Tuple[SerperTools, Dict[str, Any]]] = {
+    "general": (SerperTools.GOOGLE_SEARCH_MULTI_REGION, {"preset": "us_cn_dual"}),
+    "images": (SerperTools.GOOGLE_SEARCH_IMAGES, {}),
+    "videos": (SerperTools.GOOGLE_SEARCH_VIDEOS, {}),
+    "news": (SerperTools.GOOGLE_SEARCH_MULTI_REGION, {"preset": "us_cn_dual"}),
+    "maps": (SerperTools.GOOGLE_SEARCH_MAPS, {}),
+    "places": (SerperTools.GOOGLE_SEARCH_PLACES, {"autocorrect": "true"}),
+    "shopping": (SerperTools.GOOGLE_SEARCH_SHOPPING, {}),
+    "scholar": (SerperTools.GOOGLE_SEARCH_SCHOLAR, {"autocorrect": "true"}),
+    "patents": (SerperTools.GOOGLE_SEARCH_PATENTS, {}),
+    "reviews": (SerperTools.GOOGLE_SEARCH_REVIEWS, {}),
+    "lens": (SerperTools.GOOGLE_SEARCH_LENS, {}),
+    "autocomplete": (SerperTools.GOOGLE_SEARCH_AUTOCOMPLETE, {"autocorrect": "true"}),
+    "multi_region": (SerperTools.GOOGLE_SEARCH_MULTI_REGION, {"preset": "global"}),
+}
+
+# 目标模型中没有 q 的接口，查询内容放进对应字段：lens 的图片地址、reviews 的地点 FID
+_QUERY_ALIASES: Dict[Type[BaseModel], str] = {
+    LensRequest: "url",
+    ReviewsRequest: "fid",
+}
+
+# 这些字段只在 google_search_auto 内部使用，不转发给目标工具
+_AUTO_ONLY_FIELDS: FrozenSet[str] = frozenset({"intent", "format"})
+
+
+def _endpoint(tool: SerperTools) -> str:
+    return tool.value.split("_")[-1]
+
+
+def _compile(tool: SerperTools, defaults: Dict[str, Any]) -> Route:
+    model = MultiRegionSearchRequest if tool == SerperTools.GOOGLE_SEARCH_MULTI_REGION else google_request_map[tool]
+    source_fields = AutoSearchRequest.model_fields
+    target_fields = model.model_fields
+    projection = []
+    for name in target_fields:
+        if name in defaults:
+            continue
+        source_name = "q" if _QUERY_ALIASES.get(model) == name else name
+        source = source_fields.get(source_name)
+        if source is None or source_name in _AUTO_ONLY_FIELDS:
+            continue
+        projection.append((name, source_name))
+    # 目标模型的必填字段必须都能从自动路由请求中得到
+    projected = {name for name, _ in projection} | set(defaults)
+    missing = [name for name, target in target_fields.items() if target.is_required() and name not in projected]
+    if missing:
+        raise RuntimeError(f"route for {tool.value} cannot fill required fields {missing}")
+    return Route(tool, _endpoint(tool), model, tuple(projection), dict(defaults))
+
+
+# 导入时编译的路由表
+AUTO_ROUTES: Dict[str, Route] = {intent: _compile(tool, defaults) for intent, (tool, defaults) in INTENT_TO_TOOL_MAP.items()}
+TOOL_ROUTES: Dict[str, Route] = {tool.value: Route(tool, _endpoint(tool), model) for tool, model in google_request_map.items()}
+
+
+def route_auto(auto_request: AutoSearchRequest) -> Tuple[Route, BaseModel]:
+    """把已校验的自动路由请求按路由表投影为目标工具的请求
+
+    目标模型的校验在 pydantic-core 中完成，比 model_construct 逐字段填充默认值更快，
+    投影后只校验实际传入的少量字段。
+    """
+    route = AUTO_ROUTES.get(auto_request.intent)
+    if route is None:
+        raise ValueError(f"Intent {auto_request.intent} not supported")
+    values = auto_request.__dict__
+    args = dict(route.defaults)
+    for name, source in route.projection:
+        value = values[source]
+        if value is not None:
+            args[name] = value
+    return route, route.model.model_validate(args)
@@ -160,12 +160,85 @@ class WebpageRequest(BaseModel):
     )
 
 
+class WebpageBatchRequest(BaseModel):
+    urls: list[str] = Field(
+        ...,
+        min_length=1,
+        max_length=50,
+        description="The urls to scrape, e.g. the top result links of a search; duplicates are scraped once",
+    )
+    includeMarkdown: Optional[str] = Field(
+        "false",
+        pattern=r"^(true|false)$",
+        description="Include markdown in each response (boolean value as string: 'true' or 'false')",
+    )
+    timeout: Optional[str] = Field(
+        None,
+        pattern=r"^\d+(\.\d+)?$",
+        description="Timeout in seconds for each url; slower pages are returned with status timeout (number value as string)",
+    )
+
+
+class SearchScrapeRequest(SearchRequest):
+    top: str = Field(
+        "5",
+        pattern=r"^([1-9]|1\d|20)$",
+        description="The number of top organic results to scrape, max is 20 (integer value as string)",
+    )
+    pages: str = Field(
+        "1",
+        pattern=r"^[1-3]$",
+        description="Search result pages fetched one after another until enough distinct links are found, max is 3 (integer value as string)",
+    )
+    per_domain: str = Field(
+        "1",
+        pattern=r"^\d+$",
+        description="Maximum documents taken from one domain, 0 for no limit (integer value as string)",
+    )
+    includeMarkdown: Optional[str] = Field(
+        "false",
+        pattern=r"^(true|false)$",
+        description="Return markdown instead of plain text for each page (boolean value as string: 'true' or 'false')",
+    )
+    timeout: Optional[str] = Field(
+        None,
+        pattern=r"^\d+(\.\d+)?$",
+        description="Timeout in seconds for each page scrape (number value as string)",
+    )
+    max_bytes: Optional[str] = Field(
+        None,
+        pattern=r"^[1-9]\d*$",
+        description="Total size budget for the page contents; longer pages are truncated (integer value as string)",
+    )
+    format: Optional[str] = Field(
+        None,
+        pattern=r"^(full|compact|minimal)$",
+        description="Response format: full (indented raw response), compact (no whitespace, noisy fields removed) or minimal (only key fields of each result)",
+    )
+
+
+class Region(BaseModel):
+    gl: str = Field(..., description="The country to search in, e.g. us, uk, ca, au, etc.")
+    hl: str = Field(..., description="The language to search in, e.g. en, es, fr, de, etc.")
+
+
 class MultiRegionSearchRequest(BaseModel):
     q: str = Field(..., description="The query to search for (used as default for regions without translations)")
-    preset: str = Field(
-        ...,
-        pattern=r"^(asia|europe|americas|global|us_cn_dual)$",
-        description="Preset region group: asia, europe, americas, global, or us_cn_dual",
+    preset: Optional[str] = Field(
+        None,
+        pattern=r"^[A-Za-z0-9_-]+$",
+        description="Preset region group: asia, europe, americas, global, us_cn_dual, or a custom preset configured on the server",
+    )
+    regions: Optional[list[Region]] = Field(
+        None,
+        min_length=1,
+        max_length=20,
+        description="Regions to search instead of a preset, e.g. [{'gl': 'se', 'hl': 'sv'}, {'gl': 'no', 'hl': 'no'}]",
+    )
+    fallback: Optional[str] = Field(
+        "false",
+        pattern=r"^(true|false)$",
+        description="Replace regions that keep failing with their configured fallback region (boolean value as string: 'true' or 'false')",
     )
     translations: dict[str, str] = Field(
         ...,
@@ -179,10 +252,38 @@ class MultiRegionSearchRequest(BaseModel):
     tbs: Optional[str] = Field(
         None, description="The time period to search in, e.g. d, w, m, y"
     )
+    deadline: Optional[str] = Field(
+        None,
+        pattern=r"^\d+(\.\d+)?$",
+        description="Overall deadline in seconds; regions still pending are returned as timed_out (number value as string)",
+    )
+    merge: Optional[str] = Field(
+        "false",
+        pattern=r"^(true|false)$",
+        description="Merge the regions into one deduplicated list ranked by reciprocal rank fusion, recording the regions each result appeared in (boolean value as string: 'true' or 'false')",
+    )
+    region_weights: Optional[dict[str, float]] = Field(
+        None,
+        description="Weight of each region code when merging, e.g. {'us': 1.5, 'cn': 1.0}; regions not listed weigh 1",
+    )
+
+
+class BatchSearchRequest(BaseModel):
+    queries: list[SearchRequest] = Field(
+        ...,
+        min_length=1,
+        max_length=100,
+        description="The searches to run, each with the same parameters as a single Google search (q, gl, hl, location, page, num, tbs)",
+    )
+    format: Optional[str] = Field(
+        None,
+        pattern=r"^(full|compact|minimal)$",
+        description="Response format: full (indented raw response), compact (no whitespace, noisy fields removed) or minimal (only key fields of each result)",
+    )
 
 
 class AutoSearchRequest(BaseModel):
-    q: str = Field(..., description="The query to search for")
+    q: str = Field(..., description="The query to search for; the image url for the lens intent, the place FID for the reviews intent")
     intent: str = Field(
         "general",
         pattern=r"^(general|images|videos|news|maps|places|shopping|scholar|patents|reviews|lens|autocomplete|multi_region)$",
@@ -210,6 +311,21 @@ class AutoSearchRequest(BaseModel):
     tbs: Optional[str] = Field(
         None, description="The time period to search in, e.g. d, w, m, y"
     )
+    format: Optional[str] = Field(
+        None,
+        pattern=r"^(full|compact|minimal)$",
+        description="Response format: full (indented raw response), compact (no whitespace, noisy fields removed) or minimal (only key fields of each result)",
+    )
+    deadline: Optional[str] = Field(
+        None,
+        pattern=r"^\d+(\.\d+)?$",
+        description="Overall deadline in seconds for multi-region searches; regions still pending are returned as timed_out (number value as string)",
+    )
+    merge: Optional[str] = Field(
+        None,
+        pattern=r"^(true|false)$",
+        description="For multi-region searches, merge the regions into one deduplicated ranked list (boolean value as string: 'true' or 'false')",
+    )
     translations: dict[str, str] = Field(
         ...,
         description="Required translations mapping language code to translated query for multi-region searches, e.g. {'zh-CN': '7年Java高级开发工程师平均薪资', 'en': '7 years Java senior developer average salary', 'de': '7 Jahre Java Senior-Entwickler Durchschnittsgehalt', 'ja': '7年Javaシニア開発者平均給与'}",
@@ -1,67 +1,80 @@
-from typing import Any, List, Sequence
-import json
+from typing import Any, Dict, List, Optional, Sequence, Type
+import time
+import asyncio
 import logging
 
-from dotenv import load_dotenv
 from mcp.server import Server
 from mcp.server.stdio import stdio_server
 from mcp.types import Tool, TextContent, ImageContent, EmbeddedResource
+from pydantic import BaseModel
 
-load_dotenv()
-
-from .core import google, scape, google_multi_region, SERPER_API_KEY
+from .broker import broker_client
+from .cache import disk_cache
+from .circuit import CircuitOpenError
+from .client import HTTP_WARMUP, warm_up, close_session
+from .core import google, scape, scrape_batch, google_multi_region, google_batch, cancel_background, RegionCallback
+from .keys import key_pool
+from .limiter import current_tool, QueueTimeout
+from .logs import start_request, debug_enabled, summarize_payload
 from .enums import SerperTools
+from .metrics import (
+    METRICS_FILE,
+    span,
+    tool_calls,
+    tool_duration,
+    tool_response_bytes,
+    setup_tracing,
+    shutdown_tracing,
+    metrics_file_loop,
+    write_metrics_file,
+)
+from .pipeline import search_and_scrape
+from .prefetch import prefetcher
+from .router import TOOL_ROUTES, route_auto
+from .shaping import render
 from .schemas import (
-    SearchRequest,
-    MapsRequest,
-    ReviewsRequest,
-    ShoppingRequest,
-    LensRequest,
-    AutocorrectRequest,
-    PatentsRequest,
     WebpageRequest,
+    WebpageBatchRequest,
     MultiRegionSearchRequest,
+    BatchSearchRequest,
+    SearchScrapeRequest,
     AutoSearchRequest,
 )
 
 server = Server("Serper")
 logger = logging.getLogger(__name__)
 
-google_request_map = {
-    SerperTools.GOOGLE_SEARCH: SearchRequest,
-    SerperTools.GOOGLE_SEARCH_IMAGES: SearchRequest,
-    SerperTools.GOOGLE_SEARCH_VIDEOS: SearchRequest,
-    SerperTools.GOOGLE_SEARCH_PLACES: AutocorrectRequest,
-    SerperTools.GOOGLE_SEARCH_MAPS: MapsRequest,
-    SerperTools.GOOGLE_SEARCH_REVIEWS: ReviewsRequest,
-    SerperTools.GOOGLE_SEARCH_NEWS: SearchRequest,
-    SerperTools.GOOGLE_SEARCH_SHOPPING: ShoppingRequest,
-    SerperTools.GOOGLE_SEARCH_LENS: LensRequest,
-    SerperTools.GOOGLE_SEARCH_SCHOLAR: AutocorrectRequest,
-    SerperTools.GOOGLE_SEARCH_PATENTS: PatentsRequest,
-    SerperTools.GOOGLE_SEARCH_AUTOCOMPLETE: AutocorrectRequest,
-}
-
-# 意图到工具的映射关系
-INTENT_TO_TOOL_MAP = {
-    "general": SerperTools.GOOGLE_SEARCH_MULTI_REGION,  # 强制使用多地区搜索
-    "images": SerperTools.GOOGLE_SEARCH_IMAGES,
-    "videos": SerperTools.GOOGLE_SEARCH_VIDEOS,
-    "news": SerperTools.GOOGLE_SEARCH_MULTI_REGION,  # 强制使用多地区搜索
-    "maps": SerperTools.GOOGLE_SEARCH_MAPS,
-    "places": SerperTools.GOOGLE_SEARCH_PLACES,
-    "shopping": SerperTools.GOOGLE_SEARCH_SHOPPING,
-    "scholar": SerperTools.GOOGLE_SEARCH_SCHOLAR,
-    "patents": SerperTools.GOOGLE_SEARCH_PATENTS,
-    "reviews": SerperTools.GOOGLE_SEARCH_REVIEWS,
-    "lens": SerperTools.GOOGLE_SEARCH_LENS,
-    "autocomplete": SerperTools.GOOGLE_SEARCH_AUTOCOMPLETE,
-    "multi_region": SerperTools.GOOGLE_SEARCH_MULTI_REGION,
-}
 
+def _region_progress_callback() -> Optional[RegionCallback]:
+    """客户端在请求中携带 progressToken 时，逐个地区推送进度和部分结果"""
+    try:
+        ctx = server.request_context
+    except LookupError:
+        return None
+    token = ctx.meta.progressToken if ctx.meta else None
+    if token is None:
+        return None
+
+    async def report(gl: str, result: Dict[str, Any], completed: int, total: int) -> None:
+        await ctx.session.send_progress_notification(token, completed, total)
+        await ctx.session.send_log_message(
+            "info",
+            {"event": "region_result", "gl": gl, "completed": completed, "total": total, "result": result},
+            logger="serper.multi_region",
+        )
+        logger.debug("已推送地区 %s 的部分结果（%d/%d）", gl, completed, total)
 
-@server.list_tools()
-async def list_tools() -> List[Tool]:
+    return report
+
+
+_tools: Optional[List[Tool]] = None
+
+
+def build_tools() -> List[Tool]:
+    """生成工具列表，JSON schema 在进程内只生成一次"""
+    global _tools
+    if _tools is not None:
+        return _tools
     logger.debug("开始生成工具列表")
     tools = []
 
@@ -72,6 +85,18 @@ async def list_tools() -> List[Tool]:
         inputSchema=AutoSearchRequest.model_json_schema(),
     ))
 
+    tools.append(Tool(
+        name=SerperTools.GOOGLE_SEARCH_BATCH,
+        description="Run many Google web searches in one call. Use this instead of repeated google_search_auto calls when you need several related queries, e.g. comparisons or fact checks. Results are returned per query in input order, with per-query errors.",
+        inputSchema=BatchSearchRequest.model_json_schema(),
+    ))
+
+    tools.append(Tool(
+        name=SerperTools.GOOGLE_SEARCH_AND_SCRAPE,
+        description="Search Google and scrape the top organic results in one call. Use this instead of a search followed by several webpage_scrape calls. Returns the page contents in rank order, at most one page per domain by default, truncated to fit a total size budget.",
+        inputSchema=SearchScrapeRequest.model_json_schema(),
+    ))
+
     # 保留网页抓取工具，因为它不是搜索功能
     tools.append(Tool(
         name=SerperTools.WEBPAGE_SCRAPE,
@@ -79,112 +104,170 @@ async def list_tools() -> List[Tool]:
         inputSchema=WebpageRequest.model_json_schema(),
     ))
 
+    tools.append(Tool(
+        name=SerperTools.WEBPAGE_SCRAPE_BATCH,
+        description="Scrape several webpages in one call, e.g. the top links of a search. Pages are fetched concurrently, each with its own timeout. Results are returned per url in input order, with a status of ok, error or timeout.",
+        inputSchema=WebpageBatchRequest.model_json_schema(),
+    ))
+
     logger.debug("工具列表生成完成，数量：%d", len(tools))
+    _tools = tools
     return tools
 
+
+@server.list_tools()
+async def list_tools() -> List[Tool]:
+    return list(build_tools())
+
+
 @server.call_tool()
 async def call_tool(name: str, arguments: dict[str, Any]) -> Sequence[TextContent | ImageContent | EmbeddedResource]:
-    logger.debug("开始调用工具：%s", name)
-    logger.debug("工具参数：%s", arguments)
-    if not SERPER_API_KEY:
+    start_request()
+    if debug_enabled(logger):
+        logger.debug("开始调用工具：%s，参数：%s", name, summarize_payload(arguments))
+    if not key_pool:
         logger.warning("SERPER_API_KEY 为空，拒绝处理请求")
         return [TextContent(text=f"SERPER_API_KEY is empty!", type="text")]
 
-    try:
-        if name == SerperTools.GOOGLE_SEARCH_AUTO.value:
-            logger.debug("识别为自动路由搜索工具")
-            auto_request = AutoSearchRequest(**arguments)
-
-            # 根据意图映射到具体工具
-            target_tool = INTENT_TO_TOOL_MAP.get(auto_request.intent)
-            if not target_tool:
-                logger.warning("未找到对应的意图工具：%s", auto_request.intent)
-                raise ValueError(f"Intent {auto_request.intent} not supported")
-
-            logger.debug("路由到工具：%s", target_tool.value)
-
-            # 处理特殊工具的参数转换
-            if target_tool == SerperTools.GOOGLE_SEARCH_MULTI_REGION:
-                # 多地区搜索需要特殊处理
-                # 为 general 和 news intent 使用中美双地区预设
-                if auto_request.intent in ["general", "news"]:
-                    preset = "us_cn_dual"
-                else:
-                    preset = "global"  # 其他情况使用全球预设
-
-                multi_region_args = {
-                    "q": auto_request.q,
-                    "preset": preset,
-                    "num": auto_request.num,
-                    "translations": auto_request.translations,  # 现在是必需参数
-                }
-                if auto_request.tbs:
-                    multi_region_args["tbs"] = auto_request.tbs
-
-                request = MultiRegionSearchRequest(**multi_region_args)
-                result = await google_multi_region(request)
-                logger.debug("多地区搜索路由完成，使用预设：%s", preset)
-                return [TextContent(text=json.dumps(result, indent=2), type="text")]
-
-            # 构建目标工具的请求参数
-            target_request_class = google_request_map[target_tool]
-            target_args = {"q": auto_request.q}
-
-            # 根据目标工具类型添加相应参数
-            if hasattr(target_request_class.model_fields, 'gl') and auto_request.gl:
-                target_args["gl"] = auto_request.gl
-            if hasattr(target_request_class.model_fields, 'hl') and auto_request.hl:
-                target_args["hl"] = auto_request.hl
-            if hasattr(target_request_class.model_fields, 'location') and auto_request.location:
-                target_args["location"] = auto_request.location
-            if hasattr(target_request_class.model_fields, 'num') and auto_request.num:
-                target_args["num"] = auto_request.num
-            if hasattr(target_request_class.model_fields, 'page') and auto_request.page:
-                target_args["page"] = auto_request.page
-            if hasattr(target_request_class.model_fields, 'tbs') and auto_request.tbs:
-                target_args["tbs"] = auto_request.tbs
-
-            # 为 AutocorrectRequest 类型添加默认的 autocorrect 参数
-            if target_request_class in [AutocorrectRequest]:
-                target_args["autocorrect"] = "true"
-
-            request = target_request_class(**target_args)
-            logger.debug("准备调用路由后的 Serper 搜索接口：%s", target_tool.value)
-            result = await google(target_tool, request)
-            logger.debug("路由搜索接口返回成功")
-            return [TextContent(text=json.dumps(result, indent=2), type="text")]
-
-        if name == SerperTools.WEBPAGE_SCRAPE.value:
-            logger.debug("识别为网页抓取工具")
-            request = WebpageRequest(**arguments)
-            result = await scape(request)
-            logger.debug("网页抓取完成")
-            return [TextContent(text=json.dumps(result, indent=2), type="text")]
-
-        if name == SerperTools.GOOGLE_SEARCH_MULTI_REGION.value:
-            logger.debug("识别为多地区搜索工具")
-            request = MultiRegionSearchRequest(**arguments)
-            result = await google_multi_region(request)
-            logger.debug("多地区搜索完成")
-            return [TextContent(text=json.dumps(result, indent=2), type="text")]
-
-        if not SerperTools.has_value(name):
-            logger.warning("未找到对应工具：%s", name)
-            raise ValueError(f"Tool {name} not found")
-
-        tool = SerperTools(name)
-        request = google_request_map[tool](**arguments)
-        logger.debug("准备调用 Serper 搜索接口：%s", tool.value)
-        result = await google(tool, request)
-        logger.debug("Serper 搜索接口返回成功")
-        return [TextContent(text=json.dumps(result, indent=2), type="text")]
-    except Exception as e:
-        logger.exception("工具调用失败：%s", name)
-        return [TextContent(text=f"Error: {str(e)}", type="text")]
+    tool = name if SerperTools.has_value(name) else "unknown"
+    current_tool.set(tool)
+    outcome = "ok"
+    start_time = time.perf_counter()
+    with span("call_tool", **{"mcp.tool.name": name}) as current:
+        try:
+            contents = await _dispatch(name, arguments)
+        except Exception as e:
+            outcome = "error"
+            current.set_attribute("error.type", type(e).__name__)
+            if isinstance(e, (CircuitOpenError, QueueTimeout)):
+                logger.warning("工具调用失败：%s，原因：%s", name, e)
+            else:
+                logger.exception("工具调用失败：%s", name)
+            contents = [TextContent(text=f"Error: {str(e)}", type="text")]
+    tool_calls.inc(tool, outcome)
+    tool_duration.observe(time.perf_counter() - start_time, tool)
+    tool_response_bytes.inc(tool, amount=sum(len(content.text.encode("utf-8")) for content in contents))
+    return contents
+
+
+def _validate(model: Type[BaseModel], arguments: Dict[str, Any]) -> Any:
+    with span("validate", **{"serper.model": model.__name__}):
+        return model(**arguments)
+
+
+def _render(result: Dict[str, Any], endpoint: str, response_format: Optional[str] = None) -> List[TextContent]:
+    with span("serialize"):
+        return [TextContent(text=render(result, endpoint, response_format), type="text")]
+
+
+async def _dispatch(name: str, arguments: Dict[str, Any]) -> List[TextContent]:
+    """按工具名校验参数并调用对应接口"""
+    if name == SerperTools.GOOGLE_SEARCH_AUTO.value:
+        logger.debug("识别为自动路由搜索工具")
+        with span("route"):
+            auto_request = _validate(AutoSearchRequest, arguments)
+            route, request = route_auto(auto_request)
+        logger.debug("意图 %s 路由到工具：%s", auto_request.intent, route.tool.value)
+
+        if route.tool == SerperTools.GOOGLE_SEARCH_MULTI_REGION:
+            result = await google_multi_region(request, _region_progress_callback())
+            logger.debug("多地区搜索路由完成，使用预设：%s", request.preset)
+            return _render(result, "search", auto_request.format)
+
+        result = await google(route.tool, request)
+        prefetcher.observe(route, request)
+        logger.debug("路由搜索接口返回成功")
+        return _render(result, route.endpoint, auto_request.format)
+
+    if name == SerperTools.WEBPAGE_SCRAPE.value:
+        logger.debug("识别为网页抓取工具")
+        request = _validate(WebpageRequest, arguments)
+        result = await scape(request)
+        logger.debug("网页抓取完成")
+        return _render(result, "scrape")
+
+    if name == SerperTools.WEBPAGE_SCRAPE_BATCH.value:
+        logger.debug("识别为批量网页抓取工具")
+        request = _validate(WebpageBatchRequest, arguments)
+        result = await scrape_batch(request)
+        logger.debug("批量网页抓取完成")
+        return _render(result, "scrape")
+
+    if name == SerperTools.GOOGLE_SEARCH_MULTI_REGION.value:
+        logger.debug("识别为多地区搜索工具")
+        request = _validate(MultiRegionSearchRequest, arguments)
+        result = await google_multi_region(request, _region_progress_callback())
+        logger.debug("多地区搜索完成")
+        return _render(result, "search")
+
+    if name == SerperTools.GOOGLE_SEARCH_BATCH.value:
+        logger.debug("识别为批量搜索工具")
+        request = _validate(BatchSearchRequest, arguments)
+        result = await google_batch(request)
+        logger.debug("批量搜索完成")
+        return _render(result, "search", request.format)
+
+    if name == SerperTools.GOOGLE_SEARCH_AND_SCRAPE.value:
+        logger.debug("识别为搜索并抓取工具")
+        request = _validate(SearchScrapeRequest, arguments)
+        result = await search_and_scrape(request)
+        logger.debug("搜索并抓取完成")
+        return _render(result, "scrape", request.format)
+
+    route = TOOL_ROUTES.get(name)
+    if route is None:
+        logger.warning("未找到对应工具：%s", name)
+        raise ValueError(f"Tool {name} not found")
+    request = _validate(route.model, arguments)
+    logger.debug("准备调用 Serper 搜索接口：%s", name)
+    result = await google(route.tool, request)
+    prefetcher.observe(route, request)
+    logger.debug("Serper 搜索接口返回成功")
+    return _render(result, route.endpoint)
+
+
+_metrics_task: Optional[asyncio.Task] = None
+
+
+async def startup() -> None:
+    """初始化进程级共享资源，所有传输方式共用"""
+    global _metrics_task
+    setup_tracing()
+    if METRICS_FILE:
+        _metrics_task = asyncio.create_task(metrics_file_loop(METRICS_FILE))
+    if HTTP_WARMUP:
+        await warm_up()
+
+
+async def shutdown() -> None:
+    """释放连接池、协调进程连接和磁盘缓存，并输出最后一次指标
+
+    先取消并等待预取、后台刷新和共享请求等脱离工具调用的任务，再关闭会话。
+    """
+    if _metrics_task is not None:
+        _metrics_task.cancel()
+        await asyncio.gather(_metrics_task, return_exceptions=True)
+        try:
+            write_metrics_file(METRICS_FILE)
+        except OSError as e:
+            logger.warning("写入指标文件失败：%s，原因：%s", METRICS_FILE, e)
+    await prefetcher.aclose()
+    await cancel_background()
+    await close_session()
+    if broker_client is not None:
+        await broker_client.close()
+    if disk_cache is not None:
+        await disk_cache.aclose()
+    shutdown_tracing()
 
 
 async def main():
     logger.info("Serper MCP 服务器启动")
     options = server.create_initialization_options()
-    async with stdio_server() as (read_stream, write_stream):
-        await server.run(read_stream, write_stream, options)
+    await startup()
+    try:
+        async with stdio_server() as (read_stream, write_stream):
+            await server.run(read_stream, write_stream, options)
+    finally:
+        await shutdown()
+        logger.info("Serper MCP 服务器已停止")
@@ -0,0 +1,227 @@
+import os
+import json
+import logging
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+
+try:
+    import orjson
+except ImportError:  # orjson 为可选依赖，未安装时退回标准库
+    orjson = None
+
+RESPONSE_FORMAT = os.getenv("SERPER_RESPONSE_FORMAT", "full").strip().lower()
+RESPONSE_MAX_BYTES = int(os.getenv("SERPER_RESPONSE_MAX_BYTES", "0"))
+
+RESPONSE_FORMATS = ("full", "compact", "minimal")
+
+# compact 与 minimal 格式都会去掉的字段
+COMPACT_DROP_FIELDS = frozenset({
+    "searchParameters",
+    "sitelinks",
+    "thumbnailUrl",
+    "thumbnailWidth",
+    "thumbnailHeight",
+    "imageWidth",
+    "imageHeight",
+    "favicon",
+})
+
+# minimal 格式下结果条目保留的字段：公共字段加各接口特有字段
+_MINIMAL_COMMON_FIELDS = frozenset({
+    "title",
+    "link",
+    "snippet",
+    "date",
+    "position",
+    "source",
+    "question",
+    "query",
+    "value",
+    "regions",
+    "ranks",
+})
+
+MINIMAL_ITEM_FIELDS: Dict[str, FrozenSet[str]] = {
+    name: _MINIMAL_COMMON_FIELDS | frozenset(extra)
+    for name, extra in {
+        "search": (),
+        "news": (),
+        "images": ("imageUrl",),
+        "videos": ("duration", "channel"),
+        "places": ("address", "rating", "ratingCount", "category", "phoneNumber", "website", "cid"),
+        "maps": ("address", "rating", "ratingCount", "type", "phoneNumber", "website", "cid", "latitude", "longitude"),
+        "reviews": ("rating", "isoDate"),
+        "shopping": ("price", "rating", "ratingCount", "delivery"),
+        "lens": ("imageUrl",),
+        "scholar": ("publicationInfo", "year", "citedBy", "pdfUrl"),
+        "patents": ("priorityDate", "publicationDate", "inventor", "assignee", "publicationNumber", "pdfUrl"),
+        "autocomplete": (),
+        "scrape": (),
+    }.items()
+}
+
+# 超出字节预算时最后才删除的列表，其余列表的低排名条目优先删除
+_PRIMARY_LISTS = frozenset({"organic", "merged"})
+# 每个条目对应一个独立查询或页面的列表，整体不参与删除
+_PROTECTED_LISTS = frozenset({"results", "documents"})
+# 列表删光仍超出预算时，可按比例截断的长文本字段
+_TRUNCATABLE_FIELDS = ("markdown", "text")
+
+logger = logging.getLogger(__name__)
+
+
+def encode_compact(value: Any) -> str:
+    """无缩进的紧凑 JSON 编码，安装了 orjson 时使用 orjson"""
+    if orjson is not None:
+        return orjson.dumps(value).decode("utf-8")
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+def _encode(value: Any, response_format: str) -> str:
+    if response_format == "full":
+        return json.dumps(value, indent=2)
+    return encode_compact(value)
+
+
+def _is_blob(value: Any) -> bool:
+    return isinstance(value, str) and value.startswith("data:") and ";base64," in value[:64]
+
+
+def _shape(value: Any, response_format: str, item_fields: Optional[FrozenSet[str]], name: str = "") -> Any:
+    """复制容器并按格式裁剪字段，不修改缓存中共享的原始对象"""
+    if isinstance(value, dict):
+        shaped = {}
+        for key, item in value.items():
+            if response_format != "full" and (key in COMPACT_DROP_FIELDS or _is_blob(item)):
+                continue
+            shaped[key] = _shape(item, response_format, item_fields, key)
+        return shaped
+    if isinstance(value, list):
+        items = [_shape(item, response_format, item_fields) for item in value]
+        if response_format == "minimal" and item_fields is not None and name not in _PROTECTED_LISTS:
+            projected = []
+            for item in items:
+                if isinstance(item, dict):
+                    kept = {key: field for key, field in item.items() if key in item_fields}
+                    item = kept or item
+                projected.append(item)
+            items = projected
+        return items
+    return value
+
+
+def _collect_lists(value: Any, name: str, found: List[Tuple[str, List[Any]]]) -> None:
+    if isinstance(value, dict):
+        for key, item in value.items():
+            _collect_lists(item, key, found)
+    elif isinstance(value, list):
+        if value and name not in _PROTECTED_LISTS and all(isinstance(item, dict) for item in value):
+            found.append((name, value))
+        for item in value:
+            _collect_lists(item, name, found)
+
+
+def _encoded_size(text: str, response_format: str) -> int:
+    """字符串编码进响应后的字节数，包括引号以及 full 格式下 ensure_ascii 产生的转义"""
+    return len(_encode(text, response_format).encode("utf-8"))
+
+
+def _cut(text: str, overflow: int, response_format: str) -> Tuple[str, int]:
+    """按编码后的字节数截短文本，二分查找不超过剩余预算的最长前缀，返回 (新文本, 去掉的字节数)"""
+    size = _encoded_size(text, response_format)
+    target = size - overflow
+    low, high = 0, len(text)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if _encoded_size(text[:middle], response_format) <= target:
+            low = middle
+        else:
+            high = middle - 1
+    return text[:low], size - _encoded_size(text[:low], response_format)
+
+
+def _truncate_text(value: Any, overflow: int, response_format: str) -> int:
+    """从最长的文本字段开始截断，返回编码后实际去掉的字节数"""
+    if not isinstance(value, dict) or overflow <= 0:
+        return 0
+    removed = 0
+    candidates = sorted(
+        (key for key in _TRUNCATABLE_FIELDS if isinstance(value.get(key), str)),
+        key=lambda key: len(value[key]),
+        reverse=True,
+    )
+    for key in candidates:
+        value[key], cut = _cut(value[key], overflow - removed, response_format)
+        removed += cut
+        if removed >= overflow:
+            break
+    for item in value.values():
+        if removed >= overflow:
+            break
+        removed += _truncate_text(item, overflow - removed, response_format)
+    return removed
+
+
+def _fit(result: Dict[str, Any], response_format: str, max_bytes: int) -> str:
+    """删除排名最低的结果条目直到编码后不超过 max_bytes"""
+    text = _encode(result, response_format)
+    size = len(text.encode("utf-8"))
+    if size <= max_bytes:
+        return text
+
+    lists: List[Tuple[str, List[Any]]] = []
+    _collect_lists(result, "", lists)
+    # 按排名从低到高删除：位置越靠后越先删，同一位置时主结果列表最后删
+    candidates = sorted(
+        ((index, name in _PRIMARY_LISTS, items) for name, items in lists for index in range(len(items))),
+        key=lambda candidate: (-candidate[0], candidate[1]),
+    )
+    removed = 0
+    position = 0
+    while size > max_bytes and position < len(candidates):
+        while size > max_bytes and position < len(candidates):
+            items = candidates[position][2]
+            position += 1
+            item = items.pop()
+            size -= len(_encode(item, response_format).encode("utf-8")) + 1
+            removed += 1
+        result["truncated"] = {"removed_results": removed}
+        size = len(_encode(result, response_format).encode("utf-8"))
+
+    text = _encode(result, response_format)
+    if len(text.encode("utf-8")) > max_bytes:
+        # 先写入截断标记再计算超出的字节数，使标记本身也计入预算
+        created = "truncated" not in result
+        result.setdefault("truncated", {})["text"] = True
+        overflow = len(_encode(result, response_format).encode("utf-8")) - max_bytes
+        if _truncate_text(result, overflow, response_format):
+            text = _encode(result, response_format)
+        elif created:
+            del result["truncated"]
+        else:
+            del result["truncated"]["text"]
+    logger.debug("响应超出 %d 字节预算，已删除 %d 条低排名结果，最终 %d 字节", max_bytes, removed, len(text.encode("utf-8")))
+    return text
+
+
+def render(
+    result: Dict[str, Any],
+    endpoint: str,
+    response_format: Optional[str] = None,
+    max_bytes: Optional[int] = None,
+) -> str:
+    """把工具结果编码为返回给模型的文本
+
+    full 保持原有的缩进 JSON；compact 去掉空白和无用字段；minimal 在 compact 的基础上
+    只保留每个结果条目的关键字段。max_bytes 大于 0 时按排名从低到高删除结果以满足预算。
+    """
+    response_format = response_format or RESPONSE_FORMAT
+    if response_format not in RESPONSE_FORMATS:
+        response_format = "full"
+    max_bytes = RESPONSE_MAX_BYTES if max_bytes is None else max_bytes
+    if response_format == "full" and max_bytes <= 0:
+        return json.dumps(result, indent=2)
+
+    shaped = _shape(result, response_format, MINIMAL_ITEM_FIELDS.get(endpoint))
+    if max_bytes > 0:
+        return _fit(shaped, response_format, max_bytes)
+    return _encode(shaped, response_format)
@@ -0,0 +1,68 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """合并相同键的并发调用：同一时刻只执行一次，所有等待者共享同一结果或异常
+
+    共享任务由 asyncio.shield 保护，单个等待者被取消不会取消共享请求；
+    最后一个等待者也离开时取消共享任务，及时归还上游名额，不再为无人等待的结果重试和计费。
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Task] = {}
+        # 共享任务 -> 仍在等待它的调用方数量
+        self._waiters: Dict[asyncio.Task, int] = {}
+        self.leaders = 0
+        self.shared = 0
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._calls
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """返回 (结果, 是否复用了进行中的调用)"""
+        task = self._calls.get(key)
+        coalesced = task is not None
+        if coalesced:
+            self.shared += 1
+            logger.debug("合并进行中的相同请求：%s", key[:12])
+        else:
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            self.leaders += 1
+            task.add_done_callback(lambda t: self._finish(key, t))
+        self._waiters[task] = self._waiters.get(task, 0) + 1
+        try:
+            return await asyncio.shield(task), coalesced
+        finally:
+            self._leave(task)
+
+    async def cancel_all(self) -> None:
+        """取消所有进行中的共享任务并等待它们结束，用于关闭服务"""
+        tasks = list(self._calls.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _leave(self, task: asyncio.Task) -> None:
+        remaining = self._waiters.get(task, 0) - 1
+        if remaining > 0:
+            self._waiters[task] = remaining
+            return
+        self._waiters.pop(task, None)
+        if not task.done():
+            logger.debug("相同请求的等待者都已取消，取消共享请求")
+            task.cancel()
+
+    def _finish(self, key: str, task: asyncio.Task) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # 所有等待者都已取消时，避免出现 "exception was never retrieved" 警告
+        if not task.cancelled():
+            task.exception()
@@ -0,0 +1,149 @@
+import os
+import time
+import logging
+import tempfile
+import contextlib
+import multiprocessing
+from typing import AsyncIterator, List, Tuple
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse, Response
+from starlette.routing import BaseRoute, Mount, Route
+from starlette.types import Receive, Scope, Send
+
+TRANSPORTS = ("stdio", "sse", "streamable-http")
+
+HTTP_TRANSPORT = os.getenv("SERPER_TRANSPORT", "stdio")
+HTTP_HOST = os.getenv("SERPER_HTTP_HOST", "127.0.0.1")
+HTTP_PORT = int(os.getenv("SERPER_HTTP_PORT", "8000"))
+HTTP_WORKERS = int(os.getenv("SERPER_HTTP_WORKERS", "1"))
+# 收到停止信号后等待进行中请求完成的最长秒数
+DRAIN_TIMEOUT = float(os.getenv("SERPER_DRAIN_TIMEOUT", "30"))
+
+logger = logging.getLogger(__name__)
+
+
+def create_app() -> Starlette:
+    """创建 HTTP 传输的 ASGI 应用：sse 挂载在 /sse，streamable-http 挂载在 /mcp，指标在 /metrics
+
+    同一进程内的所有客户端会话运行在一个事件循环中，共享连接池、缓存和限速器。
+    多个工作进程时会话无法跨进程共享，此时 Streamable HTTP 以无状态模式运行。
+    """
+    from . import _configure_logging
+    from .server import server, startup, shutdown
+
+    # uvicorn 启动的工作进程不会经过 main()，需要在这里初始化日志
+    if not logging.getLogger().handlers:
+        _configure_logging()
+
+    transport = os.getenv("SERPER_TRANSPORT", HTTP_TRANSPORT)
+    workers = int(os.getenv("SERPER_HTTP_WORKERS", str(HTTP_WORKERS)))
+    routes: List[BaseRoute] = []
+    session_manager = None
+
+    if transport == "streamable-http":
+        from mcp.server.streamable_http_manager import StreamableHTTPSessionManager
+
+        session_manager = StreamableHTTPSessionManager(app=server, stateless=workers > 1)
+
+        async def handle_streamable_http(scope: Scope, receive: Receive, send: Send) -> None:
+            await session_manager.handle_request(scope, receive, send)
+
+        routes.append(Mount("/mcp", app=handle_streamable_http))
+    else:
+        from mcp.server.sse import SseServerTransport
+
+        sse = SseServerTransport("/messages/")
+
+        async def handle_sse(request: Request) -> Response:
+            async with sse.connect_sse(request.scope, request.receive, request._send) as (read_stream, write_stream):
+                await server.run(read_stream, write_stream, server.create_initialization_options())
+            return Response()
+
+        routes.append(Route("/sse", endpoint=handle_sse, methods=["GET"]))
+        routes.append(Mount("/messages/", app=sse.handle_post_message))
+
+    async def handle_metrics(request: Request) -> Response:
+        from .metrics import registry
+
+        return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+    # 多个工作进程时每次抓取只返回处理该请求的进程的指标
+    routes.append(Route("/metrics", endpoint=handle_metrics, methods=["GET"]))
+
+    @contextlib.asynccontextmanager
+    async def lifespan(app: Starlette) -> AsyncIterator[None]:
+        logger.info("Serper MCP HTTP 服务启动，传输：%s，进程：%d", transport, os.getpid())
+        await startup()
+        try:
+            if session_manager is not None:
+                async with session_manager.run():
+                    yield
+            else:
+                yield
+        finally:
+            await shutdown()
+            logger.info("Serper MCP HTTP 服务已停止，进程：%d", os.getpid())
+
+    return Starlette(routes=routes, lifespan=lifespan)
+
+
+def _start_broker() -> Tuple[multiprocessing.Process, str]:
+    """启动协调进程，返回进程对象和 Unix socket 路径"""
+    from .broker import run_broker
+
+    path = os.path.join(tempfile.mkdtemp(prefix="serper-mcp-"), "broker.sock")
+    process = multiprocessing.get_context("spawn").Process(target=run_broker, args=(path,), name="serper-broker", daemon=True)
+    process.start()
+    deadline = time.monotonic() + 10
+    while not os.path.exists(path):
+        if not process.is_alive() or time.monotonic() > deadline:
+            process.terminate()
+            raise SystemExit("failed to start the shared cache / rate limit broker process")
+        time.sleep(0.05)
+    return process, path
+
+
+def _stop_broker(process: multiprocessing.Process, path: str) -> None:
+    process.terminate()
+    process.join(5)
+    with contextlib.suppress(OSError):
+        os.unlink(path)
+        os.rmdir(os.path.dirname(path))
+    logger.info("协调进程已停止")
+
+
+def run_http(transport: str, host: str, port: int, workers: int) -> None:
+    """使用 uvicorn 启动 HTTP 服务
+
+    workers 大于 1 时 uvicorn 在同一个监听 socket 上启动多个工作进程，
+    并额外启动一个协调进程，让所有工作进程共享响应缓存和上游速率预算。
+    """
+    import uvicorn
+
+    if transport == "sse" and workers > 1:
+        raise SystemExit("SSE sessions cannot be shared between processes; use --workers 1 or --transport streamable-http")
+
+    broker = None
+    if workers > 1:
+        broker = _start_broker()
+        os.environ["SERPER_BROKER_SOCKET"] = broker[1]
+
+    # 工作进程通过环境变量获得命令行参数
+    os.environ["SERPER_TRANSPORT"] = transport
+    os.environ["SERPER_HTTP_WORKERS"] = str(workers)
+    logger.info("监听 http://%s:%d，传输：%s，工作进程数：%d", host, port, transport, workers)
+    try:
+        uvicorn.run(
+            "serper_mcp_server.transport:create_app",
+            factory=True,
+            host=host,
+            port=port,
+            workers=workers,
+            timeout_graceful_shutdown=DRAIN_TIMEOUT,
+            log_config=None,
+        )
+    finally:
+        if broker is not None:
+            _stop_broker(*broker)
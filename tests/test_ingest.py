@@ -0,0 +1,36 @@
+import json
+
+from serper_mcp_server.ingest import FieldFilter
+from serper_mcp_server.shaping import render
+
+BODY = json.dumps(
+    {"text": "héllo wörld — 中文字符测试 😀" * 20, "markdown": "ü" * 50, "title": "x"},
+    ensure_ascii=False,
+).encode("utf-8")
+
+
+def _feed_bytewise(field_filter: FieldFilter, body: bytes) -> bytes:
+    return b"".join(field_filter.feed(body[i:i + 1]) for i in range(len(body)))
+
+
+def test_truncation_is_utf8_safe_when_fed_one_byte_at_a_time():
+    for limit in range(1, 80):
+        data = json.loads(_feed_bytewise(FieldFilter({"text": limit, "markdown": limit}), BODY))
+        assert data["text"].endswith(" [truncated]")
+        assert len(data["text"].removesuffix(" [truncated]").encode("utf-8")) <= limit
+        assert data["title"] == "x"
+
+
+def test_untouched_body_passes_through_one_byte_at_a_time():
+    assert _feed_bytewise(FieldFilter({"other": 5}), BODY) == BODY
+
+
+def test_escaped_surrogate_pair_is_kept_or_dropped_whole():
+    body = b'{"text": "ab\\ud83d\\ude00cd", "title": "x"}'
+    for limit in range(1, 16):
+        for feed in (lambda f: f.feed(body), lambda f: _feed_bytewise(f, body)):
+            output = feed(FieldFilter({"text": limit}))
+            data = json.loads(output)
+            # 不能出现孤立的代理字符
+            assert data["text"].removesuffix(" [truncated]") in ("", "a", "ab", "ab😀", "ab😀c", "ab😀cd")
+            render(data, "scrape", "compact")
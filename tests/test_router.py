@@ -0,0 +1,58 @@
+from serper_mcp_server.enums import SerperTools
+from serper_mcp_server.router import AUTO_ROUTES, route_auto
+from serper_mcp_server.schemas import AutoSearchRequest, LensRequest, ReviewsRequest, SearchRequest
+
+TRANSLATIONS = {"en": "java salary", "zh-CN": "java 薪资"}
+
+
+def _auto(**kwargs):
+    return AutoSearchRequest(translations=TRANSLATIONS, **kwargs)
+
+
+def test_search_fields_are_forwarded():
+    route, request = route_auto(_auto(q="java", intent="videos", gl="de", hl="en", num="20", tbs="qdr:w", page="2"))
+    assert route.tool == SerperTools.GOOGLE_SEARCH_VIDEOS
+    assert isinstance(request, SearchRequest)
+    assert request.model_dump(exclude_none=True) == {
+        "q": "java",
+        "gl": "de",
+        "hl": "en",
+        "num": "20",
+        "tbs": "qdr:w",
+        "page": "2",
+    }
+
+
+def test_unset_optional_fields_keep_target_defaults():
+    _, request = route_auto(_auto(q="java", intent="images"))
+    assert request.gl is None and request.hl is None and request.tbs is None
+    assert request.num == "10"
+
+
+def test_multi_region_gets_translations_num_and_tbs():
+    route, request = route_auto(_auto(q="java", num="5", tbs="qdr:m"))
+    assert route.tool == SerperTools.GOOGLE_SEARCH_MULTI_REGION
+    assert request.preset == "us_cn_dual"
+    assert request.translations == TRANSLATIONS
+    assert (request.num, request.tbs) == ("5", "qdr:m")
+
+
+def test_reviews_maps_query_to_fid():
+    route, request = route_auto(_auto(q="0x89c2:0x1", intent="reviews", gl="us", hl="en"))
+    assert route.tool == SerperTools.GOOGLE_SEARCH_REVIEWS
+    assert isinstance(request, ReviewsRequest)
+    assert request.fid == "0x89c2:0x1"
+    assert (request.gl, request.hl) == ("us", "en")
+
+
+def test_lens_maps_query_to_url():
+    route, request = route_auto(_auto(q="https://example.com/a.png", intent="lens", gl="fr"))
+    assert route.tool == SerperTools.GOOGLE_SEARCH_LENS
+    assert isinstance(request, LensRequest)
+    assert request.model_dump(exclude_none=True) == {"url": "https://example.com/a.png", "gl": "fr"}
+
+
+def test_auto_only_fields_are_not_forwarded():
+    for route in AUTO_ROUTES.values():
+        sources = {source for _, source in route.projection}
+        assert not sources & {"intent", "format"}
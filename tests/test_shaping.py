@@ -0,0 +1,23 @@
+import json
+
+import pytest
+
+from serper_mcp_server.shaping import render
+
+
+@pytest.mark.parametrize("response_format", ["full", "compact"])
+@pytest.mark.parametrize("text, max_bytes", [("中" * 10000, 20000), ("é" * 5000, 1000), ("😀" * 3000, 4000)])
+def test_non_ascii_text_is_cut_by_encoded_size(response_format, text, max_bytes):
+    output = render({"text": text, "title": "t"}, "scrape", response_format, max_bytes)
+    size = len(output.encode("utf-8"))
+    data = json.loads(output)
+    assert size <= max_bytes
+    assert data["truncated"] == {"text": True}
+    assert text.startswith(data["text"])
+    # 只截掉超出的部分，剩余文本应接近填满预算
+    assert size > max_bytes - 16
+
+
+def test_text_within_budget_is_untouched():
+    output = render({"text": "中" * 10, "title": "t"}, "scrape", "compact", 1000)
+    assert json.loads(output) == {"text": "中" * 10, "title": "t"}